@@ -3,32 +3,144 @@
 A web application for uploading, viewing, and sharing 3D models
 Built with Flask, Three.js, and SQLite
 """
-from flask import Flask, render_template, request, jsonify, send_from_directory, redirect, url_for
+from flask import Flask, Response, g, render_template, request, jsonify, send_from_directory, redirect, url_for
 import os
+import atexit
+import mimetypes
+import secrets
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from werkzeug.http import is_resource_modified
 from werkzeug.utils import secure_filename
-from database import init_db, add_model, get_model, get_all_models
-import uuid
+from database import (ensure_schema, close_connection, add_model, add_models, get_model, get_models_page,
+                      search_models, enqueue_job, enqueue_jobs, get_jobs, get_job, find_active_job,
+                      get_library_version, create_upload_session, get_upload_session, advance_upload_session,
+                      delete_upload_session, get_generated_model, StaleCursor, DEFAULT_PAGE_SIZE, MODEL_CACHE)
+from storage import (UploadRequest, HashingFile, ChecksumMismatch, store_upload, content_digest, derived_filename,
+                     select_sidecar, shard_path, session_path, open_session_file, parse_checksum, append_chunk,
+                     SIDECAR_SUFFIXES)
+from jobs import JobWorker, enqueue_post_processing, post_processing_jobs
+from cache import LRUCache
+from generation import validate_params, params_key, GENERATED_CACHE_MAX_BYTES
+from gltf_parser import parse_model, InvalidModelError
+from metrics import (REGISTRY, CONTENT_TYPE, HTTP_REQUEST_SECONDS, HTTP_REQUESTS, HTTP_RESPONSE_BYTES,
+                     UPLOAD_SIZE_BYTES)
 
 app = Flask(__name__)
+app.request_class = UploadRequest
 
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'glb', 'gltf'}
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+MAX_BULK_SIZE = 4 * 1024 * 1024 * 1024  # 4GB per bulk upload request
+MAX_BULK_FILES = 10000  # models per bulk upload, archive members included
+BULK_UPLOAD_WORKERS = 8  # files validated and stored concurrently
+MAX_RESUMABLE_SIZE = 20 * 1024 * 1024 * 1024  # 20GB per resumable upload, sent in chunks of up to MAX_FILE_SIZE
+CHUNK_CONTENT_TYPE = 'application/offset+octet-stream'
+MODEL_CACHE_MAX_AGE = 365 * 24 * 60 * 60  # content-addressed files never change
+VIEWER_CACHE_SIZE = 1024  # rendered viewer pages kept per process
+VIEWER_CACHE_TTL = 60
+LIBRARY_CACHE_SIZE = 256  # rendered library pages kept per process
+LIBRARY_CACHE_TTL = 60 * 60  # keyed by library version, so entries never go stale
+
+mimetypes.add_type('model/gltf-binary', '.glb')
+mimetypes.add_type('model/gltf+json', '.gltf')
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
+app.config['UPLOAD_LIMITS'] = {'upload_bulk': MAX_BULK_SIZE}
+app.config['BULK_UPLOAD_WORKERS'] = BULK_UPLOAD_WORKERS
+app.config['MAX_RESUMABLE_SIZE'] = MAX_RESUMABLE_SIZE
+app.config['JOB_WORKER_ENABLED'] = True
+app.config['JOB_WORKER_PROCESSES'] = None  # None uses every core
+app.config['GENERATED_CACHE_MAX_BYTES'] = GENERATED_CACHE_MAX_BYTES
+app.config['COMPACT_MODELS'] = True  # serve welded, quantized copies to the viewer
+
+# Rendered viewer pages, dropped together with the model they show
+VIEWER_CACHE = LRUCache('viewer_html', VIEWER_CACHE_SIZE, VIEWER_CACHE_TTL)
+MODEL_CACHE.cascade_to(VIEWER_CACHE)
+
+# Rendered library pages by library version stamp and cursor
+LIBRARY_CACHE = LRUCache('library_html', LIBRARY_CACHE_SIZE, LIBRARY_CACHE_TTL)
+
+# Importing the app has no side effects; the folder and schema are prepared
+# by create_app, or else by the first request of the process
+_prepared = False
+_prepare_lock = threading.Lock()
+
+def create_app(config=None):
+    """
+    Configure the application and prepare its upload folder and database
+
+    The routes are registered on this module's app, so every call returns
+    that app. Server workers may call it concurrently: the schema is
+    initialized once, by whichever process gets there first.
+
+    Args:
+        config (dict): Optional configuration overrides
 
-# Create upload folder if it doesn't exist
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    Returns:
+        Flask: The configured application
+    """
+    global _prepared
+    if config:
+        app.config.update(config)
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    ensure_schema()
+    # Connections are reopened per thread; none may be inherited by forked workers
+    close_connection()
+    _prepared = True
+    return app
 
-# Initialize database
-init_db()
+# Background job worker, started by the first request of this process
+job_worker = None
+_job_worker_lock = threading.Lock()
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+@app.before_request
+def prepare_app():
+    """Prepare the upload folder and database once per process, unless create_app already did"""
+    if _prepared:
+        return
+    with _prepare_lock:
+        if not _prepared:
+            create_app()
+
+@app.before_request
+def start_request_timer():
+    """Remember when the request started, for the latency histogram"""
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Record latency, status and body size of the response per route"""
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    started = g.pop('request_started', None)
+    if started is not None:
+        HTTP_REQUEST_SECONDS.labels(request.method, route).observe(time.perf_counter() - started)
+    HTTP_REQUESTS.labels(request.method, route, str(response.status_code)).inc()
+    if response.content_length:
+        HTTP_RESPONSE_BYTES.labels(route).inc(response.content_length)
+    return response
+
+@app.before_request
+def start_job_worker():
+    """Start the background job worker once per process"""
+    global job_worker
+    if job_worker is not None or app.testing or not app.config['JOB_WORKER_ENABLED']:
+        return
+    with _job_worker_lock:
+        if job_worker is None:
+            job_worker = JobWorker(max_workers=app.config['JOB_WORKER_PROCESSES']).start()
+            atexit.register(job_worker.stop, False)
+
 @app.route('/')
 def index():
     """Main page with upload form"""
@@ -52,22 +164,29 @@ def upload_file():
         if not allowed_file(file.filename):
             return jsonify({'error': 'Alleen .glb en .gltf bestanden zijn toegestaan'}), 400
         
-        # Generate unique filename
+        # Validate the model and store it under its content hash, reusing identical uploads
         original_filename = secure_filename(file.filename)
         file_extension = original_filename.rsplit('.', 1)[1].lower()
-        unique_filename = f"{uuid.uuid4().hex}.{file_extension}"
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        
-        # Save file
-        file.save(file_path)
+        try:
+            stored = store_upload(file.stream, app.config['UPLOAD_FOLDER'], file_extension,
+                                  validate=parse_model)
+        except InvalidModelError as e:
+            return jsonify({'error': f'Ongeldig 3D-model: {e}'}), 400
+        UPLOAD_SIZE_BYTES.observe(stored.size)
         
         # Add to database
         model_id = add_model(
-            filename=unique_filename,
+            filename=stored.filename,
             original_filename=original_filename,
-            file_path=file_path
+            file_path=stored.path,
+            content_hash=stored.digest,
+            file_size=stored.size,
+            metadata=stored.info
         )
         
+        # Heavier work runs in the background once the bytes are durable
+        enqueue_post_processing(model_id, stored, app.config['COMPACT_MODELS'])
+        
         return jsonify({
             'success': True,
             'model_id': model_id,
@@ -78,15 +197,325 @@ def upload_file():
     except Exception as e:
         return jsonify({'error': f'Upload fout: {str(e)}'}), 500
 
+def bulk_entries(files):
+    """
+    List the models in a bulk upload, expanding zip archives
+
+    Archive members are opened one at a time from the spooled archive, so
+    an archive is never extracted as a whole.
+
+    Args:
+        files (list): Uploaded FileStorage objects
+
+    Returns:
+        list: (name, open, error) per model; open returns a readable stream,
+            error is set instead for entries that cannot be stored
+    """
+    entries = []
+    for file in files:
+        if not file.filename.lower().endswith('.zip'):
+            entries.append((file.filename, lambda file=file: file.stream, None))
+            continue
+        try:
+            archive = zipfile.ZipFile(file.stream)
+        except zipfile.BadZipFile:
+            entries.append((file.filename, None, 'Ongeldig zip-archief'))
+            continue
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            if info.file_size > MAX_FILE_SIZE:
+                entries.append((info.filename, None, 'Bestand is te groot'))
+                continue
+            entries.append((info.filename, lambda archive=archive, info=info: archive.open(info), None))
+    return entries
+
+def store_bulk_entry(name, open_stream, error, upload_folder):
+    """
+    Validate and store one model of a bulk upload
+
+    Runs on a worker thread, so everything it needs is passed in.
+
+    Returns:
+        dict: original_filename and StoredFile, or the error message
+    """
+    if error:
+        return {'error': error}
+    original_filename = secure_filename(os.path.basename(name))
+    if not allowed_file(original_filename):
+        return {'error': 'Alleen .glb en .gltf bestanden zijn toegestaan'}
+    file_extension = original_filename.rsplit('.', 1)[1].lower()
+    stream = open_stream()
+    try:
+        stored = store_upload(stream, upload_folder, file_extension, validate=parse_model)
+    except InvalidModelError as e:
+        return {'error': f'Ongeldig 3D-model: {e}'}
+    except zipfile.BadZipFile:
+        return {'error': 'Ongeldig zip-archief'}
+    finally:
+        stream.close()
+    return {'original_filename': original_filename, 'stored': stored}
+
+@app.route('/upload/bulk', methods=['POST'])
+def upload_bulk():
+    """
+    Handle many 3D model uploads in one request
+
+    Every 'models' file is a model or a zip archive of models. Files are
+    validated and stored concurrently, then all rows are inserted in one
+    transaction. The response lists the outcome per file.
+    """
+    try:
+        files = [file for file in request.files.getlist('models') if file.filename]
+        if not files:
+            return jsonify({'error': 'Geen bestanden gevonden'}), 400
+        
+        entries = bulk_entries(files)
+        if len(entries) > MAX_BULK_FILES:
+            return jsonify({'error': f'Te veel bestanden (maximaal {MAX_BULK_FILES})'}), 400
+        
+        upload_folder = app.config['UPLOAD_FOLDER']
+        with ThreadPoolExecutor(app.config['BULK_UPLOAD_WORKERS']) as executor:
+            outcomes = list(executor.map(
+                lambda entry: store_bulk_entry(*entry, upload_folder), entries))
+        
+        # Add every stored model in a single transaction
+        stored_outcomes = [outcome for outcome in outcomes if 'stored' in outcome]
+        model_ids = add_models([{
+            'filename': outcome['stored'].filename,
+            'original_filename': outcome['original_filename'],
+            'file_path': outcome['stored'].path,
+            'content_hash': outcome['stored'].digest,
+            'file_size': outcome['stored'].size,
+            'metadata': outcome['stored'].info,
+        } for outcome in stored_outcomes])
+        
+        # Queue background work once per new blob, even if the request held it twice
+        jobs = []
+        queued = set()
+        for model_id, outcome in zip(model_ids, stored_outcomes):
+            stored = outcome['stored']
+            outcome['model_id'] = model_id
+            UPLOAD_SIZE_BYTES.observe(stored.size)
+            if stored.digest not in queued:
+                blob_jobs = post_processing_jobs(model_id, stored, app.config['COMPACT_MODELS'])
+                if blob_jobs:
+                    queued.add(stored.digest)
+                    jobs.extend(blob_jobs)
+        if jobs:
+            enqueue_jobs(jobs)
+        
+        results = []
+        for (name, _, _), outcome in zip(entries, outcomes):
+            if 'model_id' in outcome:
+                results.append({'filename': name, 'success': True, 'model_id': outcome['model_id'],
+                                'view_url': f"/view/{outcome['model_id']}"})
+            else:
+                results.append({'filename': name, 'success': False, 'error': outcome['error']})
+        
+        return jsonify({
+            'success': bool(model_ids),
+            'uploaded': len(model_ids),
+            'failed': len(results) - len(model_ids),
+            'results': results
+        }), 200 if model_ids else 400
+        
+    except Exception as e:
+        return jsonify({'error': f'Upload fout: {str(e)}'}), 500
+
+def upload_session_expired(session):
+    """Check whether a resumable upload has gone without progress for too long"""
+    return session['expires_at'] < datetime.now().isoformat()
+
+def upload_progress(session, status=200):
+    """Progress of a resumable upload as JSON and as tus-style headers"""
+    response = jsonify({
+        'upload_id': session['id'],
+        'filename': session['original_filename'],
+        'offset': session['upload_offset'],
+        'length': session['upload_length'],
+        'complete': session['upload_offset'] == session['upload_length'],
+        'expires': session['expires_at'],
+        'upload_url': url_for('get_upload_progress', upload_id=session['id'])
+    })
+    response.status_code = status
+    response.headers['Upload-Offset'] = str(session['upload_offset'])
+    response.headers['Upload-Length'] = str(session['upload_length'])
+    response.cache_control.no_store = True
+    return response
+
+@app.route('/upload/sessions', methods=['POST'])
+def start_resumable_upload():
+    """
+    Start a resumable upload of one large model
+
+    The client sends {"filename", "length"}, then PATCHes the bytes in
+    order, in chunks with an Upload-Offset and Upload-Checksum header, and
+    finally POSTs to the complete URL. After a dropped connection, GET or
+    HEAD on the upload URL tells where to continue.
+    """
+    data = request.get_json(silent=True) or {}
+    original_filename = secure_filename(str(data.get('filename') or ''))
+    if not original_filename:
+        return jsonify({'error': 'Geen bestandsnaam opgegeven'}), 400
+    if not allowed_file(original_filename):
+        return jsonify({'error': 'Alleen .glb en .gltf bestanden zijn toegestaan'}), 400
+    
+    length = data.get('length')
+    if not isinstance(length, int) or isinstance(length, bool) or length <= 0:
+        return jsonify({'error': 'Ongeldige bestandsgrootte'}), 400
+    if length > app.config['MAX_RESUMABLE_SIZE']:
+        return jsonify({'error': f"Bestand is te groot (maximaal {app.config['MAX_RESUMABLE_SIZE']} bytes)"}), 413
+    
+    # The empty partial file exists before the session, so every session has one
+    upload_id = secrets.token_hex(16)
+    path = session_path(app.config['UPLOAD_FOLDER'], upload_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'xb').close()
+    session = create_upload_session(upload_id, original_filename, length)
+    
+    response = upload_progress(session, 201)
+    response.headers['Location'] = url_for('get_upload_progress', upload_id=upload_id)
+    return response
+
+@app.route('/upload/sessions/<upload_id>', methods=['GET'])
+def get_upload_progress(upload_id):
+    """API endpoint to ask how much of a resumable upload is stored; also answers HEAD"""
+    session = get_upload_session(upload_id)
+    
+    if not session:
+        return jsonify({'error': 'Upload niet gevonden'}), 404
+    if upload_session_expired(session):
+        return jsonify({'error': 'Upload is verlopen'}), 410
+    
+    return upload_progress(session)
+
+@app.route('/upload/sessions/<upload_id>', methods=['PATCH'])
+def upload_chunk(upload_id):
+    """
+    Append one chunk to a resumable upload
+
+    The chunk is streamed to disk and only kept when its Upload-Checksum
+    matches, so a chunk that failed can simply be sent again.
+    """
+    if request.mimetype != CHUNK_CONTENT_TYPE:
+        return jsonify({'error': f'Verwacht Content-Type {CHUNK_CONTENT_TYPE}'}), 415
+    offset = request.headers.get('Upload-Offset', type=int)
+    if offset is None or offset < 0:
+        return jsonify({'error': 'Ongeldige of ontbrekende Upload-Offset'}), 400
+    try:
+        checksum = parse_checksum(request.headers.get('Upload-Checksum'))
+    except ValueError:
+        return jsonify({'error': 'Ongeldige of ontbrekende Upload-Checksum'}), 400
+    
+    try:
+        with open_session_file(session_path(app.config['UPLOAD_FOLDER'], upload_id)) as file:
+            # Read under the lock: the previous chunk may have just moved the offset
+            session = get_upload_session(upload_id)
+            if not session:
+                return jsonify({'error': 'Upload niet gevonden'}), 404
+            if upload_session_expired(session):
+                return jsonify({'error': 'Upload is verlopen'}), 410
+            if offset != session['upload_offset']:
+                return upload_progress(session, 409)
+            
+            try:
+                offset = append_chunk(file, offset, request.stream, checksum,
+                                      session['upload_length'] - session['upload_offset'])
+            except ChecksumMismatch:
+                return jsonify({'error': 'Checksum komt niet overeen'}), 460
+            except ValueError:
+                return jsonify({'error': 'Deel is groter dan de rest van het bestand'}), 413
+            session = advance_upload_session(upload_id, offset)
+    except FileNotFoundError:
+        return jsonify({'error': 'Upload niet gevonden'}), 404
+    except BlockingIOError:
+        return jsonify({'error': 'Er wordt al naar deze upload geschreven'}), 409
+    
+    return upload_progress(session)
+
+@app.route('/upload/sessions/<upload_id>/complete', methods=['POST'])
+def complete_resumable_upload(upload_id):
+    """Validate and store a fully received resumable upload as a model"""
+    upload_folder = app.config['UPLOAD_FOLDER']
+    path = session_path(upload_folder, upload_id)
+    try:
+        with open_session_file(path):
+            session = get_upload_session(upload_id)
+            if not session:
+                return jsonify({'error': 'Upload niet gevonden'}), 404
+            if upload_session_expired(session):
+                return jsonify({'error': 'Upload is verlopen'}), 410
+            if session['upload_offset'] != session['upload_length']:
+                return upload_progress(session, 409)
+            
+            # The partial file becomes the stored blob by renaming it; it is
+            # read once more to hash and validate it, a chunk at a time
+            original_filename = session['original_filename']
+            file_extension = original_filename.rsplit('.', 1)[1].lower()
+            try:
+                stored = store_upload(HashingFile(upload_folder, path=path), upload_folder, file_extension,
+                                      validate=parse_model)
+            except InvalidModelError as e:
+                os.remove(path)
+                delete_upload_session(upload_id)
+                return jsonify({'error': f'Ongeldig 3D-model: {e}'}), 400
+            if stored.reused:
+                os.remove(path)
+            UPLOAD_SIZE_BYTES.observe(stored.size)
+            
+            model_id = add_model(
+                filename=stored.filename,
+                original_filename=original_filename,
+                file_path=stored.path,
+                content_hash=stored.digest,
+                file_size=stored.size,
+                metadata=stored.info
+            )
+            enqueue_post_processing(model_id, stored, app.config['COMPACT_MODELS'])
+            delete_upload_session(upload_id)
+    except FileNotFoundError:
+        return jsonify({'error': 'Upload niet gevonden'}), 404
+    except BlockingIOError:
+        return jsonify({'error': 'Er wordt al naar deze upload geschreven'}), 409
+    
+    return jsonify({
+        'success': True,
+        'model_id': model_id,
+        'message': 'Model succesvol geüpload',
+        'view_url': f'/view/{model_id}'
+    })
+
+@app.route('/upload/sessions/<upload_id>', methods=['DELETE'])
+def cancel_resumable_upload(upload_id):
+    """Abandon a resumable upload and remove what was stored of it"""
+    path = session_path(app.config['UPLOAD_FOLDER'], upload_id)
+    try:
+        with open_session_file(path):
+            if not delete_upload_session(upload_id):
+                return jsonify({'error': 'Upload niet gevonden'}), 404
+            os.remove(path)
+    except FileNotFoundError:
+        return jsonify({'error': 'Upload niet gevonden'}), 404
+    except BlockingIOError:
+        return jsonify({'error': 'Er wordt al naar deze upload geschreven'}), 409
+    
+    return '', 204
+
 @app.route('/view/<int:model_id>')
 def view_model(model_id):
     """View a specific 3D model"""
-    model = get_model(model_id)
+    html = VIEWER_CACHE.get_or_set(model_id, lambda: render_viewer(model_id))
     
-    if not model:
+    if html is None:
         return "Model niet gevonden", 404
     
-    return render_template('viewer.html', model=model)
+    return html
+
+def render_viewer(model_id):
+    """Render the viewer page of a model, or None if it does not exist"""
+    model = get_model(model_id)
+    return render_template('viewer.html', model=model) if model else None
 
 @app.route('/models/<int:model_id>')
 def get_model_info(model_id):
@@ -98,16 +527,252 @@ def get_model_info(model_id):
     
     return jsonify(model)
 
+@app.route('/models/<int:model_id>/status')
+def get_model_status(model_id):
+    """API endpoint to get the background processing status of a model"""
+    model = get_model(model_id)
+    
+    if not model:
+        return jsonify({'error': 'Model niet gevonden'}), 404
+    
+    jobs = get_jobs(model_id)
+    statuses = {job['status'] for job in jobs}
+    if 'failed' in statuses:
+        status = 'failed'
+    elif statuses & {'pending', 'running'}:
+        status = 'processing'
+    else:
+        status = 'ready'
+    
+    return jsonify({
+        'model_id': model_id,
+        'status': status,
+        'jobs': [{
+            'kind': job['kind'],
+            'status': job['status'],
+            'attempts': job['attempts'],
+            'error': job['last_error'],
+            'result': job['result']
+        } for job in jobs]
+    })
+
+def send_model_file(filename):
+    """Send a stored model file with conditional, range and encoding support"""
+    if content_digest(filename) is None:
+        # Legacy names may be overwritten, so only revalidate them
+        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    
+    # Prefer a precompressed sidecar the client accepts
+    encoding = select_sidecar(app.config['UPLOAD_FOLDER'], filename, request.accept_encodings)
+    served = filename + SIDECAR_SUFFIXES[encoding] if encoding else filename
+    
+    # Content-addressed files never change: strong ETag and cache forever
+    response = send_from_directory(
+        app.config['UPLOAD_FOLDER'],
+        served,
+        mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+        etag=os.path.basename(served),
+        max_age=MODEL_CACHE_MAX_AGE
+    )
+    if encoding:
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.immutable = True
+    return response
+
 @app.route('/uploads/<path:filename>')
 def serve_model(filename):
     """Serve uploaded model files"""
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    # Files moved into shard directories keep answering on their old flat URL
+    sharded = shard_path(filename)
+    if sharded != filename and not os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], filename)):
+        return redirect(url_for('serve_model', filename=sharded), 301)
+    return send_model_file(filename)
+
+@app.route('/models/<int:model_id>/lod/<int:level>')
+def serve_model_lod(model_id, level):
+    """Serve a level of detail of a model; level 0 is the original"""
+    model = get_model(model_id)
+    
+    if not model:
+        return jsonify({'error': 'Model niet gevonden'}), 404
+    
+    if level == 0:
+        return send_model_file(model['filename'])
+    
+    if level > (model['lod_levels'] or 0):
+        return jsonify({'error': 'Detailniveau niet gevonden'}), 404
+    
+    return send_model_file(derived_filename(model['filename'], f'.lod{level}.glb'))
+
+def generated_model_response(model_id, cached):
+    """JSON response for a generated model that is in the library"""
+    return jsonify({
+        'success': True,
+        'status': 'done',
+        'model_id': model_id,
+        'cached': cached,
+        'view_url': f'/view/{model_id}'
+    })
+
+@app.route('/generate', methods=['POST'])
+def generate_model():
+    """Generate a temple variant, or return it from the library if it was generated before"""
+    data = request.get_json(silent=True)
+    if data is None:
+        data = request.form.to_dict()
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Ongeldige parameters'}), 400
+    
+    try:
+        params = validate_params(data)
+    except ValueError as e:
+        return jsonify({'error': f'Ongeldige parameters: {e}'}), 400
+    
+    key = params_key(params)
+    name = f'temple-{key[:12]}.glb'
+    
+    # Cache hit: the variant is already in the library
+    model_id = get_generated_model(key)
+    if model_id is not None:
+        return generated_model_response(model_id, cached=True)
+    
+    # Cache miss: generate in the job worker pool, sharing identical in-flight requests
+    payload = {
+        'params': params,
+        'key': key,
+        'name': name,
+        'cache_max_bytes': app.config['GENERATED_CACHE_MAX_BYTES'],
+        'upload_folder': app.config['UPLOAD_FOLDER'],
+        'compact': app.config['COMPACT_MODELS'],
+    }
+    job = find_active_job('generate', payload)
+    job_id = job['id'] if job else enqueue_job('generate', payload=payload)
+    
+    return jsonify({
+        'success': True,
+        'status': 'pending',
+        'job_id': job_id,
+        'status_url': url_for('get_generate_status', job_id=job_id)
+    }), 202
+
+@app.route('/generate/<int:job_id>')
+def get_generate_status(job_id):
+    """API endpoint to poll a background generation"""
+    job = get_job(job_id)
+    
+    if not job or job['kind'] != 'generate':
+        return jsonify({'error': 'Generatie niet gevonden'}), 404
+    
+    if job['status'] == 'done':
+        return generated_model_response(job['result']['model_id'], cached=False)
+    
+    return jsonify({
+        'job_id': job_id,
+        'status': job['status'],
+        'attempts': job['attempts'],
+        'error': job['last_error']
+    })
+
+def library_response(body, etag):
+    """
+    Response for a library listing that browsers revalidate by version stamp
+
+    There is no Last-Modified: HTTP dates have one-second resolution, so two
+    changes within a second would leave If-Modified-Since answering 304 for
+    a stale listing. The ETag carries the exact version.
+    """
+    response = body if isinstance(body, Response) else Response(body)
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+def library_not_modified(etag):
+    """304 response if the client's copy of a library listing is current, else None"""
+    if is_resource_modified(request.environ, etag=etag):
+        return None
+    return library_response(Response(status=304), etag)
+
+@app.route('/api/models')
+def api_list_models():
+    """API endpoint to list models one page at a time"""
+    after = request.args.get('after')
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    
+    stamp = get_library_version()
+    etag = f'{stamp}-{limit}-{after or ""}'
+    not_modified = library_not_modified(etag)
+    if not_modified:
+        return not_modified
+    
+    try:
+        models, next_cursor = get_models_page(after=after, limit=limit)
+    except ValueError:
+        return jsonify({'error': 'Ongeldige cursor'}), 400
+    
+    return library_response(jsonify({
+        'models': models,
+        'next': next_cursor,
+        'next_url': url_for('api_list_models', after=next_cursor, limit=limit) if next_cursor else None
+    }), etag)
+
+@app.route('/search')
+def search():
+    """API endpoint to search the library, best matches first, one page at a time"""
+    query = request.args.get('q', '').strip()
+    after = request.args.get('after')
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    
+    if not query:
+        return jsonify({'error': 'Zoekterm ontbreekt'}), 400
+    
+    try:
+        models, next_cursor = search_models(query, after=after, limit=limit)
+    except StaleCursor:
+        return jsonify({'error': 'De bibliotheek is gewijzigd, begin opnieuw bij de eerste pagina',
+                        'first_url': url_for('search', q=query, limit=limit)}), 409
+    except ValueError:
+        return jsonify({'error': 'Ongeldige cursor'}), 400
+    
+    return jsonify({
+        'query': query,
+        'models': models,
+        'next': next_cursor,
+        'next_url': url_for('search', q=query, after=next_cursor, limit=limit) if next_cursor else None
+    })
 
 @app.route('/models')
 def list_models():
-    """List all uploaded models"""
-    models = get_all_models()
-    return render_template('models.html', models=models)
+    """List uploaded models, one page at a time"""
+    after = request.args.get('after')
+    
+    # Nothing changed since the client's copy: skip the query and the template
+    stamp = get_library_version()
+    etag = f'{stamp}-{after or ""}'
+    not_modified = library_not_modified(etag)
+    if not_modified:
+        return not_modified
+    
+    html = LIBRARY_CACHE.get_or_set((stamp, after), lambda: render_library_page(after))
+    if html is None:
+        return "Ongeldige cursor", 400
+    
+    return library_response(html, etag)
+
+def render_library_page(after):
+    """Render one page of the library, or None for an invalid cursor"""
+    try:
+        models, next_cursor = get_models_page(after=after)
+    except ValueError:
+        return None
+    
+    return render_template('models.html', models=models, next_cursor=next_cursor, is_first_page=not after)
+
+@app.route('/metrics')
+def export_metrics():
+    """Prometheus metrics of this process"""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
 
 if __name__ == '__main__':
+    create_app()
     app.run(debug=True, host='0.0.0.0', port=5001)
@@ -0,0 +1,409 @@
+"""
+Benchmark suite for 3D Model Viewer
+Measures throughput and latency percentiles of the hot paths against a stored baseline
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import database
+from database import add_model, close_connection, encode_cursor, get_model, init_db
+from gltf_writer import ARRAY_BUFFER, BufferBuilder, pack_glb
+
+DEFAULT_MODELS = 1000      # size of the synthetic library
+DEFAULT_REQUESTS = 200     # timed requests per benchmark
+DEFAULT_GENERATIONS = 20   # timed temple builds
+DEFAULT_ROUNDS = 3         # each benchmark keeps its best round, like timeit
+DEFAULT_STARTS = 10        # fresh interpreters per start-up benchmark round
+WARMUP_CALLS = 5           # untimed calls before the first round
+DEFAULT_THRESHOLD = 0.25   # allowed slowdown before a metric counts as a regression
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+RESULTS_PATH = 'benchmark_results.json'
+
+# Words the synthetic model names are made of
+NAME_WORDS = ('temple', 'greek', 'pool', 'column', 'roof', 'chair', 'table', 'car',
+              'tree', 'house', 'statue', 'lamp', 'ship', 'plane', 'dragon')
+
+# Geometry libraries that must stay off the web import path; only job processes load them
+HEAVY_MODULES = ('numpy', 'trimesh')
+
+# Import the production app and answer its first request, as a new server worker does
+COLD_START_SCRIPT = (
+    'import time\n'
+    'started = time.perf_counter()\n'
+    'from wsgi import app\n'
+    'app.test_client().get("/models")\n'
+    'print(time.perf_counter() - started)\n'
+)
+
+# Metric -> True if larger values are better
+COMPARED_METRICS = {'throughput': True, 'p50_ms': False, 'p95_ms': False}
+
+def synthetic_glb(seed):
+    """A valid single-triangle GLB whose content is unique per seed"""
+    buffer = BufferBuilder()
+    positions = np.array([[0, 0, 0], [1, 0, 0], [0, 1 + seed, 0]], dtype=np.float32)
+    buffer.add(positions, 'VEC3', ARRAY_BUFFER, bounds=True)
+    binary = buffer.tobytes()
+    document = {
+        'asset': {'version': '2.0'},
+        'scene': 0,
+        'scenes': [{'nodes': [0]}],
+        'nodes': [{'mesh': 0}],
+        'meshes': [{'primitives': [{'attributes': {'POSITION': 0}}]}],
+        'accessors': buffer.accessors,
+        'bufferViews': buffer.buffer_views,
+        'buffers': [{'byteLength': len(binary)}],
+    }
+    return pack_glb(document, binary)
+
+def seed_library(count):
+    """
+    Fill the database with synthetic models
+
+    Only the rows are created; lookups and listings never read the files.
+
+    Args:
+        count (int): Number of models
+
+    Returns:
+        list: Model IDs
+    """
+    ids = []
+    for i in range(count):
+        digest = f'{i:064x}'
+        words = NAME_WORDS[i % len(NAME_WORDS)], NAME_WORDS[i // len(NAME_WORDS) % len(NAME_WORDS)]
+        ids.append(add_model(
+            filename=f'{digest}.glb',
+            original_filename=f'{words[0]}_{words[1]}_{i}.glb',
+            file_path=os.path.join('uploads', f'{digest}.glb'),
+            content_hash=digest,
+            file_size=1024 + i,
+            metadata={'mesh_count': 1, 'node_count': 1, 'material_count': 1, 'vertex_count': 3 * i,
+                      'triangle_count': i, 'bounds': [[0, 0, 0], [1, 1, 1]]}
+        ))
+    return ids
+
+def measure(operation, iterations, rounds=DEFAULT_ROUNDS):
+    """
+    Time an operation and summarize its latency distribution
+
+    A few untimed warm-up calls come first. Each metric keeps its best
+    value over the rounds, which filters out noise from other processes.
+
+    Args:
+        operation (callable): Called with a call number that is unique
+            across warm-up and rounds
+        iterations (int): Timed calls per round
+        rounds (int): Number of rounds
+
+    Returns:
+        dict: count, throughput (calls/s) and p50/p95/p99 latency in ms
+    """
+    for call in range(WARMUP_CALLS):
+        operation(call)
+
+    summaries = []
+    for round_number in range(rounds):
+        first_call = WARMUP_CALLS + round_number * iterations
+        latencies = []
+        started = time.perf_counter()
+        for call in range(first_call, first_call + iterations):
+            begin = time.perf_counter()
+            operation(call)
+            latencies.append(time.perf_counter() - begin)
+        summaries.append(summarize(latencies, time.perf_counter() - started))
+    return best_of(summaries)
+
+def summarize(latencies, elapsed):
+    """Throughput and latency percentiles of one round"""
+    p50, p95, p99 = np.percentile(np.asarray(latencies) * 1000, [50, 95, 99])
+    return {
+        'count': len(latencies),
+        'throughput': round(len(latencies) / elapsed, 2),
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+    }
+
+def best_of(summaries):
+    """Best value of every metric over the rounds"""
+    best = summaries[0]
+    for summary in summaries[1:]:
+        best = {metric: max(value, summary[metric]) if metric == 'throughput' else min(value, summary[metric])
+                for metric, value in best.items()}
+    return best
+
+def python_env():
+    """Environment for a fresh interpreter that imports modules from this directory"""
+    env = dict(os.environ)
+    here = os.path.dirname(os.path.abspath(__file__))
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [here, env.get('PYTHONPATH')]))
+    return env
+
+def import_time(module, cwd):
+    """
+    Import a module in a fresh interpreter and read its -X importtime report
+
+    Args:
+        module (str): Module to import
+        cwd (str): Working directory of the interpreter
+
+    Returns:
+        tuple: (cumulative import time in seconds, set of modules imported)
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=cwd, env=python_env(), capture_output=True, text=True, check=True)
+    seconds, loaded = None, set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        if not self_us.strip().isdigit():
+            continue  # column header
+        loaded.add(name.strip())
+        if name.strip() == module and not name.startswith('  '):
+            seconds = int(cumulative_us) / 1e6
+    return seconds, loaded
+
+def cold_start(cwd):
+    """Seconds a fresh interpreter needs to import the production app and serve a first request"""
+    result = subprocess.run([sys.executable, '-c', COLD_START_SCRIPT],
+                            cwd=cwd, env=python_env(), capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+def measure_startup(start, starts, rounds=DEFAULT_ROUNDS):
+    """
+    Summarize a start-up time measured inside fresh interpreters
+
+    One untimed start comes first, so the database exists as it does for
+    a new worker of a running deployment.
+
+    Args:
+        start (callable): Runs one fresh interpreter and returns its seconds
+        starts (int): Interpreters per round
+        rounds (int): Number of rounds
+
+    Returns:
+        dict: Same summary as measure, with throughput in starts/s
+    """
+    start()
+    summaries = []
+    for _ in range(rounds):
+        latencies = [start() for _ in range(starts)]
+        summaries.append(summarize(latencies, sum(latencies)))
+    return best_of(summaries)
+
+def calls(iterations, rounds=DEFAULT_ROUNDS):
+    """Total number of operation calls made by measure"""
+    return WARMUP_CALLS + iterations * rounds
+
+def expect_status(response, status):
+    """Fail the benchmark instead of timing error responses"""
+    if response.status_code != status:
+        raise RuntimeError(f'{response.request.path}: HTTP {response.status_code}')
+
+def run_benchmarks(models=DEFAULT_MODELS, requests=DEFAULT_REQUESTS, generations=DEFAULT_GENERATIONS,
+                   rounds=DEFAULT_ROUNDS, starts=DEFAULT_STARTS):
+    """
+    Run every benchmark against a fresh synthetic library
+
+    The database and upload folder live in a temporary directory, so the
+    real library is untouched. HTTP paths go through the Flask test
+    client; temple generation is timed as a direct call, with and without
+    a warm primitive cache. Start-up is timed in fresh interpreters: the
+    -X importtime total of the app module, and importing the production
+    app up to its first response.
+
+    Args:
+        models (int): Size of the synthetic library
+        requests (int): Timed requests per HTTP benchmark
+        generations (int): Timed temple builds
+        rounds (int): Rounds per benchmark
+        starts (int): Fresh interpreters per start-up benchmark round
+
+    Returns:
+        dict: environment and per-benchmark results
+    """
+    from app import app
+    from generate_greek_temple import create_perfect_temple
+    import mesh_builder
+    from mesh_builder import primitive
+
+    workdir = tempfile.mkdtemp(prefix='benchmark-')
+    saved_path = database.DATABASE_PATH
+    saved_config = {key: app.config[key] for key in ('TESTING', 'UPLOAD_FOLDER')}
+    saved_cache_dir = mesh_builder.PRIMITIVE_CACHE_DIR
+    try:
+        database.DATABASE_PATH = os.path.join(workdir, 'models.db')
+        app.config['TESTING'] = True
+        app.config['UPLOAD_FOLDER'] = os.path.join(workdir, 'uploads')
+        os.makedirs(app.config['UPLOAD_FOLDER'])
+        init_db()
+        client = app.test_client()
+
+        ids = seed_library(models)
+        rng = np.random.default_rng(0)
+        picks = rng.choice(ids, size=calls(requests, rounds)).tolist()
+        cursors = [encode_cursor(get_model(model_id)) for model_id in picks]
+        uploads = [synthetic_glb(models + i) for i in range(calls(requests, rounds))]
+
+        def upload(i):
+            response = client.post('/upload', data={'model': (io.BytesIO(uploads[i]), f'bench_{i}.glb')},
+                                   content_type='multipart/form-data')
+            expect_status(response, 200)
+
+        def get_model_info(i):
+            expect_status(client.get(f'/models/{picks[i]}'), 200)
+
+        def view_model(i):
+            expect_status(client.get(f'/view/{picks[i]}'), 200)
+
+        def list_models(i):
+            expect_status(client.get('/models', query_string={'after': cursors[i]}), 200)
+
+        def api_list_models(i):
+            expect_status(client.get('/api/models', query_string={'after': cursors[i]}), 200)
+
+        def revalidate_models(i):
+            cursor = cursors[i]
+            response = client.get('/models', query_string={'after': cursor})
+            expect_status(client.get('/models', query_string={'after': cursor},
+                                     headers={'If-None-Match': response.headers['ETag']}), 304)
+
+        def search(i):
+            query = f'{NAME_WORDS[i % len(NAME_WORDS)]} {picks[i]}'
+            expect_status(client.get('/search', query_string={'q': query}), 200)
+
+        def generate_cold(i):
+            # No tessellation cached anywhere, as on the first run on a machine
+            mesh_builder.PRIMITIVE_CACHE_DIR = ''
+            primitive.cache_clear()
+            create_perfect_temple()
+
+        def generate_disk(i):
+            # A new process: tessellations come from the on-disk cache
+            mesh_builder.PRIMITIVE_CACHE_DIR = os.path.join(workdir, 'primitives')
+            primitive.cache_clear()
+            create_perfect_temple()
+
+        results = {
+            'upload': measure(upload, requests, rounds),
+            'get_model': measure(get_model_info, requests, rounds),
+            'view_model': measure(view_model, requests, rounds),
+            'list_models': measure(list_models, requests, rounds),
+            'api_list_models': measure(api_list_models, requests, rounds),
+            'revalidate_models': measure(revalidate_models, requests, rounds),
+            'search': measure(search, requests, rounds),
+            'generate_temple': measure(lambda i: create_perfect_temple(), generations, rounds),
+            'generate_temple_cold': measure(generate_cold, generations, rounds),
+            'generate_temple_disk': measure(generate_disk, generations, rounds),
+        }
+
+        startup_dir = os.path.join(workdir, 'startup')
+        os.makedirs(startup_dir)
+        _, loaded = import_time('app', startup_dir)
+        heavy = sorted(loaded.intersection(HEAVY_MODULES))
+        if heavy:
+            raise RuntimeError(f'importing app loads {", ".join(heavy)}')
+        results['import_app'] = measure_startup(lambda: import_time('app', startup_dir)[0], starts, rounds)
+        results['cold_start'] = measure_startup(lambda: cold_start(startup_dir), starts, rounds)
+    finally:
+        close_connection()
+        database.MODEL_CACHE.clear()
+        database.DATABASE_PATH = saved_path
+        app.config.update(saved_config)
+        mesh_builder.PRIMITIVE_CACHE_DIR = saved_cache_dir
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'models': models,
+            'requests': requests,
+            'generations': generations,
+            'rounds': rounds,
+            'starts': starts,
+        },
+        'benchmarks': results,
+    }
+
+def compare_results(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Find metrics that got worse than the baseline by more than threshold
+
+    Args:
+        results (dict): Output of run_benchmarks
+        baseline (dict): Stored output of an earlier run
+        threshold (float): Allowed relative slowdown, e.g. 0.25 for 25%
+
+    Returns:
+        list: Human-readable regression descriptions
+    """
+    regressions = []
+    for name, expected in baseline.get('benchmarks', {}).items():
+        actual = results['benchmarks'].get(name)
+        if actual is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = expected[metric], actual[metric]
+            if higher_is_better:
+                worse = new < old * (1 - threshold)
+            else:
+                worse = new > old * (1 + threshold)
+            if worse:
+                regressions.append(f'{name}.{metric}: {old} -> {new}')
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the 3D Model Viewer hot paths')
+    parser.add_argument('--models', type=int, default=DEFAULT_MODELS, help='synthetic library size')
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS, help='timed requests per benchmark')
+    parser.add_argument('--generations', type=int, default=DEFAULT_GENERATIONS, help='timed temple builds')
+    parser.add_argument('--rounds', type=int, default=DEFAULT_ROUNDS, help='rounds per benchmark, best kept')
+    parser.add_argument('--starts', type=int, default=DEFAULT_STARTS, help='fresh interpreters per start-up round')
+    parser.add_argument('--output', default=RESULTS_PATH, help='where to write the results JSON')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='baseline JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed relative slowdown before failing (default 0.25)')
+    parser.add_argument('--update-baseline', action='store_true', help='store these results as the new baseline')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.models, args.requests, args.generations, args.rounds, args.starts)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print(f"{'benchmark':<22}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, summary in results['benchmarks'].items():
+        print(f"{name:<22}{summary['throughput']:>10}{summary['p50_ms']:>10}"
+              f"{summary['p95_ms']:>10}{summary['p99_ms']:>10}")
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'✅ Baseline updated: {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f'⚠️  No baseline at {args.baseline}; run with --update-baseline to create one')
+        return 0
+    with open(args.baseline) as f:
+        regressions = compare_results(results, json.load(f), args.threshold)
+    if regressions:
+        print(f'❌ {len(regressions)} regression(s) beyond {args.threshold:.0%}:')
+        for regression in regressions:
+            print(f'   {regression}')
+        return 1
+    print(f'✅ No regressions beyond {args.threshold:.0%}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""
+Cache module for 3D Model Viewer
+Bounded in-process LRU caches with expiry, invalidation and hit/miss counters
+"""
+import threading
+import time
+from collections import OrderedDict
+from metrics import CACHE_REQUESTS
+
+class LRUCache:
+    """
+    Thread-safe least-recently-used cache whose entries also expire
+
+    The expiry bounds how long other processes, which cannot invalidate
+    this one, may see stale entries. Values computed while an invalidation
+    happened are not stored, so a slow computation cannot bring back what
+    was just invalidated.
+    """
+
+    def __init__(self, name, maxsize, ttl):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires, value), least recently used first
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._dependents = []
+        self._hits = CACHE_REQUESTS.labels(name, 'hit')
+        self._misses = CACHE_REQUESTS.labels(name, 'miss')
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hits(self):
+        return self._hits.value
+
+    @property
+    def misses(self):
+        return self._misses.value
+
+    def cascade_to(self, cache):
+        """Invalidate the same keys in another cache whenever this one is invalidated"""
+        self._dependents.append(cache)
+
+    def get(self, key, default=None):
+        """Get a cached value, counting a hit or a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._hits.inc()
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+        self._misses.inc()
+        return default
+
+    def get_or_set(self, key, compute):
+        """
+        Get a cached value or compute and cache it
+
+        Args:
+            key: Hashable cache key
+            compute (callable): Called without arguments on a miss; a None
+                result is returned but not cached
+
+        Returns:
+            The cached or computed value
+        """
+        generation = self._generation
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            if value is not None:
+                self.set(key, value, generation)
+        return value
+
+    def set(self, key, value, generation=None):
+        """Cache a value, unless the cache was invalidated since generation was read"""
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *keys):
+        """Drop entries by key"""
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+        for cache in self._dependents:
+            cache.invalidate(*keys)
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+        for cache in self._dependents:
+            cache.clear()
@@ -3,32 +3,318 @@ Database module for 3D Model Viewer
 Handles SQLite database operations for model storage
 """
 import sqlite3
+import threading
+import base64
+import re
+import json
 import os
-from datetime import datetime
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from cache import LRUCache
+from metrics import DB_QUERY_SECONDS, timed
 
 DATABASE_PATH = 'models.db'
 
+# Bump whenever init_db changes the schema, so ensure_schema runs it again
+SCHEMA_VERSION = 5
+
+# Connection tuning, applied once to every pooled connection
+JOURNAL_MODE = 'WAL'            # readers no longer block on writers
+SYNCHRONOUS = 'NORMAL'          # WAL fsynced only at checkpoints: never corrupt, but the latest
+                                # commits can be lost on power loss or an OS crash
+DURABLE_SYNCHRONOUS = 'FULL'    # fsync on every commit, for writes that must survive power loss
+CACHE_SIZE_KB = 16 * 1024       # page cache per connection
+MMAP_SIZE = 256 * 1024 * 1024   # memory-mapped I/O window
+BUSY_TIMEOUT_MS = 5000          # wait for locks instead of failing immediately
+STATEMENT_CACHE_SIZE = 128      # prepared statements kept per connection
+
+# Columns added after the first release; init_db adds them to older databases
+MODEL_COLUMN_UPGRADES = {
+    'content_hash': 'TEXT',
+    'file_size': 'INTEGER',
+    'mesh_count': 'INTEGER',
+    'node_count': 'INTEGER',
+    'material_count': 'INTEGER',
+    'vertex_count': 'INTEGER',
+    'triangle_count': 'INTEGER',
+    'bounds': 'TEXT',
+    'lod_levels': 'INTEGER',
+    'thumbnail': 'TEXT',
+    'compact_filename': 'TEXT',
+    'keywords': 'TEXT',
+}
+
+# Model metadata columns filled from gltf_parser; JSON columns are decoded on read
+METADATA_COLUMNS = ('mesh_count', 'node_count', 'material_count', 'vertex_count', 'triangle_count', 'bounds',
+                    'keywords')
+JSON_COLUMNS = ('bounds',)
+
+# Columns describing files derived from a stored blob; shared by every model with the same content_hash
+DERIVED_COLUMNS = ('lod_levels', 'thumbnail', 'compact_filename')
+
+# Keyset pagination of the model library
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+# Full-text search over the library: indexed columns and their bm25 weights
+SEARCH_COLUMNS = ('original_filename', 'user_id', 'keywords')
+SEARCH_WEIGHTS = (10.0, 5.0, 1.0)
+MAX_SEARCH_TERMS = 16
+
+# get_model results; other processes' updates show up once an entry expires
+MODEL_CACHE_SIZE = 4096
+MODEL_CACHE_TTL = 60
+MODEL_CACHE = LRUCache('model', MODEL_CACHE_SIZE, MODEL_CACHE_TTL)
+
+# Background processing jobs
+DEFAULT_JOB_ATTEMPTS = 3
+JOB_LEASE_SECONDS = 600  # running jobs are reclaimed unless renewed within this long
+
+# Resumable uploads
+UPLOAD_SESSION_TTL = 24 * 60 * 60  # idle sessions expire after this long
+
+_local = threading.local()
+
+class StaleCursor(ValueError):
+    """Raised when a search cursor was issued for an older version of the library"""
+
+def get_connection():
+    """
+    Get the calling thread's pooled database connection
+
+    Each worker thread keeps one warm connection to DATABASE_PATH, so
+    requests skip the connect and schema-parse cost. The connection is
+    reopened when DATABASE_PATH changes.
+
+    Returns:
+        sqlite3.Connection: Connection with sqlite3.Row as row factory
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.path == DATABASE_PATH:
+        return conn
+    if conn is not None:
+        conn.close()
+
+    conn = sqlite3.connect(
+        DATABASE_PATH,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute(f'PRAGMA journal_mode = {JOURNAL_MODE}')
+    conn.execute(f'PRAGMA synchronous = {SYNCHRONOUS}')
+    conn.execute(f'PRAGMA cache_size = -{int(CACHE_SIZE_KB)}')
+    conn.execute(f'PRAGMA mmap_size = {int(MMAP_SIZE)}')
+    conn.execute(f'PRAGMA busy_timeout = {int(BUSY_TIMEOUT_MS)}')
+
+    _local.conn = conn
+    _local.path = DATABASE_PATH
+    return conn
+
+def close_connection():
+    """Close the calling thread's pooled connection, if any"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+        _local.path = None
+
 def init_db():
     """Initialize the database with required tables"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS models (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            filename TEXT NOT NULL,
-            original_filename TEXT NOT NULL,
-            file_path TEXT NOT NULL,
-            upload_date TEXT NOT NULL,
-            user_id TEXT DEFAULT NULL
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    # Start from a fresh connection and cache in case the database file was replaced
+    close_connection()
+    MODEL_CACHE.clear()
+    if not os.path.exists(DATABASE_PATH):
+        # A WAL left behind by a deleted database must not be replayed into a new one
+        for suffix in ('-wal', '-shm'):
+            if os.path.exists(DATABASE_PATH + suffix):
+                os.remove(DATABASE_PATH + suffix)
+    conn = get_connection()
+    
+    with conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS models (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                filename TEXT NOT NULL,
+                original_filename TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                upload_date TEXT NOT NULL,
+                user_id TEXT DEFAULT NULL
+            )
+        ''')
+        existing = {row['name'] for row in conn.execute('PRAGMA table_info(models)')}
+        for column, column_type in MODEL_COLUMN_UPGRADES.items():
+            if column not in existing:
+                conn.execute(f'ALTER TABLE models ADD COLUMN {column} {column_type}')
+        # Serves the newest-first library listing and its keyset cursor
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_models_upload_date_id
+            ON models (upload_date DESC, id DESC)
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_models_content_hash ON models (content_hash)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_models_filename ON models (filename)')
+        
+        # Full-text index of the library with prefix indexes, kept in sync by triggers
+        columns = ', '.join(SEARCH_COLUMNS)
+        new_values = ', '.join(f'new.{column}' for column in SEARCH_COLUMNS)
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'models_fts'").fetchone():
+            conn.execute(f'''
+                CREATE VIRTUAL TABLE models_fts USING fts5(
+                    {columns}, prefix = '2 3', tokenize = 'unicode61 remove_diacritics 2'
+                )
+            ''')
+            conn.execute("INSERT INTO models_fts (models_fts, rank) VALUES ('rank', ?)",
+                         (f"bm25({', '.join(map(str, SEARCH_WEIGHTS))})",))
+            conn.execute(f'INSERT INTO models_fts (rowid, {columns}) SELECT id, {columns} FROM models')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS models_fts_insert AFTER INSERT ON models BEGIN
+                INSERT INTO models_fts (rowid, {columns}) VALUES (new.id, {new_values});
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS models_fts_update AFTER UPDATE OF {columns} ON models BEGIN
+                DELETE FROM models_fts WHERE rowid = old.id;
+                INSERT INTO models_fts (rowid, {columns}) VALUES (new.id, {new_values});
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS models_fts_delete AFTER DELETE ON models BEGIN
+                DELETE FROM models_fts WHERE rowid = old.id;
+            END
+        ''')
+        
+        # Library version stamp, bumped by every change to models; the random
+        # epoch tells databases apart whose versions happen to be equal
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS library_state (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                epoch TEXT NOT NULL,
+                version INTEGER NOT NULL
+            )
+        ''')
+        conn.execute('''
+            INSERT OR IGNORE INTO library_state (id, epoch, version)
+            VALUES (1, lower(hex(randomblob(8))), 0)
+        ''')
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS models_version_{event.lower()} AFTER {event} ON models BEGIN
+                    UPDATE library_state
+                    SET version = version + 1
+                    WHERE id = 1;
+                END
+            ''')
+        
+        # Post-upload processing queue; run_after is the retry time for
+        # pending jobs and the lease expiry for running ones
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                model_id INTEGER DEFAULT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                run_after TEXT NOT NULL,
+                result TEXT DEFAULT NULL,
+                last_error TEXT DEFAULT NULL,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status_run_after ON jobs (status, run_after)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_model_id ON jobs (model_id)')
+        
+        # Generated temple variants in the library, by validated parameter
+        # key; owned models were added by generation and may be evicted
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS generated_models (
+                params_key TEXT PRIMARY KEY,
+                model_id INTEGER NOT NULL,
+                owned INTEGER NOT NULL,
+                last_used TEXT NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_generated_models_last_used ON generated_models (last_used)')
+        
+        # Resumable uploads in progress; upload_offset counts the bytes that
+        # are durable on disk, expires_at moves forward with every chunk
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS upload_sessions (
+                id TEXT PRIMARY KEY,
+                original_filename TEXT NOT NULL,
+                upload_length INTEGER NOT NULL,
+                upload_offset INTEGER NOT NULL DEFAULT 0,
+                expires_at TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_upload_sessions_expires_at ON upload_sessions (expires_at)')
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    
     print("Database initialized successfully")
 
-def add_model(filename, original_filename, file_path, user_id=None):
+@contextmanager
+def _schema_lock():
+    """Exclusive lock shared by every process using the database file"""
+    try:
+        import fcntl
+    except ImportError:  # no flock on Windows; the busy timeout has to do
+        yield
+        return
+    with open(DATABASE_PATH + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+@contextmanager
+def _durable(conn):
+    """Transaction on conn that is fsynced before it commits (DURABLE_SYNCHRONOUS)"""
+    conn.execute(f'PRAGMA synchronous = {DURABLE_SYNCHRONOUS}')
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.execute(f'PRAGMA synchronous = {SYNCHRONOUS}')
+
+def ensure_schema():
+    """
+    Initialize the database once, however many processes start together
+    
+    Server workers forked at the same time take turns on a lock file; the
+    first runs init_db and the others find the schema version current.
+    
+    Returns:
+        bool: True if this call initialized the schema
+    """
+    def current():
+        # A missing file is left to init_db, which clears stale WAL files first
+        return (os.path.exists(DATABASE_PATH)
+                and get_connection().execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION)
+    
+    if current():
+        return False
+    with _schema_lock():
+        if current():
+            return False
+        init_db()
+    return True
+
+def _row_to_model(row):
+    """Convert a models row to a dict with decoded JSON columns"""
+    model = dict(row)
+    for column in JSON_COLUMNS:
+        if model.get(column) is not None:
+            model[column] = json.loads(model[column])
+    return model
+
+# Not timed itself: add_models records the insert
+def add_model(filename, original_filename, file_path, user_id=None, content_hash=None, file_size=None,
+              metadata=None):
     """
     Add a new model to the database
     
@@ -37,29 +323,80 @@ def add_model(filename, original_filename, file_path, user_id=None):
         original_filename (str): Original uploaded filename
         file_path (str): Path to the stored file
         user_id (str): Optional user identifier
+        content_hash (str): Optional SHA-256 hex digest of the file
+        file_size (int): Optional file size in bytes
+        metadata (dict): Optional parsed model metadata, see METADATA_COLUMNS
         
     Returns:
         int: ID of the inserted model
     """
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+    return add_models([{
+        'filename': filename,
+        'original_filename': original_filename,
+        'file_path': file_path,
+        'user_id': user_id,
+        'content_hash': content_hash,
+        'file_size': file_size,
+        'metadata': metadata,
+    }])[0]
+
+def _model_row(upload_date, filename, original_filename, file_path, user_id=None, content_hash=None,
+               file_size=None, metadata=None):
+    values = []
+    for column in METADATA_COLUMNS:
+        value = (metadata or {}).get(column)
+        if column in JSON_COLUMNS and value is not None:
+            value = json.dumps(value)
+        values.append(value)
+    return (filename, original_filename, file_path, upload_date, user_id, content_hash, file_size, *values)
+
+@timed(DB_QUERY_SECONDS)
+def add_models(models):
+    """
+    Add many models to the database in a single transaction
     
-    upload_date = datetime.now().isoformat()
+    Args:
+        models (list): Dicts with the keyword arguments of add_model
+        
+    Returns:
+        list: IDs of the inserted models, in the same order
+    """
+    if not models:
+        return []
+    
+    conn = get_connection()
     
-    cursor.execute('''
-        INSERT INTO models (filename, original_filename, file_path, upload_date, user_id)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (filename, original_filename, file_path, upload_date, user_id))
+    upload_date = datetime.now().isoformat()
+    rows = [_model_row(upload_date, **model) for model in models]
     
-    model_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.executemany(f'''
+            INSERT INTO models (filename, original_filename, file_path, upload_date, user_id,
+                                content_hash, file_size, {', '.join(METADATA_COLUMNS)})
+            VALUES (?, ?, ?, ?, ?, ?, ?{', ?' * len(METADATA_COLUMNS)})
+        ''', rows)
+        
+        # The transaction holds the write lock, so the newest rows are ours
+        model_ids = [row['id'] for row in conn.execute(
+            'SELECT id FROM models ORDER BY id DESC LIMIT ?', (len(rows),)
+        )][::-1]
+        
+        # A reused blob already has its derived files
+        conn.execute(f'''
+            UPDATE models SET ({', '.join(DERIVED_COLUMNS)}) = (
+                SELECT {', '.join(DERIVED_COLUMNS)} FROM models AS previous
+                WHERE previous.content_hash = models.content_hash AND previous.id < ?
+                ORDER BY previous.id DESC LIMIT 1
+            )
+            WHERE id >= ? AND content_hash IS NOT NULL
+        ''', (model_ids[0], model_ids[0]))
     
-    return model_id
+    return model_ids
 
+@timed(DB_QUERY_SECONDS)
 def get_model(model_id):
     """
-    Get model information by ID
+    Get model information by ID, from MODEL_CACHE when possible
     
     Args:
         model_id (int): Model ID
@@ -67,18 +404,41 @@ def get_model(model_id):
     Returns:
         dict: Model information or None if not found
     """
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+    model = MODEL_CACHE.get_or_set(model_id, lambda: _load_model(model_id))
+    # Callers get their own copy of the cached dict
+    return dict(model) if model else None
+
+def _load_model(model_id):
+    conn = get_connection()
     
-    cursor.execute('SELECT * FROM models WHERE id = ?', (model_id,))
-    row = cursor.fetchone()
-    conn.close()
+    row = conn.execute('SELECT * FROM models WHERE id = ?', (model_id,)).fetchone()
     
     if row:
-        return dict(row)
+        return _row_to_model(row)
     return None
 
+@timed(DB_QUERY_SECONDS)
+def get_model_by_hash(content_hash):
+    """
+    Get the newest model stored under a content hash
+    
+    Args:
+        content_hash (str): SHA-256 digest of the model file
+        
+    Returns:
+        dict: Model information or None if not found
+    """
+    conn = get_connection()
+    
+    row = conn.execute('''
+        SELECT * FROM models WHERE content_hash = ? ORDER BY id DESC LIMIT 1
+    ''', (content_hash,)).fetchone()
+    
+    if row:
+        return _row_to_model(row)
+    return None
+
+@timed(DB_QUERY_SECONDS)
 def get_all_models():
     """
     Get all models from the database
@@ -86,16 +446,219 @@ def get_all_models():
     Returns:
         list: List of model dictionaries
     """
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+    conn = get_connection()
     
-    cursor.execute('SELECT * FROM models ORDER BY upload_date DESC')
-    rows = cursor.fetchall()
-    conn.close()
+    rows = conn.execute('SELECT * FROM models ORDER BY upload_date DESC').fetchall()
     
-    return [dict(row) for row in rows]
+    return [_row_to_model(row) for row in rows]
+
+def _library_stamp(conn):
+    """Version stamp of the model library, see get_library_version"""
+    row = conn.execute('SELECT epoch, version FROM library_state WHERE id = 1').fetchone()
+    return f"{row['epoch']}-{row['version']}"
+
+@timed(DB_QUERY_SECONDS)
+def get_library_version():
+    """
+    Get the version stamp of the model library
+    
+    Every insert, update or delete of a model changes the stamp, in any
+    process using the database.
+    
+    Returns:
+        str: Version stamp
+    """
+    return _library_stamp(get_connection())
+
+@timed(DB_QUERY_SECONDS)
+def set_derived_assets(content_hash, **assets):
+    """
+    Record files derived from a stored blob on every model that uses it
+    
+    Args:
+        content_hash (str): SHA-256 hex digest of the stored blob
+        **assets: Values for DERIVED_COLUMNS, e.g. lod_levels=3
+        
+    Returns:
+        int: Number of models updated
+    """
+    unknown = set(assets) - set(DERIVED_COLUMNS)
+    if unknown:
+        raise ValueError(f'Unknown derived asset columns: {sorted(unknown)}')
+    
+    conn = get_connection()
+    
+    assignments = ', '.join(f'{column} = ?' for column in assets)
+    with conn:
+        model_ids = [row['id'] for row in conn.execute(
+            f'UPDATE models SET {assignments} WHERE content_hash = ? RETURNING id',
+            (*assets.values(), content_hash)
+        ).fetchall()]
+    MODEL_CACHE.invalidate(*model_ids)
+    
+    return len(model_ids)
+
+def encode_cursor(model, key='upload_date'):
+    """
+    Build an opaque pagination cursor pointing just after a model
+    
+    Args:
+        model (dict): Last model of the current page
+        key (str): Sort column stored in the cursor next to the id
+        
+    Returns:
+        str: URL-safe cursor string
+    """
+    raw = f"{model[key]}|{model['id']}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor created by encode_cursor
+    
+    Args:
+        cursor (str): Cursor string
+        
+    Returns:
+        tuple: (upload_date, id) of the last model already seen
+        
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        upload_date, model_id = base64.urlsafe_b64decode(padded).decode().rsplit('|', 1)
+        return upload_date, int(model_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f'Invalid cursor: {cursor!r}') from e
 
+@timed(DB_QUERY_SECONDS)
+def get_models_page(after=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Get one page of models, newest first, using keyset pagination
+    
+    Args:
+        after (str): Cursor returned with the previous page, or None for the first page
+        limit (int): Maximum number of models on the page
+        
+    Returns:
+        tuple: (list of model dictionaries, cursor for the next page or None)
+        
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    conn = get_connection()
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    
+    # Fetch one extra row to know whether another page follows
+    if after:
+        upload_date, model_id = decode_cursor(after)
+        rows = conn.execute('''
+            SELECT * FROM models
+            WHERE (upload_date, id) < (?, ?)
+            ORDER BY upload_date DESC, id DESC
+            LIMIT ?
+        ''', (upload_date, model_id, limit + 1)).fetchall()
+    else:
+        rows = conn.execute('''
+            SELECT * FROM models
+            ORDER BY upload_date DESC, id DESC
+            LIMIT ?
+        ''', (limit + 1,)).fetchall()
+    
+    models = [_row_to_model(row) for row in rows[:limit]]
+    next_cursor = encode_cursor(models[-1]) if len(rows) > limit else None
+    
+    return models, next_cursor
+
+def fts_query(text):
+    """
+    Turn free text into an FTS5 query that matches every word as a prefix
+    
+    Words are quoted, so FTS5 operators typed by users are searched literally.
+    
+    Args:
+        text (str): Search text
+        
+    Returns:
+        str: FTS5 query, or None if the text has no words
+    """
+    terms = re.findall(r'\w+', text.lower())[:MAX_SEARCH_TERMS]
+    return ' '.join(f'"{term}"*' for term in terms) or None
+
+@timed(DB_QUERY_SECONDS)
+def search_models(text, after=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Search the library, best matches first, using keyset pagination
+    
+    Matches are ranked with bm25 over SEARCH_COLUMNS; the cursor holds the
+    rank and id of the last hit and the library version stamp. bm25 scores
+    depend on the whole library, so once a model is added, changed or
+    removed the saved rank no longer lines up with new scores and the
+    cursor is rejected as stale. Every page still ranks all matches (ORDER
+    BY rank cannot use an index), so deep pages cost as much as the first one.
+    
+    Args:
+        text (str): Search text; every word is matched as a prefix
+        after (str): Cursor returned with the previous page, or None for the first page
+        limit (int): Maximum number of models on the page
+        
+    Returns:
+        tuple: (list of model dictionaries with a score, cursor for the next page or None)
+        
+    Raises:
+        StaleCursor: If the library changed since the cursor was issued
+        ValueError: If the cursor is malformed
+    """
+    query = fts_query(text)
+    if query is None:
+        return [], None
+    
+    conn = get_connection()
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    
+    if after:
+        position, model_id = decode_cursor(after)
+        try:
+            cursor_stamp, rank = position.rsplit('|', 1)
+            rank = float(rank)
+        except ValueError as e:
+            raise ValueError(f'Invalid cursor: {after!r}') from e
+    
+    # Stamp and page come from one snapshot, so the stamp vouches for the ranks
+    with conn:
+        conn.execute('BEGIN')
+        stamp = _library_stamp(conn)
+        if after and cursor_stamp != stamp:
+            raise StaleCursor(f'Library changed since cursor {after!r}')
+        
+        # Fetch one extra row to know whether another page follows
+        if after:
+            rows = conn.execute('''
+                SELECT models.*, models_fts.rank AS score FROM models_fts
+                JOIN models ON models.id = models_fts.rowid
+                WHERE models_fts MATCH ? AND (models_fts.rank, models_fts.rowid) > (?, ?)
+                ORDER BY models_fts.rank, models_fts.rowid
+                LIMIT ?
+            ''', (query, rank, model_id, limit + 1)).fetchall()
+        else:
+            rows = conn.execute('''
+                SELECT models.*, models_fts.rank AS score FROM models_fts
+                JOIN models ON models.id = models_fts.rowid
+                WHERE models_fts MATCH ?
+                ORDER BY models_fts.rank, models_fts.rowid
+                LIMIT ?
+            ''', (query, limit + 1)).fetchall()
+    
+    models = [_row_to_model(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = models[-1]
+        next_cursor = encode_cursor({'id': last['id'], 'position': f"{stamp}|{last['score']}"}, key='position')
+    
+    return models, next_cursor
+
+@timed(DB_QUERY_SECONDS)
 def delete_model(model_id):
     """
     Delete a model from the database
@@ -106,13 +669,557 @@ def delete_model(model_id):
     Returns:
         bool: True if deleted, False if not found
     """
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+    conn = get_connection()
+    
+    with conn:
+        cursor = conn.execute('DELETE FROM models WHERE id = ?', (model_id,))
+    MODEL_CACHE.invalidate(model_id)
+    
+    return cursor.rowcount > 0
+
+@timed(DB_QUERY_SECONDS)
+def delete_models(model_ids):
+    """
+    Delete many models in a single transaction
+    
+    Args:
+        model_ids (list): Model IDs
+        
+    Returns:
+        int: Number of deleted models
+    """
+    conn = get_connection()
+    
+    with conn:
+        cursor = conn.executemany('DELETE FROM models WHERE id = ?', [(model_id,) for model_id in model_ids])
+    MODEL_CACHE.invalidate(*model_ids)
+    
+    return cursor.rowcount
+
+@timed(DB_QUERY_SECONDS)
+def get_model_files(after_id=0, limit=DEFAULT_PAGE_SIZE):
+    """
+    Get the stored file columns of models in ID order, for maintenance sweeps
+    
+    Args:
+        after_id (int): Only return models with a larger ID
+        limit (int): Maximum number of models
+        
+    Returns:
+        list: Dicts with id, filename, file_path, content_hash, thumbnail and compact_filename
+    """
+    conn = get_connection()
+    
+    rows = conn.execute('''
+        SELECT id, filename, file_path, content_hash, thumbnail, compact_filename FROM models
+        WHERE id > ? ORDER BY id LIMIT ?
+    ''', (after_id, limit)).fetchall()
+    
+    return [dict(row) for row in rows]
+
+@timed(DB_QUERY_SECONDS)
+def get_referenced_hashes(content_hashes):
+    """
+    Find which blobs are still used by a model
+    
+    Args:
+        content_hashes (list): SHA-256 hex digests
+        
+    Returns:
+        set: The digests that at least one model refers to
+    """
+    content_hashes = list(content_hashes)
+    if not content_hashes:
+        return set()
+    
+    conn = get_connection()
+    
+    placeholders = ', '.join('?' * len(content_hashes))
+    rows = conn.execute(f'''
+        SELECT DISTINCT content_hash FROM models WHERE content_hash IN ({placeholders})
+    ''', content_hashes).fetchall()
+    
+    return {row['content_hash'] for row in rows}
+
+@timed(DB_QUERY_SECONDS)
+def get_referenced_filenames(filenames):
+    """
+    Find which stored filenames are still used by a model
+    
+    Args:
+        filenames (list): Stored filenames relative to the upload folder
+        
+    Returns:
+        set: The filenames that at least one model refers to
+    """
+    filenames = list(filenames)
+    if not filenames:
+        return set()
+    
+    conn = get_connection()
+    
+    placeholders = ', '.join('?' * len(filenames))
+    rows = conn.execute(f'''
+        SELECT DISTINCT filename FROM models WHERE filename IN ({placeholders})
+    ''', filenames).fetchall()
+    
+    return {row['filename'] for row in rows}
+
+@timed(DB_QUERY_SECONDS)
+def relocate_models(models):
+    """
+    Point models at moved files in a single transaction
+    
+    Args:
+        models (list): Dicts with id and the new filename, file_path,
+            thumbnail and compact_filename
+        
+    Returns:
+        int: Number of updated models
+    """
+    conn = get_connection()
+    
+    with conn:
+        cursor = conn.executemany('''
+            UPDATE models SET filename = :filename, file_path = :file_path,
+                              thumbnail = :thumbnail, compact_filename = :compact_filename
+            WHERE id = :id
+        ''', models)
+    MODEL_CACHE.invalidate(*(model['id'] for model in models))
+    
+    return cursor.rowcount
+
+def _job_to_dict(row):
+    """Convert a jobs row to a dict with decoded JSON fields"""
+    job = dict(row)
+    job['payload'] = json.loads(job['payload'])
+    job['result'] = json.loads(job['result']) if job['result'] is not None else None
+    return job
+
+@timed(DB_QUERY_SECONDS)
+def enqueue_job(kind, model_id=None, payload=None, max_attempts=DEFAULT_JOB_ATTEMPTS):
+    """
+    Add a background processing job to the queue
+    
+    Args:
+        kind (str): Registered task name
+        model_id (int): Optional model the job belongs to
+        payload (dict): JSON-serializable task arguments
+        max_attempts (int): Attempts before the job is marked failed
+        
+    Returns:
+        int: ID of the queued job
+    """
+    conn = get_connection()
+    
+    now = datetime.now().isoformat()
+    
+    with conn:
+        cursor = conn.execute('''
+            INSERT INTO jobs (kind, model_id, payload, max_attempts, run_after, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (kind, model_id, json.dumps(payload or {}), max_attempts, now, now, now))
+    
+    return cursor.lastrowid
+
+@timed(DB_QUERY_SECONDS)
+def enqueue_jobs(jobs, max_attempts=DEFAULT_JOB_ATTEMPTS):
+    """
+    Add many background processing jobs to the queue in a single transaction
+    
+    Args:
+        jobs (list): (kind, model_id, payload) tuples, see enqueue_job
+        max_attempts (int): Attempts before each job is marked failed
+        
+    Returns:
+        int: Number of queued jobs
+    """
+    conn = get_connection()
+    
+    now = datetime.now().isoformat()
+    rows = [(kind, model_id, json.dumps(payload or {}), max_attempts, now, now, now)
+            for kind, model_id, payload in jobs]
+    
+    with conn:
+        conn.executemany('''
+            INSERT INTO jobs (kind, model_id, payload, max_attempts, run_after, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+    
+    return len(rows)
+
+@timed(DB_QUERY_SECONDS)
+def claim_jobs(limit):
+    """
+    Atomically claim due jobs for processing
+    
+    Pending jobs whose retry time has passed and running jobs whose lease
+    expired are marked running with a fresh lease. A job whose lease
+    expired on its last attempt, e.g. because it keeps killing its worker,
+    is marked failed instead.
+    
+    Args:
+        limit (int): Maximum number of jobs to claim
+        
+    Returns:
+        list: Claimed job dictionaries
+    """
+    conn = get_connection()
+    
+    now = datetime.now()
+    lease = (now + timedelta(seconds=JOB_LEASE_SECONDS)).isoformat()
+    
+    with conn:
+        conn.execute('''
+            UPDATE jobs
+            SET status = 'failed', last_error = 'Lease expired: the worker running the job stopped', updated_at = ?
+            WHERE status = 'running' AND run_after <= ? AND attempts >= max_attempts
+        ''', (now.isoformat(), now.isoformat()))
+        rows = conn.execute('''
+            UPDATE jobs
+            SET status = 'running', attempts = attempts + 1, run_after = ?, updated_at = ?
+            WHERE id IN (
+                SELECT id FROM jobs
+                WHERE status IN ('pending', 'running') AND run_after <= ? AND attempts < max_attempts
+                ORDER BY run_after
+                LIMIT ?
+            )
+            RETURNING *
+        ''', (lease, now.isoformat(), now.isoformat(), limit)).fetchall()
+    
+    return [_job_to_dict(row) for row in rows]
+
+@timed(DB_QUERY_SECONDS)
+def renew_job_leases(jobs):
+    """
+    Extend the leases of jobs a worker is still running
+    
+    A job is only renewed while it is running the attempt the worker
+    claimed, so a lease that already expired and was taken over by another
+    worker stays theirs.
+    
+    Args:
+        jobs (list): Job dictionaries as returned by claim_jobs
+        
+    Returns:
+        int: Number of leases renewed
+    """
+    conn = get_connection()
+    
+    now = datetime.now()
+    lease = (now + timedelta(seconds=JOB_LEASE_SECONDS)).isoformat()
+    
+    with conn:
+        cursor = conn.executemany('''
+            UPDATE jobs SET run_after = ?, updated_at = ?
+            WHERE id = ? AND status = 'running' AND attempts = ?
+        ''', [(lease, now.isoformat(), job['id'], job['attempts']) for job in jobs])
+    
+    return cursor.rowcount
+
+@timed(DB_QUERY_SECONDS)
+def complete_job(job_id, result=None):
+    """
+    Mark a job as done
+    
+    Args:
+        job_id (int): Job ID
+        result (dict): JSON-serializable task result
+    """
+    conn = get_connection()
+    
+    with conn:
+        conn.execute('''
+            UPDATE jobs SET status = 'done', result = ?, last_error = NULL, updated_at = ?
+            WHERE id = ?
+        ''', (json.dumps(result), datetime.now().isoformat(), job_id))
+
+@timed(DB_QUERY_SECONDS)
+def fail_job(job_id, error, retry_delay):
+    """
+    Record a failed attempt and schedule a retry if attempts remain
+    
+    Args:
+        job_id (int): Job ID
+        error (str): Error description
+        retry_delay (float): Seconds to wait before the next attempt
+        
+    Returns:
+        bool: True if the job will be retried, False if it is marked failed
+    """
+    conn = get_connection()
+    
+    now = datetime.now()
+    run_after = (now + timedelta(seconds=retry_delay)).isoformat()
+    
+    with conn:
+        row = conn.execute('''
+            UPDATE jobs
+            SET status = CASE WHEN attempts < max_attempts THEN 'pending' ELSE 'failed' END,
+                run_after = ?, last_error = ?, updated_at = ?
+            WHERE id = ?
+            RETURNING status
+        ''', (run_after, error, now.isoformat(), job_id)).fetchone()
+    
+    return row is not None and row['status'] == 'pending'
+
+@timed(DB_QUERY_SECONDS)
+def get_job(job_id):
+    """
+    Get a job by ID
+    
+    Args:
+        job_id (int): Job ID
+        
+    Returns:
+        dict: Job dictionary or None if not found
+    """
+    conn = get_connection()
+    
+    row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    
+    if row:
+        return _job_to_dict(row)
+    return None
+
+@timed(DB_QUERY_SECONDS)
+def find_active_job(kind, payload):
+    """
+    Find a pending or running job with exactly the given payload
+    
+    Args:
+        kind (str): Registered task name
+        payload (dict): Task arguments, serialized the same way as enqueue_job
+        
+    Returns:
+        dict: Job dictionary or None if there is no such job
+    """
+    conn = get_connection()
+    
+    row = conn.execute('''
+        SELECT * FROM jobs
+        WHERE status IN ('pending', 'running') AND kind = ? AND payload = ?
+        ORDER BY id LIMIT 1
+    ''', (kind, json.dumps(payload or {}))).fetchone()
+    
+    if row:
+        return _job_to_dict(row)
+    return None
+
+@timed(DB_QUERY_SECONDS)
+def get_jobs(model_id):
+    """
+    Get all jobs for a model
+    
+    Args:
+        model_id (int): Model ID
+        
+    Returns:
+        list: Job dictionaries, oldest first
+    """
+    conn = get_connection()
+    
+    rows = conn.execute('SELECT * FROM jobs WHERE model_id = ? ORDER BY id', (model_id,)).fetchall()
+    
+    return [_job_to_dict(row) for row in rows]
+
+@timed(DB_QUERY_SECONDS)
+def create_upload_session(upload_id, original_filename, upload_length, ttl=UPLOAD_SESSION_TTL):
+    """
+    Start a resumable upload
+    
+    Args:
+        upload_id (str): Unguessable session ID
+        original_filename (str): Sanitized name of the uploaded file
+        upload_length (int): Total size of the file in bytes
+        ttl (float): Seconds without progress before the session expires
+        
+    Returns:
+        dict: Upload session dictionary
+    """
+    conn = get_connection()
+    
+    now = datetime.now()
+    expires_at = (now + timedelta(seconds=ttl)).isoformat()
+    
+    with conn:
+        row = conn.execute('''
+            INSERT INTO upload_sessions (id, original_filename, upload_length, expires_at, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            RETURNING *
+        ''', (upload_id, original_filename, upload_length, expires_at, now.isoformat(), now.isoformat())).fetchone()
+    
+    return dict(row)
+
+@timed(DB_QUERY_SECONDS)
+def get_upload_session(upload_id):
+    """
+    Get a resumable upload by ID
+    
+    Args:
+        upload_id (str): Session ID
+        
+    Returns:
+        dict: Upload session dictionary or None if not found; expired
+            sessions are returned until they are purged
+    """
+    conn = get_connection()
+    
+    row = conn.execute('SELECT * FROM upload_sessions WHERE id = ?', (upload_id,)).fetchone()
+    
+    if row:
+        return dict(row)
+    return None
+
+@timed(DB_QUERY_SECONDS)
+def advance_upload_session(upload_id, upload_offset, ttl=UPLOAD_SESSION_TTL):
+    """
+    Record that a resumable upload is durable up to a new offset
+    
+    Args:
+        upload_id (str): Session ID
+        upload_offset (int): Bytes stored so far
+        ttl (float): Seconds from now before the session expires
+        
+    Returns:
+        dict: Updated upload session dictionary or None if not found
+    """
+    conn = get_connection()
+    
+    now = datetime.now()
+    expires_at = (now + timedelta(seconds=ttl)).isoformat()
+    
+    # The chunk is already fsynced and the client is told this offset, so it
+    # may drop those bytes; losing the update on power loss would strand it
+    with _durable(conn):
+        row = conn.execute('''
+            UPDATE upload_sessions SET upload_offset = ?, expires_at = ?, updated_at = ?
+            WHERE id = ?
+            RETURNING *
+        ''', (upload_offset, expires_at, now.isoformat(), upload_id)).fetchone()
+    
+    if row:
+        return dict(row)
+    return None
+
+@timed(DB_QUERY_SECONDS)
+def delete_upload_session(upload_id, expired_only=False):
+    """
+    Delete a resumable upload
+    
+    Args:
+        upload_id (str): Session ID
+        expired_only (bool): Only delete the session if it has expired
+        
+    Returns:
+        bool: True if deleted, False if not found (or not expired)
+    """
+    conn = get_connection()
+    
+    query = 'DELETE FROM upload_sessions WHERE id = ?'
+    params = (upload_id,)
+    if expired_only:
+        query += ' AND expires_at < ?'
+        params += (datetime.now().isoformat(),)
+    
+    with conn:
+        cursor = conn.execute(query, params)
+    
+    return cursor.rowcount > 0
+
+@timed(DB_QUERY_SECONDS)
+def get_expired_upload_sessions(limit=DEFAULT_PAGE_SIZE):
+    """
+    Get IDs of resumable uploads that expired
+    
+    Args:
+        limit (int): Maximum number of IDs
+        
+    Returns:
+        list: Session IDs, longest expired first
+    """
+    conn = get_connection()
+    
+    rows = conn.execute('''
+        SELECT id FROM upload_sessions WHERE expires_at < ? ORDER BY expires_at LIMIT ?
+    ''', (datetime.now().isoformat(), limit)).fetchall()
+    
+    return [row['id'] for row in rows]
+
+@timed(DB_QUERY_SECONDS)
+def add_generated_model(params_key, model_id, owned):
+    """
+    Remember the library model of a generated variant
+    
+    Args:
+        params_key (str): Key of the validated generation parameters
+        model_id (int): Model ID
+        owned (bool): Whether generation added the model, rather than
+            finding identical content already in the library
+    """
+    conn = get_connection()
+    
+    with conn:
+        conn.execute('''
+            INSERT OR REPLACE INTO generated_models (params_key, model_id, owned, last_used)
+            VALUES (?, ?, ?, ?)
+        ''', (params_key, model_id, int(owned), datetime.now().isoformat()))
+
+@timed(DB_QUERY_SECONDS)
+def get_generated_model(params_key):
+    """
+    Look up the library model of a generated variant and mark it recently used
     
-    cursor.execute('DELETE FROM models WHERE id = ?', (model_id,))
-    deleted = cursor.rowcount > 0
+    Args:
+        params_key (str): Key of the validated generation parameters
+        
+    Returns:
+        int: Model ID, or None if the variant was never generated, was
+            evicted or its model was deleted
+    """
+    conn = get_connection()
+    
+    with conn:
+        row = conn.execute('''
+            UPDATE generated_models SET last_used = ?
+            WHERE params_key = ? AND model_id IN (SELECT id FROM models)
+            RETURNING model_id
+        ''', (datetime.now().isoformat(), params_key)).fetchone()
+    
+    return row['model_id'] if row else None
+
+@timed(DB_QUERY_SECONDS)
+def get_generated_models():
+    """
+    Get the generated variants in the library, least recently used first
+    
+    Returns:
+        list: Dicts with params_key, model_id, owned, filename, content_hash and file_size
+    """
+    conn = get_connection()
+    
+    rows = conn.execute('''
+        SELECT g.params_key, g.model_id, g.owned, m.filename, m.content_hash, m.file_size
+        FROM generated_models g JOIN models m ON m.id = g.model_id
+        ORDER BY g.last_used
+    ''').fetchall()
+    
+    return [dict(row) for row in rows]
+
+@timed(DB_QUERY_SECONDS)
+def delete_generated_model(params_key):
+    """
+    Forget a generated variant
+    
+    Args:
+        params_key (str): Key of the validated generation parameters
+        
+    Returns:
+        bool: True if deleted, False if not found
+    """
+    conn = get_connection()
     
-    conn.commit()
-    conn.close()
+    with conn:
+        cursor = conn.execute('DELETE FROM generated_models WHERE params_key = ?', (params_key,))
     
-    return deleted
+    return cursor.rowcount > 0
@@ -0,0 +1,157 @@
+"""
+Generation module for 3D Model Viewer
+Validates parametric temple requests and keeps the generated models in the library within a size budget
+"""
+import hashlib
+import io
+import json
+import math
+import os
+
+GENERATED_CACHE_MAX_BYTES = 256 * 1024 * 1024
+MAX_COORDINATE = 1000.0
+
+# Parameter name -> (type, default, minimum, maximum)
+TEMPLE_PARAMETERS = {
+    'columns': (int, 6, 2, 12),
+    'flutes': (int, 20, 0, 48),
+    'pool_width': (float, 8.0, 2.0, 14.0),
+    'pool_depth': (float, 4.0, 1.0, 8.0),
+}
+
+def validate_params(data):
+    """
+    Validate temple parameters and fill in defaults
+
+    Args:
+        data (dict): Requested parameters; missing ones use their default.
+            target_position is a list [x, y, z] or a string "x,y,z"
+
+    Returns:
+        dict: Canonical parameters, including target_position as a list of 3 floats
+
+    Raises:
+        ValueError: With a user-facing message if a parameter is unknown or out of range
+    """
+    data = dict(data or {})
+    params = {}
+    for name, (kind, default, low, high) in TEMPLE_PARAMETERS.items():
+        value = data.pop(name, default)
+        if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+            raise ValueError(f'{name} moet een getal zijn')
+        try:
+            number = float(value)
+        except ValueError:
+            raise ValueError(f'{name} moet een getal zijn') from None
+        if kind is int and not number.is_integer():
+            raise ValueError(f'{name} moet een geheel getal zijn')
+        if not low <= number <= high:
+            raise ValueError(f'{name} moet tussen {low} en {high} liggen')
+        # Round floats so equivalent requests share one cache entry
+        params[name] = int(number) if kind is int else round(number, 3)
+
+    position = data.pop('target_position', [0.0, 0.0, 0.0])
+    if isinstance(position, str):
+        # Form posts send "x,y,z"; JSON sends [x, y, z]
+        position = position.split(',')
+    if not isinstance(position, (list, tuple)) or any(isinstance(value, bool) for value in position):
+        raise ValueError('target_position moet drie getallen bevatten')
+    try:
+        position = [round(float(value), 3) for value in position]
+    except (TypeError, ValueError):
+        raise ValueError('target_position moet drie getallen bevatten') from None
+    if len(position) != 3 or not all(math.isfinite(v) and abs(v) <= MAX_COORDINATE for v in position):
+        raise ValueError(f'target_position moet drie getallen tussen -{MAX_COORDINATE:g} en {MAX_COORDINATE:g} bevatten')
+    params['target_position'] = position
+
+    if data:
+        raise ValueError(f'Onbekende parameter: {sorted(data)[0]}')
+    return params
+
+def params_key(params):
+    """SHA-256 hex digest of the canonical JSON form of validated parameters"""
+    canonical = json.dumps(params, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def generate_temple(params, upload_folder):
+    """
+    Generate a temple GLB and store it content-addressed in the upload folder
+
+    Args:
+        params (dict): Parameters from validate_params
+        upload_folder (str): Upload folder
+
+    Returns:
+        StoredFile: The stored model, see store_upload
+    """
+    from generate_greek_temple import export_instanced_temple
+    from gltf_parser import parse_model
+    from storage import store_upload
+
+    options = dict(params)
+    data = export_instanced_temple(target_position=options.pop('target_position'), **options)
+    return store_upload(io.BytesIO(data), upload_folder, 'glb', validate=parse_model)
+
+def remove_blob_files(upload_folder, filename):
+    """
+    Remove a stored blob and every file derived from it
+
+    Args:
+        upload_folder (str): Upload folder
+        filename (str): Stored filename relative to the upload folder
+
+    Returns:
+        list: Removed filenames
+    """
+    from maintenance import remove_empty_shards
+
+    path = os.path.join(upload_folder, filename)
+    directory = os.path.dirname(path)
+    prefix = os.path.basename(filename).split('.', 1)[0] + '.'
+    removed = []
+    for name in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+        if name.startswith(prefix):
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                continue
+            removed.append(name)
+    if os.path.isdir(directory):
+        remove_empty_shards(path, upload_folder)
+    return removed
+
+def evict_generated(upload_folder, max_bytes=GENERATED_CACHE_MAX_BYTES, keep=None):
+    """
+    Delete least recently used generated models until they fit in max_bytes
+
+    Only models that generation added count and can be evicted; a variant
+    whose content was already in the library is merely forgotten. Files
+    are removed once no model uses the blob any more. Recency is updated
+    by get_generated_model on every cache hit.
+
+    Args:
+        upload_folder (str): Upload folder
+        max_bytes (int): Size budget for the generated blobs
+        keep (str): Optional parameter key that must not be evicted
+
+    Returns:
+        list: Parameter keys of the evicted variants
+    """
+    from database import delete_generated_model, delete_model, get_generated_models, get_referenced_hashes
+
+    entries = [entry for entry in get_generated_models() if entry['owned']]
+    total = sum(entry['file_size'] or 0 for entry in entries)
+
+    evicted = []
+    for entry in entries:
+        if total <= max_bytes:
+            break
+        if entry['params_key'] == keep:
+            continue
+        delete_generated_model(entry['params_key'])
+        delete_model(entry['model_id'])
+        if entry['content_hash'] not in get_referenced_hashes([entry['content_hash']]):
+            remove_blob_files(upload_folder, entry['filename'])
+        total -= entry['file_size'] or 0
+        evicted.append(entry['params_key'])
+    return evicted
@@ -0,0 +1,243 @@
+"""
+glTF parser module for 3D Model Viewer
+Reads model metadata from GLB/glTF files without decoding any buffers
+"""
+import json
+import mmap
+import os
+import struct
+
+GLB_MAGIC = b'glTF'
+GLB_VERSION = 2
+GLB_HEADER = struct.Struct('<4sII')   # magic, version, total length
+CHUNK_HEADER = struct.Struct('<II')   # chunk length, chunk type
+CHUNK_JSON = 0x4E4F534A
+CHUNK_BIN = 0x004E4942
+INSTANCING_EXTENSION = 'EXT_mesh_gpu_instancing'
+MAX_KEYWORDS_LENGTH = 1000  # characters of names kept for full-text search
+
+# Triangle count per primitive mode, as a function of the index count
+TRIANGLES_PER_MODE = {
+    4: lambda n: n // 3,           # TRIANGLES
+    5: lambda n: max(n - 2, 0),    # TRIANGLE_STRIP
+    6: lambda n: max(n - 2, 0),    # TRIANGLE_FAN
+}
+
+class InvalidModelError(ValueError):
+    """Raised when a file is not a valid glTF 2.0 model"""
+
+def _parse_glb(data, size, load_binary):
+    """Walk the chunks of GLB data (bytes or mmap) and return (document, binary)"""
+    if size < GLB_HEADER.size + CHUNK_HEADER.size:
+        raise InvalidModelError('GLB-header is onvolledig')
+    _, version, length = GLB_HEADER.unpack_from(data, 0)
+    if version != GLB_VERSION:
+        raise InvalidModelError(f'GLB-versie {version} wordt niet ondersteund')
+    if length != size:
+        raise InvalidModelError('GLB-lengte komt niet overeen met bestandsgrootte')
+
+    # Walk the chunk headers so truncated or misaligned files are rejected
+    offset = GLB_HEADER.size
+    document = None
+    binary = None
+    while offset < length:
+        if offset + CHUNK_HEADER.size > length:
+            raise InvalidModelError('GLB-chunk is onvolledig')
+        chunk_length, chunk_type = CHUNK_HEADER.unpack_from(data, offset)
+        start = offset + CHUNK_HEADER.size
+        if start + chunk_length > length or chunk_length % 4:
+            raise InvalidModelError('GLB-chunk heeft een ongeldige lengte')
+        if document is None:
+            if chunk_type != CHUNK_JSON:
+                raise InvalidModelError('Eerste GLB-chunk moet JSON zijn')
+            try:
+                document = json.loads(data[start:start + chunk_length])
+            except (ValueError, UnicodeDecodeError) as e:
+                raise InvalidModelError('GLB bevat ongeldige JSON') from e
+        elif load_binary and binary is None and chunk_type == CHUNK_BIN:
+            binary = data[start:start + chunk_length]
+        offset = start + chunk_length
+
+    if document is None:
+        raise InvalidModelError('GLB bevat geen JSON-chunk')
+    return document, binary
+
+def _read_document(path, load_binary):
+    """Read the JSON document and, if requested, the GLB binary chunk"""
+    size = os.path.getsize(path)
+    if size == 0:
+        raise InvalidModelError('Leeg bestand')
+
+    with open(path, 'rb') as f:
+        if f.read(4) != GLB_MAGIC:
+            f.seek(0)
+            try:
+                return json.load(f), None
+            except (ValueError, UnicodeDecodeError) as e:
+                raise InvalidModelError('Geen geldig glTF- of GLB-bestand') from e
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return _parse_glb(mm, size, load_binary)
+
+def read_gltf_json(path):
+    """
+    Read the glTF JSON document of a .glb or .gltf file
+
+    GLB files are memory-mapped and only the 12-byte header, the chunk
+    headers and the JSON chunk are touched; binary buffers are never read.
+
+    Args:
+        path (str): Path to the model file
+
+    Returns:
+        dict: Parsed glTF JSON document
+
+    Raises:
+        InvalidModelError: If the file is not a well-formed glTF 2.0 model
+    """
+    return _read_document(path, load_binary=False)[0]
+
+def read_glb(path):
+    """
+    Read the glTF JSON document and the embedded binary buffer of a model file
+
+    Args:
+        path (str): Path to the model file
+
+    Returns:
+        tuple: (document, binary); binary is None for .gltf files and GLBs
+            without a BIN chunk
+
+    Raises:
+        InvalidModelError: If the file is not a well-formed glTF 2.0 model
+    """
+    return _read_document(path, load_binary=True)
+
+def unpack_glb(data):
+    """
+    Read the glTF JSON document and binary buffer from GLB bytes in memory
+
+    Args:
+        data (bytes): GLB file contents
+
+    Returns:
+        tuple: (document, binary); binary is None without a BIN chunk
+
+    Raises:
+        InvalidModelError: If the data is not a well-formed GLB
+    """
+    if data[:4] != GLB_MAGIC:
+        raise InvalidModelError('Geen geldig GLB-bestand')
+    return _parse_glb(data, len(data), load_binary=True)
+
+def extract_keywords(gltf):
+    """
+    Collect the asset info and scene, node, mesh and material names of a glTF document
+
+    Args:
+        gltf (dict): Parsed glTF JSON document
+
+    Returns:
+        str: Unique names separated by spaces, or None if there are none
+    """
+    asset = gltf.get('asset', {})
+    names = [asset.get('generator'), asset.get('copyright')]
+    for key in ('scenes', 'nodes', 'meshes', 'materials'):
+        names += [item.get('name') for item in gltf.get(key, []) if isinstance(item, dict)]
+    unique = dict.fromkeys(name.strip() for name in names if isinstance(name, str) and name.strip())
+    return ' '.join(unique)[:MAX_KEYWORDS_LENGTH] or None
+
+def extract_metadata(gltf):
+    """
+    Summarize a glTF document using only its JSON and accessor metadata
+
+    Vertex and triangle totals come from accessor counts, multiplied by the
+    instance count of meshes drawn with EXT_mesh_gpu_instancing; the
+    bounding box is the union of the POSITION accessors' min/max in mesh
+    space.
+
+    Args:
+        gltf (dict): Parsed glTF JSON document
+
+    Returns:
+        dict: mesh_count, node_count, material_count, vertex_count,
+              triangle_count, bounds ([min_xyz, max_xyz] or None) and
+              keywords (see extract_keywords)
+
+    Raises:
+        InvalidModelError: If required fields are missing or inconsistent
+    """
+    if not isinstance(gltf, dict) or not isinstance(gltf.get('asset'), dict):
+        raise InvalidModelError('glTF mist het verplichte asset-object')
+    if not str(gltf['asset'].get('version', '')).startswith('2.'):
+        raise InvalidModelError('Alleen glTF 2.0 wordt ondersteund')
+
+    accessors = gltf.get('accessors', [])
+    meshes = gltf.get('meshes', [])
+
+    def accessor(index):
+        if not isinstance(index, int) or not 0 <= index < len(accessors):
+            raise InvalidModelError(f'Accessor {index} bestaat niet')
+        return accessors[index]
+
+    # Every instance beyond the first of an instanced node draws its mesh again
+    copies = {}
+    try:
+        for node in gltf.get('nodes', []):
+            instancing = node.get('extensions', {}).get(INSTANCING_EXTENSION)
+            if instancing and 'mesh' in node:
+                count = accessor(next(iter(instancing['attributes'].values())))['count']
+                copies[node['mesh']] = copies.get(node['mesh'], 1) + count - 1
+    except (AttributeError, StopIteration, KeyError, TypeError) as e:
+        raise InvalidModelError(f'Ongeldige instancing-definitie: {e}') from e
+
+    vertex_count = 0
+    triangle_count = 0
+    bounds_min = [float('inf')] * 3
+    bounds_max = [float('-inf')] * 3
+
+    try:
+        for mesh_index, mesh in enumerate(meshes):
+            instances = copies.get(mesh_index, 1)
+            for primitive in mesh['primitives']:
+                position = accessor(primitive['attributes']['POSITION'])
+                vertex_count += position['count'] * instances
+
+                if 'indices' in primitive:
+                    index_count = accessor(primitive['indices'])['count']
+                else:
+                    index_count = position['count']
+                count_triangles = TRIANGLES_PER_MODE.get(primitive.get('mode', 4))
+                if count_triangles:
+                    triangle_count += count_triangles(index_count) * instances
+
+                if 'min' in position and 'max' in position:
+                    bounds_min = [min(a, b) for a, b in zip(bounds_min, position['min'])]
+                    bounds_max = [max(a, b) for a, b in zip(bounds_max, position['max'])]
+    except (KeyError, TypeError) as e:
+        raise InvalidModelError(f'Ongeldige mesh-definitie: {e}') from e
+
+    return {
+        'mesh_count': len(meshes),
+        'node_count': len(gltf.get('nodes', [])),
+        'material_count': len(gltf.get('materials', [])),
+        'vertex_count': vertex_count,
+        'triangle_count': triangle_count,
+        'bounds': [bounds_min, bounds_max] if vertex_count and bounds_min[0] != float('inf') else None,
+        'keywords': extract_keywords(gltf),
+    }
+
+def parse_model(path):
+    """
+    Validate a model file and extract its metadata
+
+    Args:
+        path (str): Path to a .glb or .gltf file
+
+    Returns:
+        dict: Metadata as returned by extract_metadata
+
+    Raises:
+        InvalidModelError: If the file is not a valid glTF 2.0 model
+    """
+    return extract_metadata(read_gltf_json(path))
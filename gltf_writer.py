@@ -0,0 +1,245 @@
+"""
+glTF writer module for 3D Model Viewer
+Writes GLB files that store each primitive once and draw it with EXT_mesh_gpu_instancing
+"""
+import json
+import struct
+import numpy as np
+from gltf_parser import (CHUNK_BIN, CHUNK_JSON, GLB_HEADER, GLB_MAGIC, GLB_VERSION,
+                         INSTANCING_EXTENSION, read_glb)
+
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+
+COMPONENT_DTYPES = {
+    5120: np.int8,
+    5121: np.uint8,
+    5122: np.int16,
+    5123: np.uint16,
+    5125: np.uint32,
+    5126: np.float32,
+}
+TYPE_COMPONENTS = {'SCALAR': 1, 'VEC2': 2, 'VEC3': 3, 'VEC4': 4, 'MAT4': 16}
+
+def pack_glb(document, binary):
+    """
+    Pack a glTF JSON document and its binary buffer into GLB bytes
+
+    Args:
+        document (dict): glTF JSON document
+        binary (bytes): Contents of buffer 0, or empty for none
+
+    Returns:
+        bytes: GLB file contents
+    """
+    encoded = json.dumps(document, separators=(',', ':')).encode('utf-8')
+    encoded += b' ' * (-len(encoded) % 4)
+    chunks = struct.pack('<II', len(encoded), CHUNK_JSON) + encoded
+    if binary:
+        binary = bytes(binary) + b'\0' * (-len(binary) % 4)
+        chunks += struct.pack('<II', len(binary), CHUNK_BIN) + binary
+    return GLB_HEADER.pack(GLB_MAGIC, GLB_VERSION, GLB_HEADER.size + len(chunks)) + chunks
+
+class BufferBuilder:
+    """Accumulates accessors and buffer views for a single GLB buffer"""
+
+    def __init__(self):
+        self.chunks = []
+        self.length = 0
+        self.buffer_views = []
+        self.accessors = []
+
+    def add(self, array, accessor_type, target=None, bounds=False, normalized=False):
+        """
+        Append an array as a new buffer view and accessor
+
+        Rows wider than the accessor type are padding: the extra columns are
+        stored (keeping vertex attributes 4-byte aligned) and skipped with a
+        byte stride.
+
+        Args:
+            array (ndarray): Data with a dtype from COMPONENT_DTYPES
+            accessor_type (str): glTF accessor type, e.g. 'VEC3'
+            target (int): Optional buffer view target
+            bounds (bool): Store min/max, required for POSITION
+            normalized (bool): Integer values map to [0, 1] or [-1, 1]
+
+        Returns:
+            int: Accessor index
+        """
+        array = np.ascontiguousarray(array)
+        component = next(code for code, dtype in COMPONENT_DTYPES.items() if array.dtype == dtype)
+        padding = -self.length % 4
+        self.chunks.append(b'\0' * padding)
+        self.length += padding
+
+        rows = array.reshape(len(array), -1)
+        view = {'buffer': 0, 'byteOffset': self.length, 'byteLength': array.nbytes}
+        if rows.shape[1] > TYPE_COMPONENTS[accessor_type]:
+            view['byteStride'] = rows.strides[0]
+            rows = rows[:, :TYPE_COMPONENTS[accessor_type]]
+        if target is not None:
+            view['target'] = target
+        self.buffer_views.append(view)
+        self.chunks.append(array.tobytes())
+        self.length += array.nbytes
+
+        accessor = {
+            'bufferView': len(self.buffer_views) - 1,
+            'componentType': component,
+            'count': len(rows),
+            'type': accessor_type,
+        }
+        if normalized:
+            accessor['normalized'] = True
+        if bounds:
+            accessor['min'] = rows.min(axis=0).tolist()
+            accessor['max'] = rows.max(axis=0).tolist()
+        self.accessors.append(accessor)
+        return len(self.accessors) - 1
+
+    def tobytes(self):
+        return b''.join(self.chunks)
+
+def export_instanced_glb(parts, matrix=None):
+    """
+    Export primitive instances as a GLB with shared geometry
+
+    Every primitive's vertices and indices are stored once. Instances are
+    grouped by color into one mesh per (primitive, color) pair that shares
+    the primitive's accessors and uses a flat material; groups with more
+    than one instance carry their offsets as EXT_mesh_gpu_instancing
+    translations.
+
+    Args:
+        parts (list): (mesh, offsets, colors) tuples as collected by MeshBuilder
+        matrix (ndarray): Optional 4x4 transform of the whole model
+
+    Returns:
+        bytes: GLB file contents
+    """
+    buffer = BufferBuilder()
+    materials, meshes, nodes = [], [], []
+    material_index = {}
+
+    for mesh, offsets, colors in parts:
+        vertices = np.asarray(mesh.vertices, dtype=np.float32)
+        faces = np.asarray(mesh.faces)
+        index_dtype = np.uint16 if len(vertices) <= 0xFFFF else np.uint32
+        position = buffer.add(vertices, 'VEC3', ARRAY_BUFFER, bounds=True)
+        indices = buffer.add(faces.astype(index_dtype).ravel(), 'SCALAR', ELEMENT_ARRAY_BUFFER)
+
+        unique_colors, group = np.unique(colors, axis=0, return_inverse=True)
+        for color_id, color in enumerate(unique_colors):
+            key = tuple(color.tolist())
+            if key not in material_index:
+                material_index[key] = len(materials)
+                materials.append({
+                    'pbrMetallicRoughness': {
+                        'baseColorFactor': [channel / 255 for channel in key],
+                        'metallicFactor': 0.0,
+                        'roughnessFactor': 1.0,
+                    },
+                })
+            meshes.append({'primitives': [{
+                'attributes': {'POSITION': position},
+                'indices': indices,
+                'material': material_index[key],
+            }]})
+
+            placed = offsets[np.asarray(group).ravel() == color_id]
+            node = {'mesh': len(meshes) - 1}
+            if len(placed) == 1:
+                node['translation'] = placed[0].tolist()
+            else:
+                translations = buffer.add(placed.astype(np.float32), 'VEC3', bounds=True)
+                node['extensions'] = {INSTANCING_EXTENSION: {'attributes': {'TRANSLATION': translations}}}
+            nodes.append(node)
+
+    root = {'children': list(range(len(nodes)))}
+    if matrix is not None:
+        # glTF matrices are column-major
+        root['matrix'] = np.asarray(matrix, dtype=float).T.ravel().tolist()
+    nodes.append(root)
+
+    binary = buffer.tobytes()
+    document = {
+        'asset': {'version': '2.0', 'generator': '3D Model Viewer'},
+        'extensionsUsed': [INSTANCING_EXTENSION],
+        'scene': 0,
+        'scenes': [{'nodes': [len(nodes) - 1]}],
+        'nodes': nodes,
+        'meshes': meshes,
+        'materials': materials,
+        'accessors': buffer.accessors,
+        'bufferViews': buffer.buffer_views,
+        'buffers': [{'byteLength': len(binary)}],
+    }
+    return pack_glb(document, binary)
+
+def read_accessor(document, binary, index):
+    """
+    Decode an accessor from the GLB binary chunk
+
+    Args:
+        document (dict): glTF JSON document
+        binary (bytes): GLB binary chunk
+        index (int): Accessor index
+
+    Returns:
+        ndarray: (count, components) float64 values, normalized if flagged
+    """
+    accessor = document['accessors'][index]
+    view = document['bufferViews'][accessor['bufferView']]
+    dtype = np.dtype(COMPONENT_DTYPES[accessor['componentType']])
+    components = TYPE_COMPONENTS[accessor['type']]
+    stride = view.get('byteStride', dtype.itemsize * components)
+    offset = view.get('byteOffset', 0) + accessor.get('byteOffset', 0)
+    values = np.ndarray((accessor['count'], components), dtype=dtype, buffer=binary,
+                        offset=offset, strides=(stride, dtype.itemsize)).astype(np.float64)
+    if accessor.get('normalized') and dtype.kind in 'iu':
+        values = np.maximum(values / np.iinfo(dtype).max, -1.0)
+    return values
+
+def expand_instancing(path):
+    """
+    Rewrite a GLB so EXT_mesh_gpu_instancing instances become plain nodes
+
+    Loaders without instancing support (trimesh among them) would otherwise
+    see a single copy of every instanced mesh.
+
+    Args:
+        path (str): Path to a model file
+
+    Returns:
+        bytes: Expanded GLB contents, or None if the file uses no instancing
+    """
+    document, binary = read_glb(path)
+    if INSTANCING_EXTENSION not in document.get('extensionsUsed', []) or binary is None:
+        return None
+
+    nodes = document.get('nodes', [])
+    for node in list(nodes):
+        instancing = node.get('extensions', {}).pop(INSTANCING_EXTENSION, None)
+        if instancing is None or 'mesh' not in node:
+            continue
+        attributes = {name: read_accessor(document, binary, accessor)
+                      for name, accessor in instancing['attributes'].items()}
+        count = len(next(iter(attributes.values())))
+        mesh = node.pop('mesh')
+        children = node.setdefault('children', [])
+        for i in range(count):
+            child = {'mesh': mesh}
+            if 'TRANSLATION' in attributes:
+                child['translation'] = attributes['TRANSLATION'][i].tolist()
+            if 'ROTATION' in attributes:
+                child['rotation'] = attributes['ROTATION'][i].tolist()
+            if 'SCALE' in attributes:
+                child['scale'] = attributes['SCALE'][i].tolist()
+            children.append(len(nodes))
+            nodes.append(child)
+
+    document['extensionsUsed'].remove(INSTANCING_EXTENSION)
+    if INSTANCING_EXTENSION in document.get('extensionsRequired', []):
+        document['extensionsRequired'].remove(INSTANCING_EXTENSION)
+    return pack_glb(document, binary)
@@ -0,0 +1,28 @@
+"""
+Gunicorn configuration for 3D Model Viewer
+Pre-forks WEB_CONCURRENCY workers with WEB_THREADS threads each
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:5001')
+
+# Uploads spend most of their time in I/O and SQLite, which release the GIL,
+# so each worker also serves requests on a few threads
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('WEB_THREADS', 4))
+worker_class = 'gthread'
+
+# Import the app and initialize the schema once in the master, then fork
+preload_app = True
+
+# 50MB uploads on slow connections, and bulk uploads of many of them
+timeout = int(os.environ.get('WEB_TIMEOUT', 300))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then, staggered so they do not restart together
+max_requests = 10000
+max_requests_jitter = 1000
+
+accesslog = '-'
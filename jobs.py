@@ -0,0 +1,320 @@
+"""
+Background processing module for 3D Model Viewer
+Runs post-upload work in a process pool, tracked in the jobs table
+"""
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, BrokenExecutor, wait
+from database import (ensure_schema, add_generated_model, add_model, claim_jobs, complete_job, enqueue_jobs, fail_job,
+                      get_model_by_hash, renew_job_leases, set_derived_assets, JOB_LEASE_SECONDS)
+from storage import StoredFile, write_sidecars
+
+POLL_INTERVAL = 1.0     # seconds between queue polls when idle
+LEASE_RENEWAL_INTERVAL = JOB_LEASE_SECONDS / 3  # seconds between lease renewals of running jobs
+RETRY_BASE_DELAY = 5    # seconds before the first retry
+RETRY_MAX_DELAY = 600   # cap for the exponential backoff
+
+# Task name -> function(payload) returning a JSON-serializable result.
+# Tasks run in worker processes, so they must be module-level functions.
+TASKS = {}
+
+# Task name -> function(job, result) run in the worker thread to store results;
+# a handler may add fields to the result before it is saved with the job
+RESULT_HANDLERS = {}
+
+def task(kind, on_complete=None):
+    """Register a function as the handler for a job kind"""
+    def register(func):
+        TASKS[kind] = func
+        if on_complete is not None:
+            RESULT_HANDLERS[kind] = on_complete
+        return func
+    return register
+
+@task('sidecars')
+def compress_sidecars(payload):
+    """Write precompressed sidecars for a stored model"""
+    return {'encodings': write_sidecars(payload['path'])}
+
+def record_lod_levels(job, result):
+    """Store the number of generated LOD levels on the models using the blob"""
+    set_derived_assets(job['payload']['content_hash'], lod_levels=len(result['levels']))
+
+@task('lod', on_complete=record_lod_levels)
+def build_lods(payload):
+    """Generate simplified LOD levels and their sidecars for a stored model"""
+    from lod import generate_lods
+
+    levels = generate_lods(payload['path'])
+    directory = os.path.dirname(payload['path'])
+    for level in levels:
+        write_sidecars(os.path.join(directory, level['filename']))
+    return {'levels': levels}
+
+def derived_name(payload, filename):
+    """Path of a derived file relative to the upload folder, next to the job's stored model"""
+    directory = os.path.dirname(payload.get('filename', ''))
+    return f'{directory}/{filename}' if directory else filename
+
+def record_thumbnail(job, result):
+    """Store the thumbnail path on the models using the blob"""
+    if result['thumbnail']:
+        set_derived_assets(job['payload']['content_hash'],
+                           thumbnail=derived_name(job['payload'], result['thumbnail']))
+
+@task('thumbnail', on_complete=record_thumbnail)
+def build_thumbnail(payload):
+    """Render and cache the library thumbnail of a stored model"""
+    from thumbnail import generate_thumbnail
+
+    return {'thumbnail': generate_thumbnail(payload['path'])}
+
+def record_compact(job, result):
+    """Store the compacted file's path on the models using the blob"""
+    if result['filename']:
+        set_derived_assets(job['payload']['content_hash'],
+                           compact_filename=derived_name(job['payload'], result['filename']))
+
+@task('compact', on_complete=record_compact)
+def build_compact(payload):
+    """Write a welded, quantized copy of a stored model and its sidecars"""
+    from mesh_optimize import write_compact
+
+    result = write_compact(payload['path'])
+    if result['filename']:
+        write_sidecars(os.path.join(os.path.dirname(payload['path']), result['filename']))
+    return result
+
+def record_generated_model(job, result):
+    """Register a generated model in the library, remember it by parameter key and enforce the size budget"""
+    from generation import evict_generated
+
+    payload = job['payload']
+    stored = StoredFile(**result.pop('stored'))
+    existing = get_model_by_hash(stored.digest) if stored.reused else None
+    if existing is not None:
+        model_id = existing['id']
+    else:
+        model_id = register_stored_model(stored, payload['name'], compact=payload['compact'])
+    add_generated_model(payload['key'], model_id, owned=existing is None)
+    evict_generated(payload['upload_folder'], payload['cache_max_bytes'], keep=payload['key'])
+    result['model_id'] = model_id
+
+@task('generate', on_complete=record_generated_model)
+def build_generated_model(payload):
+    """Generate a parametric temple straight into the upload folder"""
+    from generation import generate_temple
+
+    return {'stored': generate_temple(payload['params'], payload['upload_folder'])._asdict()}
+
+def post_processing_jobs(model_id, stored, compact=True):
+    """
+    Background work for a newly stored blob
+
+    Args:
+        model_id (int): Model the jobs belong to
+        stored (StoredFile): Result of store_upload
+        compact (bool): Also write a welded, quantized copy for the viewer
+
+    Returns:
+        list: (kind, model_id, payload) tuples for enqueue_jobs; empty for reused blobs
+    """
+    if stored.reused:
+        return []
+    blob = {'path': stored.path, 'filename': stored.filename, 'content_hash': stored.digest}
+    jobs = [
+        ('sidecars', model_id, {'path': stored.path}),
+        ('lod', model_id, blob),
+        ('thumbnail', model_id, blob),
+    ]
+    if compact:
+        jobs.append(('compact', model_id, blob))
+    return jobs
+
+def enqueue_post_processing(model_id, stored, compact=True):
+    """
+    Queue the background work for a newly stored blob
+
+    Args:
+        model_id (int): Model the jobs belong to
+        stored (StoredFile): Result of store_upload
+        compact (bool): Also write a welded, quantized copy for the viewer
+    """
+    jobs = post_processing_jobs(model_id, stored, compact)
+    if jobs:
+        enqueue_jobs(jobs)
+
+def register_stored_model(stored, original_filename, compact=True):
+    """
+    Add a stored model file to the library and queue its background work
+
+    Args:
+        stored (StoredFile): Result of store_upload
+        original_filename (str): Name shown in the library
+        compact (bool): Also write a welded, quantized copy for the viewer
+
+    Returns:
+        int: Model ID
+    """
+    model_id = add_model(
+        filename=stored.filename,
+        original_filename=original_filename,
+        file_path=stored.path,
+        content_hash=stored.digest,
+        file_size=stored.size,
+        metadata=stored.info
+    )
+    enqueue_post_processing(model_id, stored, compact)
+    return model_id
+
+def run_task(kind, payload):
+    """Run a registered task; executed inside a worker process"""
+    return TASKS[kind](payload)
+
+def retry_delay(attempts):
+    """Exponential backoff delay after the given number of attempts"""
+    return min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+
+class JobWorker:
+    """
+    Polls the jobs table and runs claimed jobs on an executor
+
+    Tasks run in a ProcessPoolExecutor by default so CPU-bound work uses
+    every core; results and failures are written back from this thread.
+    When a task process dies, e.g. killed for running out of memory, the
+    jobs it took down are failed with backoff and a new pool is started.
+    Leases of jobs still running are renewed, so long jobs are not
+    reclaimed and run twice.
+    """
+
+    def __init__(self, executor=None, max_workers=None, poll_interval=POLL_INTERVAL):
+        self._new_executor = None
+        if executor is None:
+            # Imported here: multiprocessing is not needed to merely enqueue jobs
+            from concurrent.futures import ProcessPoolExecutor
+            self._new_executor = lambda: ProcessPoolExecutor(max_workers=max_workers)
+            executor = self._new_executor()
+        self.executor = executor
+        self.capacity = max_workers or getattr(self.executor, '_max_workers', 1)
+        self.poll_interval = poll_interval
+        self._inflight = {}
+        self._renewed_at = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start processing jobs in a background thread"""
+        self._thread = threading.Thread(target=self.run_forever, name='job-worker', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, wait_for_jobs=True):
+        """Stop polling, optionally record running jobs, and shut down the executor"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        while wait_for_jobs and self._inflight:
+            self._collect(timeout=self.poll_interval)
+        self.executor.shutdown(wait=wait_for_jobs)
+
+    def run_forever(self):
+        """Poll for jobs until stop() is called"""
+        while not self._stop.is_set():
+            try:
+                finished = self.run_once(timeout=self.poll_interval)
+            except sqlite3.OperationalError as e:
+                # e.g. the database is locked for longer than the busy timeout; poll again later
+                print(f"Job worker could not reach the database: {e}")
+                finished = 0
+            if not finished and not self._inflight:
+                self._stop.wait(self.poll_interval)
+
+    def run_once(self, timeout=0):
+        """
+        Claim due jobs up to capacity and collect finished ones
+
+        Args:
+            timeout (float): Seconds to wait for a running job to finish
+
+        Returns:
+            int: Number of jobs finished in this round
+        """
+        free = self.capacity - len(self._inflight)
+        if free > 0:
+            for job in claim_jobs(free):
+                try:
+                    future = self.executor.submit(run_task, job['kind'], job['payload'])
+                except BrokenExecutor as e:
+                    self._fail(job, e)
+                    self._replace_executor()
+                    continue
+                self._inflight[future] = job
+        if not self._inflight:
+            return 0
+        return self._collect(timeout)
+
+    def drain(self):
+        """Process jobs until nothing is due or running; used by tests and scripts"""
+        while self.run_once(timeout=self.poll_interval) or self._inflight:
+            pass
+
+    def _collect(self, timeout):
+        done, _ = wait(list(self._inflight), timeout=timeout, return_when=FIRST_COMPLETED)
+        broken = False
+        for future in done:
+            job = self._inflight.pop(future)
+            try:
+                result = future.result()
+                handler = RESULT_HANDLERS.get(job['kind'])
+                if handler is not None:
+                    handler(job, result)
+            except BrokenExecutor as e:
+                self._fail(job, e)
+                broken = True
+                continue
+            except Exception as e:
+                self._fail(job, e)
+                continue
+            complete_job(job['id'], result)
+        if broken:
+            self._replace_executor()
+        self._renew_leases()
+        return len(done)
+
+    def _renew_leases(self):
+        """Extend the leases of jobs still running, every LEASE_RENEWAL_INTERVAL"""
+        now = time.monotonic()
+        if now - self._renewed_at < LEASE_RENEWAL_INTERVAL:
+            return
+        self._renewed_at = now
+        if self._inflight:
+            renew_job_leases(list(self._inflight.values()))
+
+    def _fail(self, job, error):
+        """Record a failed attempt of a job, to be retried with backoff"""
+        message = ''.join(traceback.format_exception_only(type(error), error)).strip()
+        fail_job(job['id'], message, retry_delay(job['attempts']))
+
+    def _replace_executor(self):
+        """Start a new process pool after one of its processes died"""
+        if self._new_executor is None or not getattr(self.executor, '_broken', False):
+            return
+        # The other jobs of the dead pool fail with BrokenProcessPool as they are collected
+        self.executor.shutdown(wait=False)
+        self.executor = self._new_executor()
+
+if __name__ == '__main__':
+    # Standalone worker process: python jobs.py
+    import signal
+
+    signal.signal(signal.SIGTERM, signal.default_int_handler)  # stop cleanly under process managers
+    ensure_schema()
+    worker = JobWorker()
+    print(f"Job worker running with {worker.capacity} processes")
+    try:
+        worker.run_forever()
+    except KeyboardInterrupt:
+        worker.stop()
@@ -0,0 +1,221 @@
+"""
+Level-of-detail module for 3D Model Viewer
+Builds coarser versions of uploaded models with quadric-error simplification
+"""
+import io
+import os
+import tempfile
+import numpy as np
+from storage import TEMP_PREFIX, derived_filename
+
+# Triangle budgets per LOD level, as fractions of the original count
+LOD_RATIOS = (0.5, 0.2, 0.05)
+MIN_LOD_TRIANGLES = 2000   # smaller models are served as-is
+MIN_LEVEL_REDUCTION = 0.8  # a level must have at most 80% of the previous level's triangles
+MAX_GRID_RESOLUTION = 2048
+SEARCH_STEPS = 12
+
+def face_quadrics(vertices, faces):
+    """
+    Area-weighted plane quadrics of all faces
+
+    Args:
+        vertices (ndarray): (n, 3) vertex positions
+        faces (ndarray): (m, 3) triangle vertex indices
+
+    Returns:
+        ndarray: (m, 4, 4) quadric matrices
+    """
+    triangles = vertices[faces]
+    cross = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    doubled_area = np.linalg.norm(cross, axis=1)
+    normals = cross / np.maximum(doubled_area, 1e-12)[:, None]
+    planes = np.hstack([normals, -np.einsum('ij,ij->i', normals, triangles[:, 0])[:, None]])
+    return planes[:, :, None] * planes[:, None, :] * (doubled_area / 2)[:, None, None]
+
+def cluster_vertices(vertices, faces, quadrics, resolution, colors=None):
+    """
+    Simplify a mesh by clustering vertices on a uniform grid
+
+    Each cluster is collapsed to the point that minimizes the summed
+    quadric error of its faces (Lindstrom's out-of-core simplification),
+    regularized towards the cluster centroid so flat or degenerate
+    clusters stay stable.
+
+    Args:
+        vertices (ndarray): (n, 3) vertex positions
+        faces (ndarray): (m, 3) triangle vertex indices
+        quadrics (ndarray): (m, 4, 4) face quadrics from face_quadrics
+        resolution (int): Grid cells along the longest bounding box axis
+        colors (ndarray): Optional (n, 4) uint8 vertex colors
+
+    Returns:
+        tuple: (vertices, faces, colors) of the simplified mesh
+    """
+    low = vertices.min(axis=0)
+    cell = max(float((vertices.max(axis=0) - low).max()), 1e-12) / resolution
+    cells = np.minimum(np.floor((vertices - low) / cell).astype(np.int64), resolution)
+    keys = (cells[:, 0] * (resolution + 1) + cells[:, 1]) * (resolution + 1) + cells[:, 2]
+    _, cluster, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    n_clusters = len(counts)
+
+    # Sum face quadrics into the clusters of their three corners
+    corners = cluster[faces].ravel()
+    cluster_quadrics = np.empty((n_clusters, 4, 4))
+    for i in range(4):
+        for j in range(i, 4):
+            summed = np.bincount(corners, weights=np.repeat(quadrics[:, i, j], 3), minlength=n_clusters)
+            cluster_quadrics[:, i, j] = cluster_quadrics[:, j, i] = summed
+
+    centroids = np.stack([np.bincount(cluster, weights=vertices[:, axis], minlength=n_clusters)
+                          for axis in range(3)], axis=1) / counts[:, None]
+
+    # Minimize x^T A x + 2 b^T x + c, pulled towards the centroid
+    a = cluster_quadrics[:, :3, :3]
+    b = cluster_quadrics[:, :3, 3]
+    weight = 1e-3 * (np.trace(a, axis1=1, axis2=2) / 3 + 1e-12)
+    regularized = a + weight[:, None, None] * np.eye(3)
+    positions = np.linalg.solve(regularized, (weight[:, None] * centroids - b)[:, :, None])[:, :, 0]
+
+    # Drop collapsed and duplicate triangles, keeping orientation
+    new_faces = cluster[faces]
+    keep = ((new_faces[:, 0] != new_faces[:, 1])
+            & (new_faces[:, 1] != new_faces[:, 2])
+            & (new_faces[:, 0] != new_faces[:, 2]))
+    new_faces = new_faces[keep]
+    _, first = np.unique(np.sort(new_faces, axis=1), axis=0, return_index=True)
+    new_faces = new_faces[np.sort(first)]
+
+    new_colors = None
+    if colors is not None:
+        summed = np.stack([np.bincount(cluster, weights=colors[:, channel], minlength=n_clusters)
+                           for channel in range(colors.shape[1])], axis=1)
+        new_colors = np.round(summed / counts[:, None]).astype(np.uint8)
+
+    # Remove clusters no longer referenced by any face
+    used = np.unique(new_faces)
+    remap = np.full(n_clusters, -1, dtype=np.int64)
+    remap[used] = np.arange(len(used))
+    return (positions[used],
+            remap[new_faces],
+            new_colors[used] if new_colors is not None else None)
+
+def simplify(vertices, faces, target_triangles, colors=None):
+    """
+    Simplify a mesh to at most target_triangles triangles
+
+    Binary-searches the clustering grid resolution for the finest grid
+    that stays within the triangle budget.
+
+    Args:
+        vertices (ndarray): (n, 3) vertex positions
+        faces (ndarray): (m, 3) triangle vertex indices
+        target_triangles (int): Triangle budget
+        colors (ndarray): Optional (n, 4) uint8 vertex colors
+
+    Returns:
+        tuple: (vertices, faces, colors) of the simplified mesh, or None if
+            no grid resolution meets the budget
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64)
+    quadrics = face_quadrics(vertices, faces)
+
+    best = None
+    low, high = 1, MAX_GRID_RESOLUTION
+    for _ in range(SEARCH_STEPS):
+        if low > high:
+            break
+        resolution = (low + high) // 2
+        result = cluster_vertices(vertices, faces, quadrics, resolution, colors)
+        if len(result[1]) <= target_triangles:
+            best = result
+            low = resolution + 1
+        else:
+            high = resolution - 1
+    return best
+
+def lod_path(path, level):
+    """Path of the given LOD level stored next to a model file"""
+    return derived_filename(path, f'.lod{level}.glb')
+
+def load_mesh(path):
+    """
+    Load a model file as a single triangle mesh with vertex colors
+
+    Args:
+        path (str): Path to a .glb or .gltf file
+
+    Returns:
+        tuple: (vertices, faces, colors) arrays; colors may be None
+    """
+    import trimesh
+    from gltf_writer import expand_instancing
+
+    expanded = expand_instancing(path)
+    if expanded is not None:
+        scene = trimesh.load(io.BytesIO(expanded), file_type='glb', force='scene')
+    else:
+        scene = trimesh.load(path, force='scene')
+
+    # Bake material colors per geometry; merged materials would lose them
+    for geometry in scene.geometry.values():
+        try:
+            if geometry.visual.kind == 'texture':
+                baked = np.asarray(geometry.visual.to_color().vertex_colors, dtype=np.uint8).reshape(-1, 4)
+                geometry.visual = trimesh.visual.ColorVisuals(
+                    geometry, vertex_colors=np.broadcast_to(baked, (len(geometry.vertices), 4)).copy())
+        except Exception:
+            pass
+    mesh = scene.to_mesh()
+    try:
+        colors = np.asarray(mesh.visual.vertex_colors, dtype=np.uint8)
+    except Exception:
+        colors = None
+    if colors is not None and len(colors) != len(mesh.vertices):
+        colors = None
+    return np.asarray(mesh.vertices), np.asarray(mesh.faces), colors
+
+def generate_lods(path):
+    """
+    Write simplified LOD levels next to a model file
+
+    Level 0 is the original; levels 1..n get progressively smaller
+    triangle budgets from LOD_RATIOS and are written as GLB.
+
+    Args:
+        path (str): Path to the stored model file
+
+    Returns:
+        list: Dicts with level, filename and triangle count per written level
+    """
+    import trimesh
+
+    vertices, faces, colors = load_mesh(path)
+    if len(faces) < MIN_LOD_TRIANGLES:
+        return []
+
+    levels = []
+    previous = len(faces)
+    for ratio in LOD_RATIOS:
+        result = simplify(vertices, faces, int(len(faces) * ratio), colors)
+        if result is None or len(result[1]) > previous * MIN_LEVEL_REDUCTION or not len(result[1]):
+            break
+        lod_vertices, lod_faces, lod_colors = result
+        level = len(levels) + 1
+        target = lod_path(path, level)
+        data = trimesh.Trimesh(lod_vertices, lod_faces, vertex_colors=lod_colors, process=False).export(file_type='glb')
+
+        # Served as immutable, so never leave a partial level behind at the final name
+        fd, tmp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=os.path.dirname(target))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, target)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        levels.append({'level': level, 'filename': os.path.basename(target), 'triangles': len(lod_faces)})
+        previous = len(lod_faces)
+    return levels
@@ -0,0 +1,302 @@
+"""
+Maintenance module for 3D Model Viewer
+Moves stored files into the sharded layout, reconciles them with the database
+and purges expired resumable uploads
+"""
+import argparse
+import os
+import sys
+import time
+import database
+from database import (delete_models, delete_upload_session, get_expired_upload_sessions, get_model_files,
+                      get_referenced_filenames, get_referenced_hashes, init_db, relocate_models)
+from storage import (SESSION_FOLDER, TEMP_PREFIX, content_digest, legacy_key, open_session_file, session_path,
+                     shard_path)
+
+DEFAULT_UPLOAD_FOLDER = 'uploads'
+DEFAULT_BATCH_SIZE = 500   # files or rows per database round trip
+DEFAULT_RATE = 2000        # files or rows checked per second; 0 disables throttling
+MIN_ORPHAN_AGE = 60 * 60   # younger files may belong to an upload whose row is not committed yet
+
+# Model columns that name a file relative to the upload folder
+FILE_COLUMNS = ('filename', 'thumbnail', 'compact_filename')
+
+# Extensions a legacy uuid-named upload can have; its derived files share the uuid
+LEGACY_EXTENSIONS = ('glb', 'gltf')
+
+class Throttle:
+    """Sleeps between batches so a sweep handles at most rate items per second"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.count = 0
+        self.started = time.monotonic()
+
+    def __call__(self, count):
+        self.count += count
+        if self.rate:
+            delay = self.count / self.rate - (time.monotonic() - self.started)
+            if delay > 0:
+                time.sleep(delay)
+
+def batched(items, size):
+    """Yield lists of up to size items"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def stored_files(upload_folder):
+    """Yield the path of every file below the upload folder, shard by shard, skipping resumable uploads"""
+    for directory, dirnames, filenames in os.walk(upload_folder):
+        if directory == upload_folder and SESSION_FOLDER in dirnames:
+            dirnames.remove(SESSION_FOLDER)
+        dirnames.sort()
+        for name in sorted(filenames):
+            yield os.path.join(directory, name)
+
+def remove_empty_shards(path, upload_folder):
+    """Remove the shard directories of a deleted file once they are empty"""
+    root = os.path.abspath(upload_folder)
+    directory = os.path.dirname(os.path.abspath(path))
+    while directory != root and directory.startswith(root) and not os.listdir(directory):
+        os.rmdir(directory)
+        directory = os.path.dirname(directory)
+
+def migrate_layout(upload_folder=DEFAULT_UPLOAD_FOLDER, batch_size=DEFAULT_BATCH_SIZE, rate=DEFAULT_RATE):
+    """
+    Move flat content-addressed and legacy uuid-named files into shard directories and update their models
+
+    Files move before the rows are updated; in between, the old flat URLs
+    redirect to the new location. Running it again is a no-op.
+
+    Args:
+        upload_folder (str): Upload folder
+        batch_size (int): Files or rows per batch
+        rate (float): Maximum files or rows per second, 0 for no limit
+
+    Returns:
+        dict: Number of moved files, flat duplicates of already sharded
+            files that were removed, and updated models
+    """
+    report = {'moved': 0, 'duplicates': 0, 'models': 0}
+    throttle = Throttle(rate)
+
+    names = [entry.name for entry in os.scandir(upload_folder)
+             if entry.is_file() and not entry.name.startswith(TEMP_PREFIX)]
+    for batch in batched(names, batch_size):
+        for name in batch:
+            target = shard_path(name)
+            if target == name:
+                continue
+            source = os.path.join(upload_folder, name)
+            destination = os.path.join(upload_folder, target)
+            if os.path.exists(destination):
+                # Same digest, same content: a later upload already stored it sharded
+                os.remove(source)
+                report['duplicates'] += 1
+                continue
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            os.replace(source, destination)
+            report['moved'] += 1
+        throttle(len(batch))
+
+    after_id = 0
+    while True:
+        models = get_model_files(after_id, batch_size)
+        if not models:
+            break
+        after_id = models[-1]['id']
+        relocated = []
+        for model in models:
+            moved = {column: shard_path(model[column]) if model[column] else model[column]
+                     for column in FILE_COLUMNS}
+            if all(moved[column] == model[column] for column in FILE_COLUMNS):
+                continue
+            file_path = model['file_path']
+            if file_path.endswith(model['filename']):
+                file_path = file_path[:len(file_path) - len(model['filename'])] + moved['filename']
+            relocated.append(dict(moved, id=model['id'], file_path=file_path))
+        if relocated:
+            report['models'] += relocate_models(relocated)
+        throttle(len(models))
+    return report
+
+def legacy_filenames(key):
+    """Model filenames a legacy upload named after key can have, before and after migration"""
+    names = [f'{key}.{extension}' for extension in LEGACY_EXTENSIONS]
+    return names + [shard_path(name) for name in names]
+
+def reconcile(upload_folder=DEFAULT_UPLOAD_FOLDER, delete=False, batch_size=DEFAULT_BATCH_SIZE,
+              rate=DEFAULT_RATE, min_age=MIN_ORPHAN_AGE):
+    """
+    Find stored files without models and models without files
+
+    A file is orphaned when no model uses the blob it belongs to; derived
+    files (LODs, thumbnails, sidecars) follow their blob. Legacy uuid-named
+    uploads are matched against the models' filenames instead of their
+    digests. Abandoned upload spools count as orphans too. Files younger
+    than min_age are skipped, and so are other names and resumable uploads.
+    Models are checked for their file below upload_folder, wherever the
+    web app that stored them ran.
+
+    Args:
+        upload_folder (str): Upload folder
+        delete (bool): Delete orphaned files and models without files
+            instead of only reporting them
+        batch_size (int): Files or rows per batch
+        rate (float): Maximum files or rows per second, 0 for no limit
+        min_age (float): Seconds since the last modification before a
+            file can be an orphan
+
+    Returns:
+        dict: orphan_files (paths), missing_files (model IDs) and the
+            number of deleted files and models
+    """
+    report = {'orphan_files': [], 'missing_files': [], 'deleted_files': 0, 'deleted_models': 0}
+    throttle = Throttle(rate)
+
+    for batch in batched(stored_files(upload_folder), batch_size):
+        cutoff = time.time() - min_age
+        candidates = []
+        for path in batch:
+            try:
+                if os.path.getmtime(path) > cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+            name = os.path.basename(path)
+            if name.startswith(TEMP_PREFIX):
+                candidates.append((path, None, None))
+            elif content_digest(name) is not None:
+                candidates.append((path, content_digest(name), None))
+            elif legacy_key(name) is not None:
+                candidates.append((path, None, legacy_key(name)))
+
+        referenced = get_referenced_hashes({digest for _, digest, _ in candidates if digest})
+        used_names = get_referenced_filenames({filename for _, _, key in candidates if key
+                                               for filename in legacy_filenames(key)})
+        referenced |= {legacy_key(filename) for filename in used_names}
+        orphans = [path for path, digest, key in candidates if (digest or key) not in referenced]
+        report['orphan_files'].extend(orphans)
+        if delete:
+            for path in orphans:
+                try:
+                    # A blob uploaded again since the check has a fresh mtime
+                    if os.path.getmtime(path) > cutoff:
+                        continue
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                report['deleted_files'] += 1
+                remove_empty_shards(path, upload_folder)
+        throttle(len(batch))
+
+    after_id = 0
+    while True:
+        models = get_model_files(after_id, batch_size)
+        if not models:
+            break
+        after_id = models[-1]['id']
+        # file_path is relative to the web app's working directory, not necessarily this one
+        missing = [model['id'] for model in models
+                   if not os.path.exists(os.path.join(upload_folder, model['filename']))]
+        report['missing_files'].extend(missing)
+        if delete and missing:
+            report['deleted_models'] += delete_models(missing)
+        throttle(len(models))
+    return report
+
+def purge_sessions(upload_folder=DEFAULT_UPLOAD_FOLDER, batch_size=DEFAULT_BATCH_SIZE, rate=DEFAULT_RATE):
+    """
+    Delete resumable uploads that expired, with their partial files
+
+    Uploads receiving a chunk right now are skipped; the chunk extends
+    their expiry anyway.
+
+    Args:
+        upload_folder (str): Upload folder
+        batch_size (int): Sessions per batch
+        rate (float): Maximum sessions per second, 0 for no limit
+
+    Returns:
+        dict: Number of purged sessions and of busy ones that were skipped
+    """
+    report = {'purged': 0, 'busy': 0}
+    throttle = Throttle(rate)
+    skipped = set()
+
+    while True:
+        upload_ids = [upload_id for upload_id in get_expired_upload_sessions(batch_size + len(skipped))
+                      if upload_id not in skipped][:batch_size]
+        if not upload_ids:
+            break
+        for upload_id in upload_ids:
+            path = session_path(upload_folder, upload_id)
+            try:
+                with open_session_file(path):
+                    # Checked again under the lock, in case a chunk arrived meanwhile
+                    if delete_upload_session(upload_id, expired_only=True):
+                        os.remove(path)
+                        report['purged'] += 1
+                    else:
+                        skipped.add(upload_id)
+            except FileNotFoundError:
+                if delete_upload_session(upload_id, expired_only=True):
+                    report['purged'] += 1
+            except BlockingIOError:
+                skipped.add(upload_id)
+                report['busy'] += 1
+        throttle(len(upload_ids))
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Maintain the 3D Model Viewer upload folder')
+    parser.add_argument('--upload-folder', default=DEFAULT_UPLOAD_FOLDER, help='upload folder')
+    parser.add_argument('--database', default=database.DATABASE_PATH, help='SQLite database file')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='files or rows per batch')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE,
+                        help='maximum files or rows per second, 0 for no limit')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('migrate', help='move flat uploads into shard directories')
+    commands.add_parser('purge-sessions', help='delete resumable uploads that expired')
+    sweep = commands.add_parser('reconcile', help='find files without models and models without files')
+    sweep.add_argument('--delete', action='store_true', help='delete what is found instead of reporting it')
+    sweep.add_argument('--min-age', type=float, default=MIN_ORPHAN_AGE,
+                       help='seconds before an unreferenced file counts as orphaned')
+    args = parser.parse_args(argv)
+
+    database.DATABASE_PATH = args.database
+    init_db()
+
+    if args.command == 'migrate':
+        report = migrate_layout(args.upload_folder, args.batch_size, args.rate)
+        print(f"✅ Moved {report['moved']} file(s), removed {report['duplicates']} duplicate(s), "
+              f"updated {report['models']} model(s)")
+        return 0
+
+    if args.command == 'purge-sessions':
+        report = purge_sessions(args.upload_folder, args.batch_size, args.rate)
+        print(f"✅ Purged {report['purged']} expired upload(s), skipped {report['busy']} busy one(s)")
+        return 0
+
+    report = reconcile(args.upload_folder, args.delete, args.batch_size, args.rate, args.min_age)
+    for path in report['orphan_files']:
+        print(f'orphaned file: {path}')
+    for model_id in report['missing_files']:
+        print(f'model without file: {model_id}')
+    if args.delete:
+        print(f"✅ Deleted {report['deleted_files']} file(s) and {report['deleted_models']} model(s)")
+    elif not report['orphan_files'] and not report['missing_files']:
+        print('✅ Every file has a model and every model has its file')
+    else:
+        print(f"⚠️  {len(report['orphan_files'])} orphaned file(s), {len(report['missing_files'])} "
+              f"model(s) without file; run with --delete to remove them")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
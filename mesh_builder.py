@@ -0,0 +1,228 @@
+"""
+Mesh builder module for 3D Model Viewer
+Assembles many instances of a few primitives into one preallocated mesh
+"""
+import functools
+import hashlib
+import os
+import tempfile
+import zipfile
+import numpy as np
+import trimesh
+from vertex_cache import optimize_mesh
+
+PRIMITIVE_CACHE_SIZE = 256
+
+# Tessellations are also kept on disk so new processes (job workers, CLI runs)
+# skip tessellation and vertex cache ordering; an empty directory disables it
+PRIMITIVE_CACHE_DIR = os.environ.get('PRIMITIVE_CACHE_DIR', os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'model-viewer', 'primitives'))
+PRIMITIVE_DISK_CACHE_SIZE = 1024
+# Bump when tessellation or vertex cache ordering changes, so stale files are never read
+DISK_CACHE_VERSION = 1
+
+# Rotation that stands a Z-up model upright in Y-up glTF viewers (270 degrees around X)
+Z_UP_TO_Y_UP = trimesh.transformations.rotation_matrix(3 * np.pi / 2, [1, 0, 0])
+
+PRIMITIVES = {
+    'box': lambda extents: trimesh.creation.box(extents),
+    'cylinder': lambda radius, height, sections=32: trimesh.creation.cylinder(
+        radius=radius, height=height, sections=sections),
+    'icosphere': lambda radius=1.0, subdivisions=3: trimesh.creation.icosphere(
+        radius=radius, subdivisions=subdivisions),
+    'mesh': lambda vertices, faces: trimesh.Trimesh(vertices=vertices, faces=faces, process=False),
+}
+
+def _freeze(value):
+    """Turn nested lists into tuples so parameters can be used as a cache key"""
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+def _disk_cache_path(kind, params):
+    """File of a tessellation in the on-disk cache, or None when the cache is disabled"""
+    if not PRIMITIVE_CACHE_DIR:
+        return None
+    key = repr((DISK_CACHE_VERSION, trimesh.__version__, kind, params)).encode()
+    return os.path.join(PRIMITIVE_CACHE_DIR, hashlib.sha256(key).hexdigest() + '.npz')
+
+def _load_tessellation(path):
+    """Read a cached tessellation; a missing or unreadable file is a miss"""
+    try:
+        with np.load(path) as data:
+            mesh = trimesh.Trimesh(vertices=data['vertices'], faces=data['faces'], process=False)
+        # Refresh the modification time, which orders eviction
+        os.utime(path)
+        return mesh
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+        return None
+
+def _store_tessellation(path, mesh):
+    """Write a tessellation atomically and keep the cache at PRIMITIVE_DISK_CACHE_SIZE files (best effort)"""
+    directory = os.path.dirname(path)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, vertices=mesh.vertices, faces=mesh.faces)
+        os.replace(temp_path, path)
+
+        entries = [entry for entry in os.scandir(directory) if entry.name.endswith('.npz')]
+        if len(entries) > PRIMITIVE_DISK_CACHE_SIZE:
+            entries.sort(key=lambda entry: entry.stat().st_mtime)
+            for entry in entries[:len(entries) - PRIMITIVE_DISK_CACHE_SIZE]:
+                os.remove(entry.path)
+    except OSError:
+        pass
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+@functools.lru_cache(maxsize=PRIMITIVE_CACHE_SIZE)
+def _tessellate(kind, params):
+    path = _disk_cache_path(kind, params)
+    cached = _load_tessellation(path) if path else None
+    if cached is not None:
+        return cached
+
+    mesh = PRIMITIVES[kind](**dict(params))
+    # Reorder once for the vertex cache; every instance and export reuses it
+    order, faces = optimize_mesh(mesh.vertices, mesh.faces)
+    mesh = trimesh.Trimesh(vertices=mesh.vertices[order], faces=faces, process=False)
+    if path:
+        _store_tessellation(path, mesh)
+    return mesh
+
+def primitive(kind, **params):
+    """
+    Tessellate a primitive, memoized by kind and parameters
+
+    Tessellations are memoized in this process and in PRIMITIVE_CACHE_DIR,
+    so later runs load them instead of tessellating again (cache_clear
+    only empties the in-process cache). The returned mesh is shared
+    between all callers with the same parameters and must not be
+    modified. Its triangles and vertices are reordered for the GPU vertex
+    cache (see vertex_cache.optimize_mesh).
+
+    Args:
+        kind (str): Primitive type, one of PRIMITIVES
+        **params: Keyword arguments for the primitive
+
+    Returns:
+        trimesh.Trimesh: Primitive geometry
+
+    Raises:
+        KeyError: If the primitive type is unknown
+    """
+    if kind not in PRIMITIVES:
+        raise KeyError(kind)
+    return _tessellate(kind, tuple(sorted((name, _freeze(value)) for name, value in params.items())))
+
+primitive.cache_info = _tessellate.cache_info
+primitive.cache_clear = _tessellate.cache_clear
+
+
+class MeshBuilder:
+    """
+    Collects primitive instances and builds a single Trimesh in one pass
+
+    Each primitive is tessellated once by the caller; all of its instances
+    are placed with NumPy broadcasting into preallocated vertex, face and
+    color buffers, so no per-instance Trimesh objects are created.
+    """
+
+    def __init__(self):
+        self.parts = []
+
+    def add(self, mesh, offsets, colors):
+        """
+        Add instances of a primitive; an empty offsets list adds nothing
+
+        Args:
+            mesh (trimesh.Trimesh): Primitive geometry, shared by all instances
+            offsets (array-like): (3,) or (k, 3) translation per instance
+            colors (array-like): (4,) RGBA for all instances or (k, 4) per instance
+        """
+        offsets = np.asarray(offsets, dtype=np.float64).reshape(-1, 3)
+        colors = np.asarray(colors, dtype=np.uint8).reshape(-1, 4)
+        if not len(offsets):
+            return
+        colors = np.broadcast_to(colors, (len(offsets), 4))
+        self.parts.append((mesh, offsets, colors))
+
+    def bounds(self, matrix=None):
+        """
+        Axis-aligned bounds of all instances, without building the mesh
+
+        Args:
+            matrix (ndarray): Optional 4x4 transform applied to the whole model
+
+        Returns:
+            ndarray: (2, 3) minimum and maximum corner
+        """
+        linear = np.eye(3) if matrix is None else np.asarray(matrix, dtype=np.float64)[:3, :3]
+        shift = np.zeros(3) if matrix is None else np.asarray(matrix, dtype=np.float64)[:3, 3]
+        low, high = [], []
+        for mesh, offsets, _ in self.parts:
+            # min/max of a sum of independent terms is the sum of the min/max
+            vertices = np.asarray(mesh.vertices) @ linear.T
+            placed = offsets @ linear.T
+            low.append(vertices.min(axis=0) + placed.min(axis=0))
+            high.append(vertices.max(axis=0) + placed.max(axis=0))
+        return np.array([np.min(low, axis=0), np.max(high, axis=0)]) + shift
+
+    def placement(self, target_position=(0.0, 0.0, 0.0), rotation=None):
+        """
+        Transform that rotates the model and aligns it with target_position
+
+        The center of the X and Y extent and the lowest Z of the rotated
+        model end up at target_position.
+
+        Args:
+            target_position (tuple): Target (x, y, z)
+            rotation (ndarray): Optional 4x4 rotation applied first
+
+        Returns:
+            ndarray: 4x4 transform
+        """
+        rotation = np.eye(4) if rotation is None else np.asarray(rotation, dtype=np.float64)
+        min_bound, max_bound = self.bounds(rotation)
+        shift = np.asarray(target_position, dtype=np.float64) - [
+            (min_bound[0] + max_bound[0]) / 2.0,
+            (min_bound[1] + max_bound[1]) / 2.0,
+            min_bound[2],
+        ]
+        return trimesh.transformations.translation_matrix(shift) @ rotation
+
+    def build(self):
+        """
+        Build the combined mesh
+
+        Returns:
+            trimesh.Trimesh: All instances in one mesh with per-vertex colors
+        """
+        vertex_total = sum(len(mesh.vertices) * len(offsets) for mesh, offsets, _ in self.parts)
+        face_total = sum(len(mesh.faces) * len(offsets) for mesh, offsets, _ in self.parts)
+
+        vertices = np.empty((vertex_total, 3), dtype=np.float64)
+        faces = np.empty((face_total, 3), dtype=np.int64)
+        colors = np.empty((vertex_total, 4), dtype=np.uint8)
+
+        v = f = 0
+        for mesh, offsets, part_colors in self.parts:
+            count = len(offsets)
+            n_vertices, n_faces = len(mesh.vertices), len(mesh.faces)
+            v_end, f_end = v + count * n_vertices, f + count * n_faces
+
+            # (count, n_vertices, 3) instance copies, written straight into the buffers
+            vertices[v:v_end] = (mesh.vertices[None, :, :] + offsets[:, None, :]).reshape(-1, 3)
+            starts = v + np.arange(count) * n_vertices
+            faces[f:f_end] = (mesh.faces[None, :, :] + starts[:, None, None]).reshape(-1, 3)
+            colors[v:v_end] = np.repeat(part_colors, n_vertices, axis=0)
+
+            v, f = v_end, f_end
+
+        return trimesh.Trimesh(vertices=vertices, faces=faces, vertex_colors=colors, process=False)
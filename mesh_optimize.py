@@ -0,0 +1,302 @@
+"""
+Mesh optimization module for 3D Model Viewer
+Welds duplicate vertices and quantizes vertex attributes with KHR_mesh_quantization
+"""
+import copy
+import os
+import tempfile
+import numpy as np
+from gltf_parser import INSTANCING_EXTENSION, read_glb, unpack_glb
+from gltf_writer import ARRAY_BUFFER, ELEMENT_ARRAY_BUFFER, BufferBuilder, pack_glb, read_accessor
+from storage import TEMP_PREFIX, derived_filename
+from vertex_cache import optimize_mesh
+
+QUANTIZATION_EXTENSION = 'KHR_mesh_quantization'
+COMPACT_SUFFIX = '.compact.glb'
+POSITION_RANGE = 32767    # int16 positions on a uniform grid per mesh
+NORMAL_RANGE = 127        # normalized int8 normals
+COLOR_RANGE = 255         # normalized uint8 colors
+MIN_COMPACT_SAVING = 0.1  # drop compacted files that save less than 10%
+
+# Attributes that only matter for textured materials
+TEXTURE_ATTRIBUTES = ('TEXCOORD_', 'TANGENT')
+
+def skip_reason(document, binary):
+    """
+    Check whether a model can be compacted
+
+    The compactor rewrites the whole binary buffer, so it only handles
+    untextured, unanimated triangle meshes stored in a single GLB buffer.
+
+    Args:
+        document (dict): glTF JSON document
+        binary (bytes): GLB binary chunk, or None
+
+    Returns:
+        str: Why the model is left as-is, or None if it can be compacted
+    """
+    if binary is None or len(document.get('buffers', [])) != 1 or 'uri' in document['buffers'][0]:
+        return 'external-buffers'
+    if document.get('textures') or document.get('images'):
+        return 'textures'
+    if document.get('skins') or document.get('animations'):
+        return 'animation'
+    if QUANTIZATION_EXTENSION in document.get('extensionsUsed', []):
+        return 'quantized'
+    if set(document.get('extensionsRequired', [])) - {INSTANCING_EXTENSION}:
+        return 'extensions'
+    if any('sparse' in accessor for accessor in document.get('accessors', [])):
+        return 'sparse'
+    for mesh in document.get('meshes', []):
+        for primitive in mesh['primitives']:
+            if primitive.get('mode', 4) != 4:
+                return 'mode'
+            if primitive.get('targets'):
+                return 'morph-targets'
+    return None
+
+def mesh_quantization(document, binary, mesh):
+    """
+    Uniform grid covering all positions of a mesh
+
+    Returns:
+        tuple: (offset, scale) so that position = offset + scale * quantized
+    """
+    positions = np.vstack([read_accessor(document, binary, primitive['attributes']['POSITION'])
+                           for primitive in mesh['primitives']])
+    low, high = positions.min(axis=0), positions.max(axis=0)
+    scale = float((high - low).max()) / (2 * POSITION_RANGE)
+    return (low + high) / 2, scale if scale > 0 else 1.0
+
+def quantize_attributes(document, binary, primitive, offset, scale):
+    """
+    Quantize the vertex attributes of a primitive
+
+    Every array is padded to a multiple of 4 bytes per vertex, as glTF
+    requires for vertex attributes.
+
+    Returns:
+        dict: Attribute name -> (array, accessor type, normalized)
+    """
+    quantized = {}
+    for name, index in primitive['attributes'].items():
+        if name.startswith(TEXTURE_ATTRIBUTES):
+            continue
+        values = read_accessor(document, binary, index)
+        if name == 'POSITION':
+            grid = np.clip(np.round((values - offset) / scale), -POSITION_RANGE, POSITION_RANGE)
+            quantized[name] = (np.pad(grid.astype(np.int16), ((0, 0), (0, 1))), 'VEC3', False)
+        elif name == 'NORMAL':
+            lengths = np.linalg.norm(values, axis=1, keepdims=True)
+            normals = np.round(values / np.maximum(lengths, 1e-12) * NORMAL_RANGE).astype(np.int8)
+            quantized[name] = (np.pad(normals, ((0, 0), (0, 1))), 'VEC3', True)
+        elif name.startswith('COLOR_'):
+            # Opaque white vertex colors do not change the material color
+            if np.all(values >= 1.0):
+                continue
+            colors = np.round(np.clip(values, 0, 1) * COLOR_RANGE).astype(np.uint8)
+            accessor_type = 'VEC4' if colors.shape[1] == 4 else 'VEC3'
+            quantized[name] = (np.pad(colors, ((0, 0), (0, -colors.shape[1] % 4))), accessor_type, True)
+        else:
+            accessor_type = document['accessors'][index]['type']
+            quantized[name] = (values.astype(np.float32), accessor_type, False)
+    return quantized
+
+def weld_vertices(attributes, indices):
+    """
+    Merge vertices whose quantized attributes are identical
+
+    Unreferenced vertices are dropped and triangles that collapse to a
+    line or point are removed, unless that would remove every triangle.
+
+    Args:
+        attributes (dict): Attribute name -> (array, accessor type, normalized)
+        indices (ndarray): Triangle list vertex indices
+
+    Returns:
+        tuple: (attributes, indices) of the welded primitive
+    """
+    used, local = np.unique(indices, return_inverse=True)
+    keys = np.hstack([np.ascontiguousarray(array[used]).view(np.uint8).reshape(len(used), -1)
+                      for array, _, _ in attributes.values()])
+    _, first, group = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+
+    # Number welded vertices in order of first appearance
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    triangles = rank[np.asarray(group).ravel()][local].reshape(-1, 3)
+
+    keep = ((triangles[:, 0] != triangles[:, 1])
+            & (triangles[:, 1] != triangles[:, 2])
+            & (triangles[:, 0] != triangles[:, 2]))
+    if keep.any():
+        triangles = triangles[keep]
+
+    rows = used[first[order]]
+    welded = {name: (array[rows], accessor_type, normalized)
+              for name, (array, accessor_type, normalized) in attributes.items()}
+    return welded, triangles.ravel()
+
+def reorder_vertices(attributes, indices):
+    """
+    Reorder a welded primitive for the vertex cache, overdraw and vertex fetch
+
+    Args:
+        attributes (dict): Attribute name -> (array, accessor type, normalized)
+        indices (ndarray): Triangle list vertex indices
+
+    Returns:
+        tuple: (attributes, indices) of the reordered primitive
+    """
+    positions = attributes['POSITION'][0][:, :3]
+    order, faces = optimize_mesh(positions, indices.reshape(-1, 3))
+    reordered = {name: (array[order], accessor_type, normalized)
+                 for name, (array, accessor_type, normalized) in attributes.items()}
+    return reordered, faces.ravel()
+
+def instance_offsets(document, binary, instancing, offset, scale):
+    """
+    Rewrite instance translations for a mesh moved onto a quantization grid
+
+    Each instance transform T R S becomes T' R S with
+    T' = (T - offset + R S offset) / scale, so the instances land where
+    they did before the mesh was quantized.
+
+    Returns:
+        dict: Attribute name -> float32 array for the new instancing accessors
+    """
+    attributes = {name: read_accessor(document, binary, index)
+                  for name, index in instancing['attributes'].items()}
+    count = len(next(iter(attributes.values())))
+    translation = attributes.get('TRANSLATION', np.zeros((count, 3)))
+    moved = np.broadcast_to(offset, (count, 3)) * attributes.get('SCALE', np.ones((count, 3)))
+    if 'ROTATION' in attributes:
+        axis, w = attributes['ROTATION'][:, :3], attributes['ROTATION'][:, 3:]
+        twice = 2 * np.cross(axis, moved)
+        moved = moved + w * twice + np.cross(axis, twice)
+    attributes['TRANSLATION'] = (translation - offset + moved) / scale
+    return {name: values.astype(np.float32) for name, values in attributes.items()}
+
+def compact_document(document, binary):
+    """
+    Weld and quantize all meshes of a GLB document
+
+    Positions are stored as int16 on a uniform grid per mesh; the grid's
+    offset and scale move onto a new child node that takes over the mesh
+    (and its EXT_mesh_gpu_instancing instances). Normals become normalized
+    int8, vertex colors normalized uint8, and texture-only or constant
+    white attributes are dropped. Triangles and vertices are then
+    reordered for the vertex cache, overdraw and vertex fetch. Accessors
+    shared between meshes stay shared when the meshes use the same grid.
+
+    Args:
+        document (dict): glTF JSON document accepted by skip_reason
+        binary (bytes): GLB binary chunk
+
+    Returns:
+        tuple: (document, binary) of the compacted model
+    """
+    result = copy.deepcopy(document)
+    buffer = BufferBuilder()
+    grids = [mesh_quantization(document, binary, mesh) for mesh in document.get('meshes', [])]
+
+    shared = {}
+    for mesh, (offset, scale) in zip(result.get('meshes', []), grids):
+        for primitive in mesh['primitives']:
+            key = (tuple(sorted(primitive['attributes'].items())), primitive.get('indices'),
+                   tuple(offset), scale)
+            if key not in shared:
+                attributes = quantize_attributes(document, binary, primitive, offset, scale)
+                count = len(attributes['POSITION'][0])
+                if 'indices' in primitive:
+                    indices = read_accessor(document, binary, primitive['indices']).ravel().astype(np.int64)
+                else:
+                    indices = np.arange(count)
+                attributes, indices = weld_vertices(attributes, indices)
+                attributes, indices = reorder_vertices(attributes, indices)
+                index_dtype = np.uint16 if len(attributes['POSITION'][0]) < 0xFFFF else np.uint32
+                shared[key] = (
+                    {name: buffer.add(array, accessor_type, ARRAY_BUFFER,
+                                      bounds=name == 'POSITION', normalized=normalized)
+                     for name, (array, accessor_type, normalized) in attributes.items()},
+                    buffer.add(indices.astype(index_dtype), 'SCALAR', ELEMENT_ARRAY_BUFFER),
+                )
+            primitive['attributes'], primitive['indices'] = shared[key]
+
+    # Dequantize on a child node so the original node's children are unaffected
+    nodes = result.get('nodes', [])
+    for node in list(nodes):
+        if 'mesh' not in node:
+            continue
+        offset, scale = grids[node['mesh']]
+        child = {'mesh': node.pop('mesh'), 'translation': offset.tolist(), 'scale': [scale] * 3}
+        instancing = node.get('extensions', {}).pop(INSTANCING_EXTENSION, None)
+        if instancing is not None:
+            attributes = instance_offsets(document, binary, instancing, offset, scale)
+            child['extensions'] = {INSTANCING_EXTENSION: {'attributes': {
+                name: buffer.add(values, 'VEC4' if name == 'ROTATION' else 'VEC3')
+                for name, values in attributes.items()}}}
+        if node.get('extensions') == {}:
+            del node['extensions']
+        node.setdefault('children', []).append(len(nodes))
+        nodes.append(child)
+
+    compacted = buffer.tobytes()
+    result['accessors'] = buffer.accessors
+    result['bufferViews'] = buffer.buffer_views
+    result['buffers'] = [{'byteLength': len(compacted)}]
+    for key in ('extensionsUsed', 'extensionsRequired'):
+        result[key] = result.get(key, []) + [QUANTIZATION_EXTENSION]
+    return result, compacted
+
+def compact_glb(data):
+    """
+    Compact GLB bytes in memory
+
+    Args:
+        data (bytes): GLB file contents
+
+    Returns:
+        bytes: Compacted GLB, or None if the model cannot be compacted
+    """
+    document, binary = unpack_glb(data)
+    if skip_reason(document, binary):
+        return None
+    return pack_glb(*compact_document(document, binary))
+
+def compact_path(path):
+    """Path of the compacted version stored next to a model file"""
+    return derived_filename(path, COMPACT_SUFFIX)
+
+def write_compact(path):
+    """
+    Write a compacted copy next to a stored model file
+
+    Args:
+        path (str): Path to the stored model file
+
+    Returns:
+        dict: filename of the compacted file (None if not written) and the
+            skip reason, if any
+    """
+    document, binary = read_glb(path)
+    reason = skip_reason(document, binary)
+    if reason:
+        return {'filename': None, 'skipped': reason}
+
+    data = pack_glb(*compact_document(document, binary))
+    if len(data) > os.path.getsize(path) * (1 - MIN_COMPACT_SAVING):
+        return {'filename': None, 'skipped': 'no-saving'}
+
+    target = compact_path(path)
+    fd, tmp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=os.path.dirname(target))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, target)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return {'filename': os.path.basename(target), 'skipped': None}
@@ -0,0 +1,179 @@
+"""
+Metrics module for 3D Model Viewer
+In-process counters and histograms exposed in the Prometheus text format
+"""
+import bisect
+import functools
+import threading
+import time
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+SIZE_BUCKETS = tuple(kb * 1024 for kb in (1, 10, 100, 1024, 5 * 1024, 10 * 1024, 25 * 1024, 50 * 1024))
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Registry:
+    """Collection of metrics rendered together on /metrics"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+class _Metric:
+    """Base class for labelled metrics; children are created on first use"""
+    kind = None
+
+    def __init__(self, name, help, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+        if not self.labelnames:
+            self.labels()  # unlabelled metrics are exported from the start
+
+    def labels(self, *values):
+        """Get the child metric for one combination of label values"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f'{self.name} expects labels {self.labelnames}')
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _items(self):
+        with self._lock:
+            return sorted(self._children.items())
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+class Counter(_Metric):
+    """Monotonically increasing total, e.g. requests or bytes served"""
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def samples(self):
+        for values, child in self._items():
+            yield f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}'
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets, e.g. latencies"""
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS, registry=REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def samples(self):
+        for values, child in self._items():
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, values, [('le', _format_value(float(bound)))])
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _format_labels(self.labelnames, values)
+            yield f'{self.name}_sum{labels} {_format_value(total)}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+def timed(histogram):
+    """
+    Decorator that observes a function's duration, labelled with its name
+
+    Args:
+        histogram (Histogram): Histogram with a single 'function' label
+
+    Returns:
+        callable: Decorator
+    """
+    def decorate(func):
+        child = histogram.labels(func.__name__)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+# Metrics of the web application
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'Time to build the response, by route', ('method', 'route'))
+HTTP_REQUESTS = Counter(
+    'http_requests_total', 'Requests handled, by route and status', ('method', 'route', 'status'))
+HTTP_RESPONSE_BYTES = Counter(
+    'http_response_bytes_total', 'Response body bytes served, by route', ('route',))
+UPLOAD_SIZE_BYTES = Histogram(
+    'model_upload_size_bytes', 'Size of uploaded model files', buckets=SIZE_BUCKETS)
+DB_QUERY_SECONDS = Histogram(
+    'db_query_duration_seconds', 'Time spent in database.py calls, by function', ('function',),
+    buckets=QUERY_BUCKETS)
+CACHE_REQUESTS = Counter(
+    'cache_requests_total', 'In-process cache lookups, by cache and result', ('cache', 'result'))
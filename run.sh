@@ -21,6 +21,17 @@ if ! python3 -c "import flask" 2>/dev/null; then
     pip install -r requirements.txt
 fi
 
+# Production: pre-forked gunicorn workers plus a separate background job worker
+if [ "$1" = "--production" ]; then
+    echo ""
+    echo "🚀 Starting production server on http://localhost:5001 ..."
+    python3 jobs.py &
+    JOB_WORKER_PID=$!
+    trap 'kill $JOB_WORKER_PID' EXIT
+    gunicorn -c gunicorn.conf.py wsgi:app
+    exit $?
+fi
+
 echo ""
 echo "🚀 Starting web application..."
 echo ""
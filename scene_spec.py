@@ -0,0 +1,251 @@
+"""
+Scene spec module for 3D Model Viewer
+Compiles declarative JSON/YAML scene descriptions into meshes
+"""
+import json
+import os
+import sys
+import numpy as np
+from gltf_writer import export_instanced_glb
+from mesh_builder import MeshBuilder, Z_UP_TO_Y_UP, primitive
+
+try:
+    import yaml
+except ImportError:  # YAML specs are optional
+    yaml = None
+
+# Parameters each primitive type accepts from a part
+PRIMITIVE_PARAMS = {
+    'box': ('extents',),
+    'cylinder': ('radius', 'height', 'sections'),
+    'icosphere': ('radius', 'subdivisions'),
+    'mesh': ('vertices', 'faces'),
+}
+UP_ROTATIONS = {'y': None, 'z': Z_UP_TO_Y_UP}
+
+class SceneSpecError(ValueError):
+    """Raised when a scene description is invalid"""
+
+def load_scene_spec(path):
+    """
+    Read a scene description from a .json, .yaml or .yml file
+
+    Args:
+        path (str): Path to the scene file
+
+    Returns:
+        dict: Scene description
+
+    Raises:
+        SceneSpecError: If the file cannot be parsed
+    """
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, encoding='utf-8') as f:
+        if extension in ('.yaml', '.yml'):
+            if yaml is None:
+                raise SceneSpecError('YAML-scènes vereisen PyYAML')
+            try:
+                return yaml.safe_load(f)
+            except yaml.YAMLError as e:
+                raise SceneSpecError(f'Ongeldige YAML: {e}') from e
+        try:
+            return json.load(f)
+        except ValueError as e:
+            raise SceneSpecError(f'Ongeldige JSON: {e}') from e
+
+def dump_scene_spec(spec, path):
+    """
+    Write a scene description as JSON with one palette entry, position set or part per line
+
+    Args:
+        spec (dict): Scene description
+        path (str): Path of the .json file to write
+    """
+    def inline(value):
+        return json.dumps(value, ensure_ascii=False)
+
+    sections = []
+    for key, value in spec.items():
+        if isinstance(value, dict):
+            items = [f'    {inline(name)}: {inline(item)}' for name, item in value.items()]
+            sections.append(f'  {inline(key)}: {{\n' + ',\n'.join(items) + '\n  }')
+        elif isinstance(value, list):
+            items = [f'    {inline(item)}' for item in value]
+            sections.append(f'  {inline(key)}: [\n' + ',\n'.join(items) + '\n  ]')
+        else:
+            sections.append(f'  {inline(key)}: {inline(value)}')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{\n' + ',\n'.join(sections) + '\n}\n')
+
+def pattern_offsets(pattern):
+    """
+    Offsets produced by a single repeat pattern
+
+    Supported patterns:
+        {"linear": {"count": n, "step": [dx, dy, dz]}}
+        {"ring": {"count": n, "radius": r}} around the Z axis
+        {"grid": {"x": [start, stop, step], "y": [...], "z": [...]}}, any subset of axes
+
+    Args:
+        pattern (dict): Pattern description
+
+    Returns:
+        ndarray: (k, 3) offsets
+
+    Raises:
+        SceneSpecError: If the pattern is unknown or malformed
+    """
+    try:
+        (kind, options), = pattern.items()
+        if kind == 'linear':
+            return np.arange(int(options['count']))[:, None] * np.asarray(options['step'], dtype=float)
+        if kind == 'ring':
+            angles = np.arange(int(options['count'])) * 2 * np.pi / int(options['count'])
+            ring = float(options['radius']) * np.column_stack([np.cos(angles), np.sin(angles)])
+            return np.column_stack([ring, np.zeros(len(angles))])
+        if kind == 'grid':
+            axes = [np.arange(*options[axis]) if axis in options else np.zeros(1) for axis in 'xyz']
+            return np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, 3)
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        raise SceneSpecError(f'Ongeldig herhaalpatroon {pattern!r}') from e
+    raise SceneSpecError(f'Onbekend herhaalpatroon {kind!r}')
+
+def part_offsets(part, positions):
+    """
+    Instance offsets of a part: its positions plus offset, expanded by each repeat pattern
+
+    Args:
+        part (dict): Part description
+        positions (dict): Named position sets of the scene
+
+    Returns:
+        ndarray: (k, 3) instance offsets
+    """
+    at = part.get('at', [0, 0, 0])
+    names = [at] if isinstance(at, str) else at
+    if names and all(isinstance(name, str) for name in names):
+        missing = [name for name in names if name not in positions]
+        if missing:
+            raise SceneSpecError(f'Onbekende positieset {missing[0]!r}')
+        at = [position for name in names for position in positions[name]]
+
+    try:
+        offsets = np.asarray(at, dtype=float).reshape(-1, 3) + np.asarray(part.get('offset', [0, 0, 0]), dtype=float)
+    except ValueError as e:
+        raise SceneSpecError(f'Ongeldige positie in onderdeel {part.get("name", "")!r}') from e
+
+    # Every pattern copies all instances so far (a Minkowski sum of offset sets)
+    for pattern in part.get('repeat', []):
+        offsets = (offsets[:, None, :] + pattern_offsets(pattern)[None, :, :]).reshape(-1, 3)
+
+    # Drop instances inside any exclude box; boxes may cover only the first axes
+    excludes = part.get('exclude', [])
+    for box in [excludes] if isinstance(excludes, dict) else excludes:
+        try:
+            low = np.asarray(box['min'], dtype=float)
+            high = np.asarray(box['max'], dtype=float)
+        except (KeyError, TypeError, ValueError) as e:
+            raise SceneSpecError(f'Ongeldig uitsluitgebied in onderdeel {part.get("name", "")!r}') from e
+        axes = slice(0, len(low))
+        inside = np.all((offsets[:, axes] >= low) & (offsets[:, axes] <= high), axis=1)
+        offsets = offsets[~inside]
+    return offsets
+
+def compile_scene(spec):
+    """
+    Compile a scene description into a MeshBuilder
+
+    A scene has an optional "palette" of named RGBA colors, optional named
+    "positions" sets and a list of "parts". Each part names a primitive
+    with its parameters, where to place it ("at": a position, a list of
+    positions or position set names; "offset"; "repeat" patterns;
+    "exclude" box or boxes) and a "color" (palette name or RGBA). Primitive
+    tessellations come from the shared mesh_builder cache.
+
+    Args:
+        spec (dict): Scene description
+
+    Returns:
+        MeshBuilder: Builder with all part instances, in scene space
+
+    Raises:
+        SceneSpecError: If the description is invalid
+    """
+    if not isinstance(spec, dict) or not isinstance(spec.get('parts'), list):
+        raise SceneSpecError('Scène mist een lijst met onderdelen')
+    palette = spec.get('palette', {})
+    positions = spec.get('positions', {})
+
+    builder = MeshBuilder()
+    for part in spec['parts']:
+        name = part.get('name', '')
+        kind = part.get('primitive')
+        if kind not in PRIMITIVE_PARAMS:
+            raise SceneSpecError(f'Onbekende primitive {kind!r} in onderdeel {name!r}')
+        params = {key: part[key] for key in PRIMITIVE_PARAMS[kind] if key in part}
+        try:
+            mesh = primitive(kind, **params)
+        except (TypeError, ValueError) as e:
+            raise SceneSpecError(f'Ongeldige parameters voor onderdeel {name!r}: {e}') from e
+
+        color = part.get('color', [200, 200, 200, 255])
+        if isinstance(color, str):
+            if color not in palette:
+                raise SceneSpecError(f'Onbekende kleur {color!r} in onderdeel {name!r}')
+            color = palette[color]
+
+        offsets = part_offsets(part, positions)
+        if len(offsets):
+            builder.add(mesh, offsets, color)
+    return builder
+
+def scene_placement(spec, builder, target_position=None):
+    """Transform that stands the scene upright (Y-up) and aligns it with target_position"""
+    up = spec.get('up', 'y')
+    if up not in UP_ROTATIONS:
+        raise SceneSpecError(f'Onbekende up-as {up!r}')
+    if target_position is None:
+        target_position = spec.get('target_position', (0.0, 0.0, 0.0))
+    return builder.placement(target_position, UP_ROTATIONS[up])
+
+def build_scene(spec, target_position=None):
+    """
+    Build a scene description into a single mesh
+
+    Args:
+        spec (dict): Scene description
+        target_position (tuple): Optional placement, overrides the spec's target_position
+
+    Returns:
+        trimesh.Trimesh: Combined mesh with vertex colors
+    """
+    builder = compile_scene(spec)
+    mesh = builder.build()
+    mesh.apply_transform(scene_placement(spec, builder, target_position))
+    return mesh
+
+def export_scene(spec, target_position=None, instanced=False):
+    """
+    Build a scene description into GLB bytes
+
+    Args:
+        spec (dict): Scene description
+        target_position (tuple): Optional placement, overrides the spec's target_position
+        instanced (bool): Store repeated parts once with EXT_mesh_gpu_instancing
+
+    Returns:
+        bytes: GLB file contents
+    """
+    if instanced:
+        builder = compile_scene(spec)
+        return export_instanced_glb(builder.parts, scene_placement(spec, builder, target_position))
+    return build_scene(spec, target_position).export(file_type='glb')
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print('Usage: python scene_spec.py <scene.json|scene.yaml> <output.glb> [--instanced]')
+        sys.exit(1)
+    data = export_scene(load_scene_spec(sys.argv[1]), instanced='--instanced' in sys.argv)
+    with open(sys.argv[2], 'wb') as f:
+        f.write(data)
+    print(f'✅ {sys.argv[2]} ({len(data) // 1024} KB)')
@@ -0,0 +1,420 @@
+"""
+Storage module for 3D Model Viewer
+Streams uploads to disk and stores them content-addressed by SHA-256
+"""
+import base64
+import binascii
+import gzip
+import hashlib
+import os
+import re
+import tempfile
+from collections import namedtuple
+from contextlib import contextmanager
+from flask import Request, current_app
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip sidecars are always written
+    brotli = None
+
+try:
+    import fcntl
+except ImportError:  # no flock on Windows; concurrent chunks for one upload are not detected
+    fcntl = None
+
+CHUNK_SIZE = 1024 * 1024  # 1MB
+TEMP_PREFIX = '.upload-'
+
+# Stored files fan out over SHARD_LEVELS directories of SHARD_WIDTH hex digits, e.g. ab/cd/<sha256>.glb
+SHARD_LEVELS = 2
+SHARD_WIDTH = 2
+
+# Partial resumable uploads live in this directory of the upload folder, so
+# finishing one is a rename on the same filesystem
+SESSION_FOLDER = '.sessions'
+SESSION_SUFFIX = '.part'
+CHECKSUM_ALGORITHMS = ('sha256', 'sha1', 'md5')
+
+# Precompressed sidecars, in order of preference when serving
+SIDECAR_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 9
+MIN_SIDECAR_SAVING = 0.1  # drop sidecars that save less than 10%
+
+_DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+_LEGACY_RE = re.compile(r'^[0-9a-f]{32}$')  # uuid4 hex names of uploads from before content addressing
+
+StoredFile = namedtuple('StoredFile', ['filename', 'path', 'digest', 'size', 'reused', 'info'])
+
+class ChecksumMismatch(ValueError):
+    """Raised when an uploaded chunk does not match its checksum"""
+
+class HashingFile:
+    """
+    Writable temp file in the upload folder that hashes bytes as they arrive
+
+    The file is removed on close unless it was committed to its final path.
+    Given a path, an existing file is taken over instead: it is hashed once
+    and left in place on close unless committed.
+    """
+
+    def __init__(self, directory, path=None):
+        self._hash = hashlib.sha256()
+        self.size = 0
+        self.committed = False
+        self.temporary = path is None
+        if self.temporary:
+            fd, self.path = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=directory)
+            self._file = os.fdopen(fd, 'w+b')
+            return
+        self.path = path
+        self._file = open(path, 'r+b')
+        while True:
+            chunk = self._file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            self._hash.update(chunk)
+            self.size += len(chunk)
+
+    def write(self, data):
+        self._hash.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        """Return the SHA-256 of everything written so far"""
+        return self._hash.hexdigest()
+
+    def commit(self, path):
+        """Flush to disk and atomically rename the file to path"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.chmod(self.path, 0o644)
+        os.replace(self.path, path)
+        self.committed = True
+
+    def close(self):
+        self._file.close()
+        if self.temporary and not self.committed and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+class UploadRequest(Request):
+    """Request that spools file uploads straight into the upload folder"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingFile(current_app.config['UPLOAD_FOLDER'])
+
+    @property
+    def max_content_length(self):
+        """MAX_CONTENT_LENGTH, unless UPLOAD_LIMITS sets a larger one for this endpoint"""
+        if not current_app:
+            return None
+        limits = current_app.config.get('UPLOAD_LIMITS', {})
+        return limits.get(self.endpoint, current_app.config['MAX_CONTENT_LENGTH'])
+
+def content_digest(filename):
+    """
+    Get the SHA-256 a content-addressed filename is named after
+
+    Args:
+        filename (str): Stored filename, e.g. "<sha256>.glb"
+
+    Returns:
+        str: Hex digest, or None if the name is not content-addressed
+    """
+    stem = os.path.basename(filename).split('.', 1)[0]
+    return stem if _DIGEST_RE.match(stem) else None
+
+def legacy_key(filename):
+    """
+    Get the uuid4 hex a stored filename from before content addressing is named after
+
+    Args:
+        filename (str): Stored filename, e.g. "<uuid4 hex>.glb"
+
+    Returns:
+        str: Hex uuid, or None if the name is not a legacy upload name
+    """
+    stem = os.path.basename(filename).split('.', 1)[0]
+    return stem if _LEGACY_RE.match(stem) else None
+
+def shard_path(filename):
+    """
+    Relative path of a stored file in the sharded upload layout
+
+    Content-addressed files, legacy uuid-named uploads and the files
+    derived from them live in directories named after the leading digits
+    of their digest or uuid; other names stay at the top of the upload
+    folder.
+
+    Args:
+        filename (str): Stored filename or relative path, e.g. "<sha256>.glb"
+
+    Returns:
+        str: Relative path, e.g. "ab/cd/<sha256>.glb"
+    """
+    key = content_digest(filename) or legacy_key(filename)
+    if key is None:
+        return filename
+    name = os.path.basename(filename)
+    shards = [key[i * SHARD_WIDTH:(i + 1) * SHARD_WIDTH] for i in range(SHARD_LEVELS)]
+    return '/'.join(shards + [name])
+
+def derived_filename(filename, suffix):
+    """
+    Name of a file derived from a stored model, e.g. an LOD level
+
+    Args:
+        filename (str): Stored filename or path, e.g. "<sha256>.glb"
+        suffix (str): Suffix replacing the extension, e.g. ".lod1.glb"
+
+    Returns:
+        str: Derived filename or path next to the original
+    """
+    return os.path.splitext(filename)[0] + suffix
+
+def store_upload(stream, directory, extension, validate=None):
+    """
+    Store an uploaded file under its content hash
+
+    Streams spooled by UploadRequest and other HashingFiles are already on
+    disk and hashed; any other stream is copied in CHUNK_SIZE pieces while
+    being hashed. When a file with the same digest already exists it is
+    reused.
+
+    Args:
+        stream: File-like object with the uploaded bytes
+        directory (str): Upload folder
+        extension (str): File extension without dot
+        validate (callable): Optional check called with the temp file path
+            before the file is stored; its return value is kept as info and
+            any exception it raises discards the upload
+
+    Returns:
+        StoredFile: Stored filename relative to the upload folder (see
+            shard_path), path, SHA-256 digest, size, whether an existing
+            blob was reused, and the validator's info
+    """
+    spool = stream if isinstance(stream, HashingFile) else None
+    if spool is None:
+        spool = HashingFile(directory)
+        try:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                spool.write(chunk)
+        except Exception:
+            spool.close()
+            raise
+
+    try:
+        spool.flush()
+        info = validate(spool.path) if validate else None
+        digest = spool.hexdigest()
+        filename = shard_path(f"{digest}.{extension}")
+        path = os.path.join(directory, filename)
+        reused = os.path.exists(path)
+        if reused:
+            # A fresh mtime keeps the orphan sweep away until the new row exists
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                reused = False
+        if not reused:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            spool.commit(path)
+    finally:
+        spool.close()
+
+    return StoredFile(filename, path, digest, spool.size, reused, info)
+
+def session_path(directory, upload_id):
+    """
+    Path of the partial file of a resumable upload
+
+    Args:
+        directory (str): Upload folder
+        upload_id (str): Upload session ID
+
+    Returns:
+        str: Path below SESSION_FOLDER
+    """
+    return os.path.join(directory, SESSION_FOLDER, upload_id + SESSION_SUFFIX)
+
+@contextmanager
+def open_session_file(path):
+    """
+    Open the partial file of a resumable upload for exclusive use
+
+    The lock is shared by every process, so two requests can never write
+    the same upload at once.
+
+    Args:
+        path (str): Path from session_path
+
+    Yields:
+        file: The file opened for reading and writing
+
+    Raises:
+        FileNotFoundError: If the file does not exist
+        BlockingIOError: If another request holds the file
+    """
+    with open(path, 'r+b') as file:
+        if fcntl is not None:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        yield file
+
+def parse_checksum(header):
+    """
+    Parse an Upload-Checksum header, e.g. "sha256 <base64 digest>"
+
+    Args:
+        header (str): Header value
+
+    Returns:
+        tuple: (hash object, expected digest bytes)
+
+    Raises:
+        ValueError: If the header is malformed or the algorithm unsupported
+    """
+    algorithm, _, encoded = (header or '').strip().partition(' ')
+    if algorithm.lower() not in CHECKSUM_ALGORITHMS:
+        raise ValueError(f'unsupported checksum algorithm: {algorithm!r}')
+    checksum = hashlib.new(algorithm.lower())
+    try:
+        expected = base64.b64decode(encoded.strip(), validate=True)
+    except binascii.Error:
+        raise ValueError('checksum is not valid base64')
+    if len(expected) != checksum.digest_size:
+        raise ValueError('checksum has the wrong length')
+    return checksum, expected
+
+def append_chunk(file, offset, stream, checksum, limit):
+    """
+    Write a chunk of a resumable upload at offset, in CHUNK_SIZE pieces
+
+    Anything past offset, e.g. from a chunk that was interrupted, is
+    discarded first. The chunk is only kept if it matches its checksum and
+    fits in limit; it is on disk when this returns.
+
+    Args:
+        file: File from open_session_file
+        offset (int): Bytes of the upload already stored
+        stream: File-like object with the chunk
+        checksum (tuple): (hash object, expected digest) from parse_checksum
+        limit (int): Maximum chunk size, i.e. the bytes the upload still lacks
+
+    Returns:
+        int: New offset
+
+    Raises:
+        ChecksumMismatch: If the chunk does not match its checksum
+        ValueError: If the chunk is larger than limit
+    """
+    hasher, expected = checksum
+    file.seek(offset)
+    file.truncate()
+    written = 0
+    try:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            written += len(chunk)
+            if written > limit:
+                raise ValueError('chunk exceeds the upload length')
+            hasher.update(chunk)
+            file.write(chunk)
+        if hasher.digest() != expected:
+            raise ChecksumMismatch('chunk does not match its checksum')
+        file.flush()
+        os.fsync(file.fileno())
+    except BaseException:
+        file.seek(offset)
+        file.truncate()
+        raise
+    return offset + written
+
+def _compress_file(path, target, encoding):
+    """Stream-compress path into target with the given content encoding"""
+    fd, tmp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=os.path.dirname(target))
+    try:
+        with open(path, 'rb') as source, os.fdopen(fd, 'wb') as raw:
+            if encoding == 'gzip':
+                with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=GZIP_LEVEL, mtime=0) as out:
+                    while True:
+                        chunk = source.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        out.write(chunk)
+            else:
+                compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+                while True:
+                    chunk = source.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    raw.write(compressor.process(chunk))
+                raw.write(compressor.finish())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, target)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def write_sidecars(path):
+    """
+    Write precompressed sidecars next to a stored file
+
+    A "<file>.gz" sidecar is always attempted, "<file>.br" only when the
+    brotli package is installed. Sidecars that do not shrink the file by
+    at least MIN_SIDECAR_SAVING are removed again.
+
+    Args:
+        path (str): Path to the stored file
+
+    Returns:
+        list: Content encodings for which a sidecar exists
+    """
+    size = os.path.getsize(path)
+    written = []
+    for encoding, suffix in SIDECAR_SUFFIXES.items():
+        if encoding == 'br' and brotli is None:
+            continue
+        target = path + suffix
+        if not os.path.exists(target):
+            _compress_file(path, target, encoding)
+        if os.path.getsize(target) > size * (1 - MIN_SIDECAR_SAVING):
+            os.remove(target)
+            continue
+        written.append(encoding)
+    return written
+
+def select_sidecar(directory, filename, accept_encodings):
+    """
+    Pick the best precompressed sidecar the client accepts
+
+    Args:
+        directory (str): Upload folder
+        filename (str): Requested stored filename
+        accept_encodings: Werkzeug Accept object from the request
+
+    Returns:
+        str: Content encoding of the chosen sidecar, or None for the raw file
+    """
+    path = safe_join(directory, filename)
+    if path is None:
+        return None
+    for encoding, suffix in SIDECAR_SUFFIXES.items():
+        if accept_encodings.quality(encoding) > 0 and os.path.exists(path + suffix):
+            return encoding
+    return None
@@ -4,14 +4,65 @@ Simple tests to verify core functionality
 """
 import sys
 import os
+import subprocess
 import tempfile
 import io
+import json
+import struct
+import zipfile
 
 # Add current directory to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from database import init_db, add_model, get_model, get_all_models, delete_model
+from database import init_db, add_model, get_model, get_all_models, delete_model, get_connection, close_connection, get_models_page
 from app import app, allowed_file
+from storage import store_upload
+from jobs import JobWorker
+
+def make_test_glb(padding=b''):
+    """Build a minimal valid GLB with one triangle, plus optional extra buffer bytes"""
+    positions = struct.pack('<9f', 0, 0, 0, 1, 0, 0, 0, 2, 0)
+    binary = positions + padding
+    binary += b'\0' * (-len(binary) % 4)
+    gltf = {
+        'asset': {'version': '2.0'},
+        'scene': 0,
+        'scenes': [{'nodes': [0]}],
+        'nodes': [{'mesh': 0}],
+        'meshes': [{'primitives': [{'attributes': {'POSITION': 0}}]}],
+        'accessors': [{'bufferView': 0, 'componentType': 5126, 'count': 3, 'type': 'VEC3',
+                       'min': [0, 0, 0], 'max': [1, 2, 0]}],
+        'bufferViews': [{'buffer': 0, 'byteLength': len(positions)}],
+        'buffers': [{'byteLength': len(binary)}],
+    }
+    document = json.dumps(gltf).encode()
+    document += b' ' * (-len(document) % 4)
+    length = 12 + 8 + len(document) + 8 + len(binary)
+    return (struct.pack('<4sII', b'glTF', 2, length)
+            + struct.pack('<II', len(document), 0x4E4F534A) + document
+            + struct.pack('<II', len(binary), 0x004E4942) + binary)
+
+def remove_stored_file(path):
+    """Remove a stored upload together with its derived files"""
+    directory = os.path.dirname(path)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    for name in os.listdir(directory):
+        if name.startswith(stem):
+            os.remove(os.path.join(directory, name))
+    # Drop the shard directories once they are empty
+    while os.path.basename(directory) != 'uploads' and not os.listdir(directory):
+        os.rmdir(directory)
+        directory = os.path.dirname(directory)
+
+def run_jobs():
+    """Process all queued background jobs"""
+    worker = JobWorker(max_workers=1)
+    worker.drain()
+    worker.stop()
+
+def crash_worker(payload):
+    """Job task that kills its worker process, like an out-of-memory kill"""
+    os._exit(1)
 
 def test_database_operations():
     """Test database CRUD operations"""
@@ -58,6 +109,38 @@ def test_database_operations():
     
     print("✅ All database tests passed!\n")
 
+def test_connection_pool():
+    """Test pooled per-thread database connections"""
+    print("Testing connection pool...")
+    
+    if os.path.exists('models.db'):
+        os.remove('models.db')
+    init_db()
+    
+    # Same thread reuses one warm connection
+    assert get_connection() is get_connection(), "Connection should be reused within a thread"
+    print("✓ Connection is reused within a thread")
+    
+    # Other threads get their own connection
+    import threading
+    other = []
+    thread = threading.Thread(target=lambda: other.append(get_connection()))
+    thread.start()
+    thread.join()
+    assert other[0] is not get_connection(), "Threads should not share a connection"
+    print("✓ Threads get separate connections")
+    
+    # WAL journaling is enabled
+    mode = get_connection().execute('PRAGMA journal_mode').fetchone()[0]
+    assert mode == 'wal', "Journal mode should be WAL"
+    print("✓ WAL journaling enabled")
+    
+    # Cleanup
+    close_connection()
+    os.remove('models.db')
+    
+    print("✅ All connection pool tests passed!\n")
+
 def test_file_validation():
     """Test file validation function"""
     print("Testing file validation...")
@@ -116,6 +199,50 @@ def test_flask_routes():
     
     print("✅ All Flask route tests passed!\n")
 
+def test_pagination():
+    """Test keyset pagination of the model library"""
+    print("Testing pagination...")
+    
+    if os.path.exists('models.db'):
+        os.remove('models.db')
+    init_db()
+    
+    ids = [add_model(f'm{i}.glb', f'model_{i}.glb', f'uploads/m{i}.glb') for i in range(5)]
+    
+    # Walk all pages in the database layer
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = get_models_page(after=cursor, limit=2)
+        seen.extend(model['id'] for model in page)
+        if cursor is None:
+            break
+    assert seen == list(reversed(ids)), "Pages should list every model once, newest first"
+    print("✓ Keyset pages cover all models in order")
+    
+    # Walk the same pages through the JSON API
+    app.config['TESTING'] = True
+    client = app.test_client()
+    response = client.get('/api/models?limit=3')
+    data = response.get_json()
+    assert [m['id'] for m in data['models']] == seen[:3], "First API page should match"
+    response = client.get(data['next_url'])
+    data = response.get_json()
+    assert [m['id'] for m in data['models']] == seen[3:], "Second API page should match"
+    assert data['next'] is None, "Last page should have no next cursor"
+    print("✓ /api/models pages through the library")
+    
+    response = client.get('/api/models?after=not-a-cursor')
+    assert response.status_code == 400, "Invalid cursor should return 400"
+    response = client.get(f'/models?after={get_models_page(limit=2)[1]}')
+    assert response.status_code == 200, "Second HTML page should load"
+    print("✓ Invalid cursors rejected, HTML pages load")
+    
+    # Cleanup
+    os.remove('models.db')
+    
+    print("✅ All pagination tests passed!\n")
+
 def test_upload_flow():
     """Test complete upload flow"""
     print("Testing upload flow...")
@@ -130,13 +257,18 @@ def test_upload_flow():
     app.config['TESTING'] = True
     client = app.test_client()
     
-    # Create a fake GLB file
+    # Files with a model extension but no glTF content are rejected
     fake_file = io.BytesIO(b'fake glb content for testing')
-    fake_file.name = 'test.glb'
+    response = client.post('/upload', data={
+        'model': (fake_file, 'test.glb')
+    }, content_type='multipart/form-data')
+    assert response.status_code == 400, "Fake GLB content should be rejected"
+    assert not get_all_models(), "Rejected upload should not be stored"
+    print("✓ Fake GLB content rejected")
     
     # Test upload
     response = client.post('/upload', data={
-        'model': (fake_file, 'test.glb')
+        'model': (io.BytesIO(make_test_glb()), 'test.glb')
     }, content_type='multipart/form-data')
     
     assert response.status_code == 200, "Upload should succeed"
@@ -154,14 +286,1385 @@ def test_upload_flow():
     # Cleanup
     models = get_all_models()
     for model in models:
-        if os.path.exists(model['file_path']):
-            os.remove(model['file_path'])
+        remove_stored_file(model['file_path'])
     
     if os.path.exists('models.db'):
         os.remove('models.db')
     
     print("✅ All upload flow tests passed!\n")
 
+def test_content_addressed_storage():
+    """Test streaming, hash-addressed upload storage with dedup"""
+    print("Testing content-addressed storage...")
+    
+    import hashlib
+    
+    # Setup
+    if os.path.exists('models.db'):
+        os.remove('models.db')
+    init_db()
+    
+    os.makedirs('uploads', exist_ok=True)
+    
+    app.config['TESTING'] = True
+    client = app.test_client()
+    
+    content = make_test_glb(b'identical model bytes' * 1000)
+    digest = hashlib.sha256(content).hexdigest()
+    
+    model_ids = []
+    for _ in range(2):
+        response = client.post('/upload', data={
+            'model': (io.BytesIO(content), 'same.glb')
+        }, content_type='multipart/form-data')
+        assert response.status_code == 200, "Upload should succeed"
+        model_ids.append(response.get_json()['model_id'])
+    
+    first, second = get_model(model_ids[0]), get_model(model_ids[1])
+    assert first['filename'] == f'{digest[:2]}/{digest[2:4]}/{digest}.glb', \
+        "File should be named after its SHA-256 and sharded by its prefix"
+    assert first['content_hash'] == digest, "Digest should be recorded"
+    assert first['file_size'] == len(content), "Size should be recorded"
+    assert second['file_path'] == first['file_path'], "Duplicate upload should reuse the blob"
+    print("✓ Duplicate uploads share one content-addressed file")
+    
+    leftovers = [f for f in os.listdir('uploads') if f.startswith('.upload-')]
+    assert not leftovers, "Temp spool files should be cleaned up"
+    print("✓ No temp files left behind")
+    
+    # Streams that were not spooled by the request are copied and hashed
+    with tempfile.TemporaryDirectory() as directory:
+        stored = store_upload(io.BytesIO(content), directory, 'glb')
+        assert stored.digest == digest and not stored.reused, "Copied stream should hash identically"
+        assert store_upload(io.BytesIO(content), directory, 'glb').reused, "Second copy should be reused"
+    print("✓ Plain streams are stored and deduplicated")
+    
+    # Cleanup
+    remove_stored_file(first['file_path'])
+    os.remove('models.db')
+    
+    print("✅ All content-addressed storage tests passed!\n")
+
+def test_model_delivery_caching():
+    """Test ETag, immutable caching and range requests for model files"""
+    print("Testing model delivery caching...")
+    
+    # Setup
+    if os.path.exists('models.db'):
+        os.remove('models.db')
+    init_db()
+    
+    os.makedirs('uploads', exist_ok=True)
+    
+    app.config['TESTING'] = True
+    client = app.test_client()
+    
+    content = make_test_glb(b'0123456789' * 100)
+    response = client.post('/upload', data={
+        'model': (io.BytesIO(content), 'cached.glb')
+    }, content_type='multipart/form-data')
+    model = get_model(response.get_json()['model_id'])
+    url = f"/uploads/{model['filename']}"
+    
+    response = client.get(url)
+    assert response.status_code == 200, "Model file should be served"
+    assert response.data == content, "Served bytes should match the upload"
+    etag = response.headers['ETag']
+    last_modified = response.headers['Last-Modified']
+    assert model['content_hash'] in etag, "ETag should be digest based"
+    assert response.cache_control.immutable, "Content-addressed files should be immutable"
+    assert response.cache_control.max_age > 0, "Content-addressed files should be cached"
+    print("✓ Strong ETag and immutable Cache-Control sent")
+    
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 304, "Matching ETag should return 304"
+    response = client.get(url, headers={'If-Modified-Since': last_modified})
+    assert response.status_code == 304, "Unmodified file should return 304"
+    print("✓ Conditional requests return 304")
+    
+    response = client.get(url, headers={'Range': 'bytes=10-19'})
+    assert response.status_code == 206, "Range request should return 206"
+    assert response.data == content[10:20], "Range should return the requested bytes"
+    assert response.headers['Content-Range'] == f'bytes 10-19/{len(content)}', "Content-Range should be set"
+    print("✓ Byte ranges return 206 Partial Content")
+    
+    # Cleanup
+    remove_stored_file(model['file_path'])
+    os.remove('models.db')
+    
+    print("✅ All model delivery caching tests passed!\n")
+
+def test_precompressed_sidecars():
+    """Test precompressed sidecars and Accept-Encoding negotiation"""
+    print("Testing precompressed sidecars...")
+    
+    import gzip
+    
+    # Setup
+    if os.path.exists('models.db'):
+        os.remove('models.db')
+    init_db()
+    
+    os.makedirs('uploads', exist_ok=True)
+    
+    app.config['TESTING'] = True
+    client = app.test_client()
+    
+    content = json.dumps({'asset': {'version': '2.0'}, 'nodes': [{'name': 'column'}] * 500}).encode()
+    response = client.post('/upload', data={
+        'model': (io.BytesIO(content), 'scene.gltf')
+    }, content_type='multipart/form-data')
+    model = get_model(response.get_json()['model_id'])
+    url = f"/uploads/{model['filename']}"
+    run_jobs()
+    assert os.path.exists(model['file_path'] + '.gz'), "Gzip sidecar should be written after upload"
+    print("✓ Gzip sidecar written by the background job")
+    
+    response = client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+    assert response.headers.get('Content-Encoding') == 'gzip', "Gzip sidecar should be served"
+    assert gzip.decompress(response.data) == content, "Sidecar should decompress to the original"
+    assert response.mimetype == 'model/gltf+json', "Mimetype should be the model's, not gzip"
+    assert 'Accept-Encoding' in response.headers['Vary'], "Vary header should be sent"
+    gzip_etag = response.headers['ETag']
+    print("✓ Sidecar chosen from Accept-Encoding")
+    
+    response = client.get(url, headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in response.headers, "Raw file should be served without encoding"
+    assert response.data == content, "Raw bytes should be served"
+    assert response.headers['ETag'] != gzip_etag, "Encodings should have distinct ETags"
+    assert 'Accept-Encoding' in response.headers['Vary'], "Vary header should be sent"
+    print("✓ Raw file served as fallback")
+    
+    # Incompressible files get no sidecar
+    noise = make_test_glb(os.urandom(4096))
+    response = client.post('/upload', data={
+        'model': (io.BytesIO(noise), 'noise.glb')
+    }, content_type='multipart/form-data')
+    noisy = get_model(response.get_json()['model_id'])
+    run_jobs()
+    assert not os.path.exists(noisy['file_path'] + '.gz'), "Useless sidecars should be dropped"
+    print("✓ Incompressible files get no sidecar")
+    
+    # Cleanup
+    remove_stored_file(model['file_path'])
+    remove_stored_file(noisy['file_path'])
+    os.remove('models.db')
+    
+    print("✅ All precompressed sidecar tests passed!\n")
+
+def test_background_jobs():
+    """Test the post-upload job queue, retries and status API"""
+    print("Testing background jobs...")
+    
+    import sqlite3
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from datetime import datetime
+    from database import claim_jobs, enqueue_job, get_job, get_jobs
+    
+    # Setup
+    if os.path.exists('models.db'):
+        os.remove('models.db')
+    init_db()
+    
+    os.makedirs('uploads', exist_ok=True)
+    
+    app.config['TESTING'] = True
+    client = app.test_client()
+    
+    response = client.post('/upload', data={
+        'model': (io.BytesIO(make_test_glb(b'queued model ' * 200)), 'queued.glb')
+    }, content_type='multipart/form-data')
+    model_id = response.get_json()['model_id']
+    
+    data = client.get(f'/models/{model_id}/status').get_json()
+    assert data['status'] == 'processing', "New upload should be processing"
+    assert data['jobs'][0]['status'] == 'pending', "Job should be queued, not run inline"
+    print("✓ Upload returns before processing runs")
+    
+    worker = JobWorker(max_workers=2)
+    worker.drain()
+    worker.stop()
+    data = client.get(f'/models/{model_id}/status').get_json()
+    assert data['status'] == 'ready', "Model should be ready after processing"
+    assert data['jobs'][0]['result']['encodings'] == ['gzip'], "Job result should be recorded"
+    print("✓ Process pool worker completes jobs")
+    
+    # Failing jobs are retried with backoff, then marked failed
+    enqueue_job('does-not-exist', model_id, max_attempts=2)
+    worker = JobWorker(executor=ThreadPoolExecutor(1))
+    worker.drain()
+    failing = get_jobs(model_id)[-1]
+    assert failing['status'] == 'pending' and failing['attempts'] == 1, "Failed job should be scheduled for retry"
+    assert failing['run_after'] > failing['updated_at'], "Retry should be delayed"
+    assert 'does-not-exist' in failing['last_error'], "Error should be recorded"
+    get_connection().execute("UPDATE jobs SET run_after = updated_at WHERE id = ?", (failing['id'],))
+    get_connection().commit()
+    worker.drain()
+    assert get_jobs(model_id)[-1]['status'] == 'failed', "Job should fail after max attempts"
+    assert client.get(f'/models/{model_id}/status').get_json()['status'] == 'failed', "Status should report failure"
+    print("✓ Failed jobs retry with backoff, then fail")
+    
+    response = client.get('/models/99999/status')
+    assert response.status_code == 404, "Unknown model status should return 404"
+    
+    # A task process that dies takes its job down, not the worker
+    import jobs
+    jobs.task('crash')(crash_worker)
+    try:
+        crashing = enqueue_job('crash', model_id, max_attempts=2)
+        worker = JobWorker(max_workers=1)
+        broken_executor = worker.executor
+        worker.drain()
+        crashed = get_job(crashing)
+        assert crashed['status'] == 'pending' and 'BrokenProcessPool' in crashed['last_error'], \
+            "Jobs in a dead pool should be retried with backoff"
+        assert worker.executor is not broken_executor, "A dead pool should be replaced"
+        sidecars = enqueue_job('sidecars', model_id, {'path': get_model(model_id)['file_path']})
+        worker.drain()
+        worker.stop()
+        assert get_job(sidecars)['status'] == 'done', "The new pool should run jobs"
+    finally:
+        del jobs.TASKS['crash']
+    
+    # A job whose last lease expired, e.g. because it killed a standalone worker, fails
+    get_connection().execute("UPDATE jobs SET status = 'running', attempts = max_attempts, run_after = ? "
+                             "WHERE id = ?", ('2000-01-01T00:00:00', crashing))
+    get_connection().commit()
+    assert claim_jobs(10) == [], "Jobs out of attempts should not be reclaimed"
+    crashed = get_job(crashing)
+    assert crashed['status'] == 'failed' and 'Lease expired' in crashed['last_error']
+    print("✓ Dead task processes are replaced and crashing jobs eventually fail")
+
+    # A job that outlives its lease keeps it while it runs and is not reclaimed by another worker
+    release = threading.Event()
+    jobs.task('slow')(lambda payload: release.wait(5) and {'slow': True})
+    saved_interval = jobs.LEASE_RENEWAL_INTERVAL
+    jobs.LEASE_RENEWAL_INTERVAL = 0
+    try:
+        slow = enqueue_job('slow', model_id)
+        worker = JobWorker(executor=ThreadPoolExecutor(1))
+        worker.run_once(timeout=0)
+        get_connection().execute("UPDATE jobs SET run_after = ? WHERE id = ?", ('2000-01-01T00:00:00', slow))
+        get_connection().commit()
+        worker.run_once(timeout=0.01)
+        assert get_job(slow)['run_after'] > datetime.now().isoformat(), "A running job's lease should be renewed"
+        assert claim_jobs(10) == [], "A job still running should not be reclaimed"
+        release.set()
+        worker.drain()
+        worker.stop()
+        finished = get_job(slow)
+        assert finished['status'] == 'done' and finished['attempts'] == 1, "The job should run exactly once"
+    finally:
+        release.set()
+        jobs.LEASE_RENEWAL_INTERVAL = saved_interval
+        del jobs.TASKS['slow']
+    print("✓ Leases of long-running jobs are renewed")
+
+    # Database errors while polling do not stop the worker thread
+    polls = []
+    def locked(limit):
+        polls.append(limit)
+        raise sqlite3.OperationalError('database is locked')
+    saved_claim = jobs.claim_jobs
+    jobs.claim_jobs = locked
+    try:
+        worker = JobWorker(executor=ThreadPoolExecutor(1), poll_interval=0.01).start()
+        time.sleep(0.1)
+        assert worker._thread.is_alive() and len(polls) > 1, "The worker should keep polling"
+        worker.stop()
+    finally:
+        jobs.claim_jobs = saved_claim
+    print("✓ Database errors while polling are retried")
+    
+    # Cleanup
+    remove_stored_file(get_model(model_id)['file_path'])
+    os.remove('models.db')
+    
+    print("✅ All background job tests passed!\n")
+
+def test_model_metadata():
+    """Test GLB/glTF validation and metadata extraction"""
+    print("Testing model metadata extraction...")
+    
+    from gltf_parser import parse_model, InvalidModelError
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'model.glb')
+        with open(path, 'wb') as f:
+            f.write(make_test_glb(b'\0' * 64))
+        metadata = parse_model(path)
+        assert metadata['mesh_count'] == 1 and metadata['node_count'] == 1, "Counts should be extracted"
+        assert metadata['vertex_count'] == 3, "Vertex count should come from accessors"
+        assert metadata['triangle_count'] == 1, "Triangle count should come from accessors"
+        assert metadata['bounds'] == [[0, 0, 0], [1, 2, 0]], "Bounds should come from accessor min/max"
+        print("✓ GLB metadata extracted from header and JSON chunk")
+        
+        # Malformed files are rejected
+        valid = make_test_glb()
+        broken = {
+            'magic': b'glTX' + valid[4:],
+            'version': valid[:4] + struct.pack('<I', 1) + valid[8:],
+            'length': valid[:-4],
+            'json': valid[:20] + b'x' + valid[21:],
+            'text': b'not a model',
+        }
+        for name, data in broken.items():
+            with open(path, 'wb') as f:
+                f.write(data)
+            try:
+                parse_model(path)
+            except InvalidModelError:
+                continue
+            raise AssertionError(f"Malformed file ({name}) should be rejected")
+        print("✓ Malformed files rejected")
+    
+    # Metadata is stored with the upload and returned by the API
+    if os.path.exists('models.db'):
+        os.remove('models.db')
+    init_db()
+    
+    app.config['TESTING'] = True
+    client = app.test_client()
+    
+    response = client.post('/upload', data={
+        'model': (io.BytesIO(make_test_glb()), 'triangle.glb')
+    }, content_type='multipart/form-data')
+    info = client.get(f"/models/{response.get_json()['model_id']}").get_json()
+    assert info['triangle_count'] == 1, "Triangle count should be stored"
+    assert info['bounds'] == [[0, 0, 0], [1, 2, 0]], "Bounds should be stored"
+    print("✓ Metadata stored on upload and served by /models/<id>")
+    
+    # Cleanup
+    remove_stored_file(info['file_path'])
+    os.remove('models.db')
+    
+    print("✅ All model metadata tests passed!\n")
+
+def test_level_of_detail():
+    """Test LOD generation and serving"""
+    print("Testing level of detail...")
+    
+    import trimesh
+    from gltf_parser import parse_model
+    
+    # Setup
+    if os.path.exists('models.db'):
+        os.remove('models.db')
+    init_db()
+    
+    os.makedirs('uploads', exist_ok=True)
+    
+    app.config['TESTING'] = True
+    client = app.test_client()
+    
+    sphere = trimesh.creation.icosphere(subdivisions=4)
+    sphere.visual.vertex_colors = [200, 100, 50, 255]
+    content = sphere.export(file_type='glb')
+    response = client.post('/upload', data={
+        'model': (io.BytesIO(content), 'sphere.glb')
+    }, content_type='multipart/form-data')
+    model_id = response.get_json()['model_id']
+    run_jobs()
+    
+    model = get_model(model_id)
+    assert model['lod_levels'] > 0, "LOD levels should be generated"
+    print(f"✓ {model['lod_levels']} LOD levels generated in the background")
+    
+    triangles = [model['triangle_count']]
+    for level in range(1, model['lod_levels'] + 1):
+        response = client.get(f'/models/{model_id}/lod/{level}')
+        assert response.status_code == 200, "LOD level should be served"
+        assert response.cache_control.immutable, "LOD files should be cached"
+        with tempfile.NamedTemporaryFile(suffix='.glb') as f:
+            f.write(response.data)
+            f.flush()
+            triangles.append(parse_model(f.name)['triangle_count'])
+    assert triangles == sorted(triangles, reverse=True) and len(set(triangles)) == len(triangles), \
+        "Every level should have fewer triangles"
+    print(f"✓ Triangle counts per level: {triangles}")
+    
+    response = client.get(f'/models/{model_id}/lod/0')
+    assert response.data == content, "Level 0 should be the original model"
+    response = client.get(f"/models/{model_id}/lod/{model['lod_levels'] + 1}")
+    assert response.status_code == 404, "Missing LOD level should return 404"
+    print("✓ Level 0 serves the original, missing levels return 404")
+    
+    # A duplicate upload inherits the LOD levels of the shared blob
+    response = client.post('/upload', data={
+        'model': (io.BytesIO(content), 'sphere_copy.glb')
+    }, content_type='multipart/form-data')
+    duplicate = get_model(response.get_json()['model_id'])
+    assert duplicate['lod_levels'] == model['lod_levels'], "Duplicate should reuse LOD levels"
+    print("✓ Duplicate uploads reuse existing LOD levels")
+
+    # A write that dies before the rename leaves neither a partial level nor a temp file
+    import lod
+    lod_files = [lod.lod_path(model['file_path'], level) for level in range(1, model['lod_levels'] + 1)]
+    for path in lod_files:
+        os.remove(path)
+    saved_replace = lod.os.replace
+    def interrupted(source, target):
+        raise OSError('killed mid-write')
+    lod.os.replace = interrupted
+    try:
+        lod.generate_lods(model['file_path'])
+        raise AssertionError("Interrupted write should fail")
+    except OSError:
+        pass
+    finally:
+        lod.os.replace = saved_replace
+    folder = os.path.dirname(model['file_path'])
+    assert not any(os.path.exists(path) for path in lod_files), "No partial LOD level should be left"
+    assert not [name for name in os.listdir(folder) if name.startswith('.upload-')], "Temp file should be removed"
+    assert len(lod.generate_lods(model['file_path'])) == model['lod_levels'], "Levels should be written again"
+    print("✓ LOD levels are written atomically")
+
+    # Cleanup
+    remove_stored_file(model['file_path'])
+    os.remove('models.db')
+    
+    print("✅ All level of detail tests passed!\n")
+
+def test_thumbnails():
+    """Test CPU thumbnail rendering and the cached library previews"""
+    print("Testing thumbnails...")
+    
+    import trimesh
+    import numpy as np
+    from thumbnail import render_thumbnail, encode_png
+    
+    box = trimesh.creation.box([1, 2, 1])
+    image = render_thumbnail(box.vertices, box.faces, np.tile([255, 0, 0, 255], (8, 1)), size=32)
+    assert image.shape == (32, 32, 4), "Thumbnail should have the requested size"
+    assert image[16, 16, 3] == 255 and image[0, 0, 3] == 0, "Model should be opaque on a transparent background"
+    assert image[16, 16, 0] > image[16, 16, 1], "Vertex colors should be used for shading"
+    assert encode_png(image).startswith(b'\x89PNG'), "Thumbnail should encode as PNG"
+    print("✓ Box rendered with z-buffer and flat shading")
+
+    # Batches resolve into one depth buffer; tiny batches must pick the same nearest faces
+    import thumbnail
+    spheres = trimesh.util.concatenate([trimesh.creation.icosphere(subdivisions=2).apply_translation([i * 0.4, 0, -i])
+                                        for i in range(4)])
+    whole = render_thumbnail(spheres.vertices, spheres.faces, size=48)
+    saved_batch = thumbnail.MAX_FRAGMENTS_PER_BATCH
+    thumbnail.MAX_FRAGMENTS_PER_BATCH = 64
+    try:
+        batched = render_thumbnail(spheres.vertices, spheres.faces, size=48)
+    finally:
+        thumbnail.MAX_FRAGMENTS_PER_BATCH = saved_batch
+    assert np.array_equal(whole, batched), "Occlusion should not depend on the batch size"
+    print("✓ Overlapping faces resolved batch by batch")
+
+    # Setup
+    if os.path.exists('models.db'):
+        os.remove('models.db')
+    init_db()
+    
+    os.makedirs('uploads', exist_ok=True)
+    
+    app.config['TESTING'] = True
+    client = app.test_client()
+    
+    response = client.post('/upload', data={
+        'model': (io.BytesIO(box.export(file_type='glb')), 'box.glb')
+    }, content_type='multipart/form-data')
+    model_id = response.get_json()['model_id']
+    run_jobs()
+    
+    model = get_model(model_id)
+    assert model['thumbnail'], "Thumbnail should be recorded"
+    response = client.get(f"/uploads/{model['thumbnail']}")
+    assert response.mimetype == 'image/png', "Thumbnail should be served as PNG"
+    assert response.cache_control.immutable, "Thumbnail should be cached long-term"
+    print("✓ Thumbnail rendered in the background and cached on disk")
+    
+    # A write that dies before the rename leaves neither a partial thumbnail nor a temp file
+    thumb_path = os.path.join('uploads', model['thumbnail'])
+    os.remove(thumb_path)
+    saved_replace = thumbnail.os.replace
+    def interrupted(source, target):
+        raise OSError('killed mid-write')
+    thumbnail.os.replace = interrupted
+    try:
+        thumbnail.generate_thumbnail(model['file_path'])
+        assert False, "Interrupted write should raise"
+    except OSError:
+        pass
+    finally:
+        thumbnail.os.replace = saved_replace
+    shard = os.path.dirname(thumb_path)
+    assert not os.path.exists(thumb_path), "Partial thumbnails should never reach the served path"
+    assert not [name for name in os.listdir(shard) if name.startswith('.upload-')], "Temp files should be removed"
+    assert thumbnail.generate_thumbnail(model['file_path']) == os.path.basename(thumb_path)
+    print("✓ Thumbnails are written atomically")
+    
+    response = client.get('/models')
+    assert model['thumbnail'].encode() in response.data, "Library page should show the thumbnail"
+    print("✓ Library page shows thumbnails")
+    
+    # Cleanup
+    remove_stored_file(model['file_path'])
+    os.remove('models.db')
+    
+    print("✅ All thumbnail tests passed!\n")
+
+def test_generate_endpoint():
+    """Test parametric model generation with the generated model cache"""
+    print("Testing model generation...")
+    
+    from generate_greek_temple import create_perfect_temple
+    from generation import evict_generated, params_key, validate_params
+    from database import add_generated_model
+    
+    def params_key_of(data):
+        return params_key(validate_params(data))
+    
+    # Setup
+    if os.path.exists('models.db'):
+        os.remove('models.db')
+    init_db()
+    
+    os.makedirs('uploads', exist_ok=True)
+    
+    app.config['TESTING'] = True
+    client = app.test_client()
+    
+    for params in ({'columns': 1}, {'flutes': 2.5}, {'pool_width': 'wide'}, {'roof': 'flat'},
+                   {'target_position': [0, 0]}, {'target_position': '123'}, {'target_position': {'x': 1}}):
+        response = client.post('/generate', json=params)
+        assert response.status_code == 400, f"Invalid parameters should be rejected: {params}"
+    print("✓ Invalid parameters rejected")
+    
+    params = {'columns': 4, 'flutes': 8, 'pool_width': 6, 'pool_depth': 3, 'target_position': [1, 0, 0]}
+    response = client.post('/generate', json=params)
+    assert response.status_code == 202, "Cold generation should run in the background"
+    job_id = response.get_json()['job_id']
+    response = client.post('/generate', json=dict(params, pool_width=6.0))
+    assert response.get_json()['job_id'] == job_id, "Identical requests should share one job"
+    form = {name: str(value) for name, value in params.items() if name != 'target_position'}
+    response = client.post('/generate', data=dict(form, target_position='1, 0, 0'))
+    assert response.get_json()['job_id'] == job_id, "Form posts should accept target_position as x,y,z"
+    assert client.get(f'/generate/{job_id}').get_json()['status'] == 'pending', "Job should be pending"
+    print("✓ Cold request queued once for identical parameters")
+    
+    run_jobs()
+    
+    response = client.get(f'/generate/{job_id}')
+    result = response.get_json()
+    assert result['status'] == 'done', "Generation should finish"
+    model = get_model(result['model_id'])
+    expected = create_perfect_temple(target_position=(1, 0, 0), columns=4, flutes=8, pool_width=6, pool_depth=3)
+    assert model['triangle_count'] == len(expected.faces), "Generated model should match the parameters"
+    assert model['thumbnail'], "Generated model should be post-processed"
+    print(f"✓ Generated model {model['id']} with {model['triangle_count']} triangles")
+    
+    response = client.post('/generate', json=params)
+    assert response.status_code == 200, "Repeat request should be served from cache"
+    assert response.get_json()['cached'] and response.get_json()['model_id'] == model['id'], \
+        "Cache hit should return the existing model"
+    assert len(get_all_models()) == 1, "Cache hit should not add a duplicate model"
+    assert not os.path.exists('generated'), "Generated models should not be kept twice"
+    print("✓ Repeat request served from the library")
+    
+    # Least recently used variants are evicted with their files; shared blobs stay
+    run_jobs()
+    older = add_model('old.glb', 'old.glb', os.path.join('uploads', 'old.glb'), content_hash='old', file_size=1000)
+    shared = add_model('shared.glb', 'shared.glb', os.path.join('uploads', 'shared.glb'), content_hash='shared',
+                       file_size=1000)
+    add_model('shared.glb', 'upload.glb', os.path.join('uploads', 'shared.glb'), content_hash='shared')
+    for name in ('old.glb', 'old.glb.gz', 'shared.glb'):
+        with open(os.path.join('uploads', name), 'wb') as f:
+            f.write(b'x')
+    add_generated_model('old-key', older, owned=True)
+    add_generated_model('shared-key', shared, owned=True)
+    get_connection().execute("UPDATE generated_models SET last_used = '2000-01-01' WHERE params_key != ?",
+                             (params_key_of(params),))
+    get_connection().commit()
+    evicted = evict_generated('uploads', model['file_size'] + 1000, keep=params_key_of(params))
+    assert evicted == ['old-key'], f"Oldest variant should be evicted first: {evicted}"
+    assert get_model(older) is None and not os.path.exists(os.path.join('uploads', 'old.glb')) \
+        and not os.path.exists(os.path.join('uploads', 'old.glb.gz')), "Evicted variants should be deleted"
+    assert evict_generated('uploads', 0, keep=params_key_of(params)) == ['shared-key']
+    assert os.path.exists(os.path.join('uploads', 'shared.glb')), "Blobs used by other models should stay"
+    assert client.post('/generate', json=params).get_json()['cached'], "Kept variant should still be served"
+    print("✓ LRU eviction keeps generated models within their size budget")
+    
+    # Cleanup
+    os.remove(os.path.join('uploads', 'shared.glb'))
+    remove_stored_file(model['file_path'])
+    os.remove('models.db')
+    
+    print("✅ All model generation tests passed!\n")
+
+def test_compact_models():
+    """Test the welded, quantized copies written after upload"""
+    print("Testing compacted models...")
+    
+    import trimesh
+    from gltf_parser import parse_model, read_gltf_json
+    from mesh_optimize import QUANTIZATION_EXTENSION, skip_reason
+    
+    assert skip_reason({'buffers': [{}], 'images': [{}]}, b'') == 'textures', "Textured models should be skipped"
+    assert skip_reason({'buffers': [{'uri': 'a.bin'}]}, None) == 'external-buffers', \
+        "External buffers should be skipped"
+    print("✓ Textured and externally stored models are left as-is")
+    
+    # Setup
+    if os.path.exists('models.db'):
+        os.remove('models.db')
+    init_db()
+    
+    os.makedirs('uploads', exist_ok=True)
+    
+    app.config['TESTING'] = True
+    client = app.test_client()
+    
+    sphere = trimesh.creation.icosphere(subdivisions=4)
+    sphere.visual.vertex_colors = [200, 100, 50, 255]
+    content = sphere.export(file_type='glb', include_normals=True)
+    response = client.post('/upload', data={
+        'model': (io.BytesIO(content), 'sphere.glb')
+    }, content_type='multipart/form-data')
+    model_id = response.get_json()['model_id']
+    run_jobs()
+    
+    model = get_model(model_id)
+    assert model['compact_filename'], "Compacted copy should be recorded"
+    response = client.get(f"/uploads/{model['compact_filename']}")
+    assert response.status_code == 200 and response.cache_control.immutable, "Compacted copy should be cached"
+    assert len(response.data) < len(content), "Compacted copy should be smaller"
+    print(f"✓ Compacted in the background: {len(content)} -> {len(response.data)} bytes")
+    
+    compact_path = os.path.join('uploads', model['compact_filename'])
+    document = read_gltf_json(compact_path)
+    assert QUANTIZATION_EXTENSION in document['extensionsUsed'], "Quantization extension should be declared"
+    accessors = document['accessors']
+    attributes = document['meshes'][0]['primitives'][0]['attributes']
+    assert accessors[attributes['POSITION']]['componentType'] == 5122, "Positions should be int16"
+    assert accessors[attributes['NORMAL']]['componentType'] == 5120, "Normals should be int8"
+    assert parse_model(compact_path)['triangle_count'] == model['triangle_count'], "Triangles should be kept"
+    print("✓ int16 positions and int8 normals with the same triangles")
+    
+    response = client.get(f'/view/{model_id}')
+    assert model['compact_filename'].encode() in response.data, "Viewer should load the compacted copy"
+    print("✓ Viewer loads the compacted copy")
+    
+    # Cleanup
+    remove_stored_file(model['file_path'])
+    os.remove('models.db')
+    
+    print("✅ All compacted model tests passed!\n")
+
+def test_benchmark_suite():
+    """Test the benchmark runner and the baseline comparison"""
+    print("Testing benchmark suite...")
+    
+    from benchmark import BASELINE_PATH, compare_results, run_benchmarks
+    
+    results = run_benchmarks(models=20, requests=5, generations=1, rounds=1, starts=1)
+    for name in ('upload', 'get_model', 'list_models', 'generate_temple', 'import_app', 'cold_start'):
+        summary = results['benchmarks'][name]
+        assert summary['count'] > 0 and summary['throughput'] > 0, f"{name} was not measured"
+        assert summary['p50_ms'] <= summary['p95_ms'] <= summary['p99_ms'], f"{name} percentiles out of order"
+    print("✓ Synthetic library benchmarked with throughput and percentiles")
+    
+    slower = {'benchmarks': {name: dict(summary, p95_ms=summary['p95_ms'] * 2)
+                             for name, summary in results['benchmarks'].items()}}
+    assert compare_results(results, results) == [], "Identical results should not regress"
+    regressions = compare_results(slower, results, threshold=0.5)
+    assert len(regressions) == len(results['benchmarks']), "Doubled p95 latency should be flagged"
+    assert compare_results(slower, results, threshold=1.5) == [], "Threshold should be configurable"
+    print("✓ Regressions beyond the threshold are reported")
+    
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)
+    assert set(baseline['benchmarks']) == set(results['benchmarks']), "Baseline should cover every benchmark"
+    print("✓ Committed baseline covers every benchmark")
+    
+    print("✅ All benchmark suite tests passed!\n")
+
+def test_metrics():
+    """Test request timing and the Prometheus /metrics endpoint"""
+    print("Testing metrics...")
+    
+    # Setup
+    if os.path.exists('models.db'):
+        os.remove('models.db')
+    init_db()
+    
+    os.makedirs('uploads', exist_ok=True)
+    
+    app.config['TESTING'] = True
+    client = app.test_client()
+    
+    def sample(text, name):
+        for line in text.splitlines():
+            if line.startswith(name + ' '):
+                return float(line.rsplit(' ', 1)[1])
+        return 0.0
+    
+    before = client.get('/metrics').get_data(as_text=True)
+    content = make_test_glb(padding=b'metrics')
+    response = client.post('/upload', data={
+        'model': (io.BytesIO(content), 'metrics.glb')
+    }, content_type='multipart/form-data')
+    model = get_model(response.get_json()['model_id'])
+    client.get('/models')
+    client.get(f"/view/{model['id']}")
+    client.get(f"/uploads/{model['filename']}")
+    
+    response = client.get('/metrics')
+    assert response.status_code == 200, "Metrics should be served"
+    assert response.content_type.startswith('text/plain; version=0.0.4'), "Prometheus text format expected"
+    after = response.get_data(as_text=True)
+    assert '# TYPE http_request_duration_seconds histogram' in after, "Latency histogram should be declared"
+    
+    for route in ('/upload', '/models', '/view/<int:model_id>', '/uploads/<path:filename>'):
+        method = 'POST' if route == '/upload' else 'GET'
+        name = f'http_request_duration_seconds_count{{method="{method}",route="{route}"}}'
+        assert sample(after, name) == sample(before, name) + 1, f"{route} should be timed"
+    print("✓ Latency recorded per route")
+    
+    name = 'http_response_bytes_total{route="/uploads/<path:filename>"}'
+    assert sample(after, name) - sample(before, name) == len(content), "Served bytes should be counted"
+    assert sample(after, 'model_upload_size_bytes_count') == sample(before, 'model_upload_size_bytes_count') + 1, \
+        "Upload size should be observed"
+    assert sample(after, 'model_upload_size_bytes_bucket{le="1024.0"}') > \
+        sample(before, 'model_upload_size_bytes_bucket{le="1024.0"}'), "Small upload should land in the first bucket"
+    print("✓ Upload sizes and bytes served counted")
+    
+    name = 'db_query_duration_seconds_count{function="get_model"}'
+    assert sample(after, name) > sample(before, name), "Database calls should be timed"
+
+    # A single insert goes through add_models and is recorded once
+    before = client.get('/metrics').get_data(as_text=True)
+    add_model('timed.glb', 'timed.glb', os.path.join('uploads', 'timed.glb'))
+    after = client.get('/metrics').get_data(as_text=True)
+    name = 'db_query_duration_seconds_count{function="add_models"}'
+    assert sample(after, name) == sample(before, name) + 1, "Insert should be timed once"
+    assert 'function="add_model"' not in after, "Insert should not be timed twice"
+    print("✓ Database calls timed per function")
+    
+    # Cleanup
+    remove_stored_file(model['file_path'])
+    os.remove('models.db')
+    
+    print("✅ All metrics tests passed!\n")
+
+def test_search():
+    """Test full-text search over the model library"""
+    print("Testing search...")
+    
+    # Setup
+    if os.path.exists('models.db'):
+        os.remove('models.db')
+    init_db()
+    
+    app.config['TESTING'] = True
+    client = app.test_client()
+    
+    names = ['greek_temple.glb', 'temple_ruins.glb', 'chair.glb', 'Dragon Statue.glb']
+    ids = [add_model(name, name, f'uploads/{name}') for name in names]
+    marble = add_model('vase.glb', 'vase.glb', 'uploads/vase.glb', metadata={'keywords': 'Temple vase marble'})
+    for i in range(30):
+        add_model(f'tree_{i}.glb', f'tree_{i}.glb', f'uploads/tree_{i}.glb')
+    
+    hits = client.get('/search?q=temp').get_json()['models']
+    assert {hit['id'] for hit in hits[:2]} == set(ids[:2]), "Filename matches should rank first"
+    assert hits[-1]['id'] == marble, "Keyword matches should rank below filename matches"
+    assert len(hits) == 3, "Prefix search should match every temple"
+    print("✓ Prefix search ranks filename matches above metadata keywords")
+    
+    assert [hit['id'] for hit in client.get('/search?q=greek tem').get_json()['models']] == [ids[0]], \
+        "All words should match"
+    assert client.get('/search?q=dragon').get_json()['models'][0]['id'] == ids[3], "Words should be case-insensitive"
+    assert client.get('/search?q="temple OR chair').get_json()['models'] == [], "Operators should be searched literally"
+    assert client.get('/search?q=').status_code == 400, "Empty query should be rejected"
+    print("✓ Multi-word, case-insensitive and literal queries")
+    
+    seen = []
+    url = '/search?q=tree&limit=12'
+    while url:
+        data = client.get(url).get_json()
+        seen.extend(hit['id'] for hit in data['models'])
+        url = data['next_url']
+    assert len(seen) == 30 and len(set(seen)) == 30, "Pages should cover every hit exactly once"
+    assert client.get('/search?q=tree&after=bogus').status_code == 400, "Invalid cursor should be rejected"
+    print("✓ Ranked results are paginated with a cursor")
+    
+    # Inserts shift every bm25 score, so older cursors must not be followed
+    data = client.get('/search?q=tree&limit=10').get_json()
+    for i in range(50):
+        add_model(f'rock_{i}.glb', f'rock_{i}.glb', f'uploads/rock_{i}.glb')
+    response = client.get(data['next_url'])
+    assert response.status_code == 409, "Cursors from before a change should be stale"
+    seen = []
+    url = response.get_json()['first_url']
+    while url:
+        data = client.get(url).get_json()
+        seen.extend(hit['id'] for hit in data['models'])
+        url = data['next_url']
+    assert len(seen) == 30 and len(set(seen)) == 30, "Restarted search should cover every hit exactly once"
+    print("✓ Cursors are rejected once the library changes")
+    
+    delete_model(ids[2])
+    assert client.get('/search?q=chair').get_json()['models'] == [], "Deleted models should leave the index"
+    
+    # Databases created before the index existed are backfilled
+    conn = get_connection()
+    with conn:
+        conn.execute('DROP TABLE models_fts')
+    init_db()
+    assert client.get('/search?q=dragon').get_json()['models'][0]['id'] == ids[3], "Index should be rebuilt"
+    print("✓ Index follows deletes and is backfilled on upgrade")
+    
+    # Cleanup
+    os.remove('models.db')
+    
+    print("✅ All search tests passed!\n")
+
+def test_bulk_upload():
+    """Test uploading many models and zip archives in one request"""
+    print("Testing bulk upload...")
+    
+    # Setup
+    if os.path.exists('models.db'):
+        os.remove('models.db')
+    init_db()
+    os.makedirs('uploads', exist_ok=True)
+    
+    app.config['TESTING'] = True
+    client = app.test_client()
+    
+    glbs = [make_test_glb(padding=bytes([i]) * 4) for i in range(4)]
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('models/', b'')
+        zf.writestr('models/two.glb', glbs[2])
+        zf.writestr('models/three.glb', glbs[3])
+        zf.writestr('models/again.glb', glbs[0])
+        zf.writestr('readme.txt', b'not a model')
+    archive.seek(0)
+    
+    response = client.post('/upload/bulk', data={'models': [
+        (io.BytesIO(glbs[0]), 'zero.glb'),
+        (io.BytesIO(glbs[1]), 'one.glb'),
+        (io.BytesIO(b'glTF broken'), 'broken.glb'),
+        (archive, 'batch.zip'),
+        (io.BytesIO(b'PK not really'), 'fake.zip'),
+    ]}, content_type='multipart/form-data')
+    assert response.status_code == 200, "Bulk upload should succeed when some files are valid"
+    data = response.get_json()
+    results = {result['filename']: result for result in data['results']}
+    assert list(results) == ['zero.glb', 'one.glb', 'broken.glb', 'models/two.glb', 'models/three.glb',
+                             'models/again.glb', 'readme.txt', 'fake.zip'], "Results should follow the input order"
+    assert data['uploaded'] == 5 and data['failed'] == 3
+    assert 'Ongeldig 3D-model' in results['broken.glb']['error']
+    assert 'Alleen .glb' in results['readme.txt']['error']
+    assert results['fake.zip']['error'] == 'Ongeldig zip-archief'
+    print("✓ Files and zip members get a result each, invalid ones with an error")
+    
+    two = get_model(results['models/two.glb']['model_id'])
+    assert two['original_filename'] == 'two.glb' and two['file_size'] == len(glbs[2])
+    assert os.path.exists(two['file_path']), "Archive members should be stored"
+    zero, again = (get_model(results[name]['model_id']) for name in ('zero.glb', 'models/again.glb'))
+    assert zero['content_hash'] == again['content_hash'], "Identical files should share a blob"
+    assert sorted(result['model_id'] for result in data['results'] if result['success']) == \
+        list(range(zero['id'], zero['id'] + 5)), "Rows should be inserted together"
+    print("✓ Models are stored content-addressed and inserted in one batch")
+    
+    conn = get_connection()
+    jobs = conn.execute('SELECT model_id, kind FROM jobs').fetchall()
+    assert len(jobs) == 4 * 4, "Each new blob should be processed once"
+    assert again['id'] not in {job['model_id'] for job in jobs}, "Duplicates should not queue jobs"
+    run_jobs()
+    assert get_model(again['id'])['thumbnail'] is not None, "Duplicates should get the derived files"
+    print("✓ Background jobs are queued once per new blob")
+    
+    assert client.post('/upload/bulk', data={}).status_code == 400, "Empty request should be rejected"
+    response = client.post('/upload/bulk', data={'models': [(io.BytesIO(b'x'), 'x.obj')]},
+                           content_type='multipart/form-data')
+    assert response.status_code == 400 and response.get_json()['failed'] == 1
+    print("✓ Requests without valid models are rejected")
+    
+    # Cleanup
+    for result in data['results']:
+        if result['success']:
+            model = get_model(result['model_id'])
+            if os.path.exists(model['file_path']):
+                remove_stored_file(model['file_path'])
+    os.remove('models.db')
+    
+    print("✅ All bulk upload tests passed!\n")
+
+def test_storage_maintenance():
+    """Test the sharded upload layout, its migration and the orphan sweep"""
+    print("Testing storage maintenance...")
+    
+    import hashlib
+    import time
+    from database import MODEL_CACHE
+    from maintenance import migrate_layout, reconcile
+    
+    # Setup
+    if os.path.exists('models.db'):
+        os.remove('models.db')
+    init_db()
+    
+    app.config['TESTING'] = True
+    client = app.test_client()
+    saved_folder = app.config['UPLOAD_FOLDER']
+    
+    with tempfile.TemporaryDirectory() as folder:
+        app.config['UPLOAD_FOLDER'] = folder
+        try:
+            response = client.post('/upload', data={'model': (io.BytesIO(make_test_glb()), 'new.glb')},
+                                   content_type='multipart/form-data')
+            uploaded = get_model(response.get_json()['model_id'])
+            digest = uploaded['content_hash']
+            assert uploaded['file_path'] == os.path.join(folder, digest[:2], digest[2:4], f'{digest}.glb')
+            print("✓ Uploads are stored in two levels of hex prefix directories")
+            
+            # A model from before sharding, with a derived thumbnail
+            legacy_content = make_test_glb(padding=b'legacy')
+            legacy_digest = hashlib.sha256(legacy_content).hexdigest()
+            with open(os.path.join(folder, f'{legacy_digest}.glb'), 'wb') as f:
+                f.write(legacy_content)
+            with open(os.path.join(folder, f'{legacy_digest}.thumb.png'), 'wb') as f:
+                f.write(b'png')
+            legacy_id = add_model(f'{legacy_digest}.glb', 'legacy.glb', os.path.join(folder, f'{legacy_digest}.glb'),
+                                  content_hash=legacy_digest)
+            get_connection().execute('UPDATE models SET thumbnail = ? WHERE id = ?',
+                                     (f'{legacy_digest}.thumb.png', legacy_id))
+            get_connection().commit()
+            assert client.get(f'/uploads/{legacy_digest}.glb').status_code == 200, "Flat files serve before migration"
+            
+            # Uploads from before content addressing are named after a uuid4; one of them lost its row
+            uuid_key, orphan_key = 'a1' * 16, 'b2' * 16
+            for name in (f'{uuid_key}.glb', f'{uuid_key}.thumb.png', f'{orphan_key}.glb'):
+                with open(os.path.join(folder, name), 'wb') as f:
+                    f.write(b'old')
+            uuid_id = add_model(f'{uuid_key}.glb', 'old.glb', os.path.join('uploads', f'{uuid_key}.glb'))
+            
+            assert migrate_layout(folder, rate=0) == {'moved': 5, 'duplicates': 0, 'models': 2}
+            legacy = get_model(legacy_id)
+            sharded = f'{legacy_digest[:2]}/{legacy_digest[2:4]}/{legacy_digest}'
+            assert legacy['filename'] == f'{sharded}.glb' and legacy['thumbnail'] == f'{sharded}.thumb.png'
+            assert os.path.exists(legacy['file_path']), "Row should point at the moved file"
+            response = client.get(f'/uploads/{legacy_digest}.glb')
+            assert response.status_code == 301 and response.location.endswith(f'/uploads/{sharded}.glb'), \
+                "Old flat URLs should redirect"
+            assert client.get(f'/uploads/{sharded}.glb').status_code == 200
+            uuid_model = get_model(uuid_id)
+            assert uuid_model['filename'] == f'a1/a1/{uuid_key}.glb', "Legacy names should shard by their uuid"
+            assert uuid_model['file_path'] == os.path.join('uploads', 'a1', 'a1', f'{uuid_key}.glb')
+            assert os.path.exists(os.path.join(folder, 'b2', 'b2', f'{orphan_key}.glb'))
+            assert migrate_layout(folder, rate=0) == {'moved': 0, 'duplicates': 0, 'models': 0}, \
+                "Migration should be idempotent"
+            print("✓ Flat files migrate into shards and old URLs redirect")
+            
+            # Orphans: an unreferenced blob with its sidecar and an abandoned spool, all old
+            stale = time.time() - 2 * 60 * 60
+            orphan_digest = 'f' * 64
+            orphan_dir = os.path.join(folder, 'ff', 'ff')
+            os.makedirs(orphan_dir)
+            orphans = [os.path.join(orphan_dir, f'{orphan_digest}.glb'),
+                       os.path.join(orphan_dir, f'{orphan_digest}.glb.gz'),
+                       os.path.join(folder, '.upload-abandoned')]
+            young = os.path.join(folder, f"{'e' * 64}.glb")
+            for path in orphans + [young]:
+                with open(path, 'wb') as f:
+                    f.write(b'x')
+            orphans.append(os.path.join(folder, 'b2', 'b2', f'{orphan_key}.glb'))
+            uuid_files = [os.path.join(folder, 'a1', 'a1', f'{uuid_key}{suffix}') for suffix in ('.glb', '.thumb.png')]
+            for path in orphans + uuid_files + [uploaded['file_path'], legacy['file_path']]:
+                os.utime(path, (stale, stale))
+            missing_id = add_model('gone.glb', 'gone.glb', os.path.join(folder, 'gone.glb'))
+            
+            report = reconcile(folder, rate=0)
+            assert sorted(report['orphan_files']) == sorted(orphans), "Only old unreferenced files are orphans"
+            assert report['missing_files'] == [missing_id], "Models without files should be found"
+            assert all(os.path.exists(path) for path in orphans), "Report mode should not delete"
+            print("✓ Sweep reports orphaned files and models without files")
+            
+            report = reconcile(folder, delete=True, batch_size=2, rate=0)
+            assert report['deleted_files'] == 4 and report['deleted_models'] == 1
+            assert not os.path.exists(os.path.join(folder, 'ff')), "Empty shard directories should be removed"
+            assert all(os.path.exists(path) for path in uuid_files) and get_model(uuid_id) is not None, \
+                "Legacy files with a model should stay"
+            assert get_model(missing_id) is None and get_model(legacy_id) is not None
+            assert os.path.exists(uploaded['file_path']) and os.path.exists(young), "Used and young files stay"
+            assert reconcile(folder, rate=0)['orphan_files'] == [], "Nothing should be left to reconcile"
+            print("✓ Sweep deletes orphans in batches")
+            
+            # file_path is relative to the web app; the command may run from anywhere
+            with tempfile.TemporaryDirectory() as elsewhere:
+                result = subprocess.run(
+                    [sys.executable, os.path.abspath('maintenance.py'), '--upload-folder', folder,
+                     '--database', os.path.abspath('models.db'), 'reconcile', '--delete'],
+                    cwd=elsewhere, capture_output=True, text=True)
+            assert result.returncode == 0, result.stderr
+            assert 'model without file' not in result.stdout, "Stored files should be found from any directory"
+            MODEL_CACHE.clear()
+            assert get_model(uuid_id) is not None and get_model(legacy_id) is not None
+            print("✓ Sweep finds stored files from any working directory")
+        finally:
+            app.config['UPLOAD_FOLDER'] = saved_folder
+    
+    # Cleanup
+    os.remove('models.db')
+    
+    print("✅ All storage maintenance tests passed!\n")
+
+def initialize_schema(path):
+    """Run ensure_schema against a database file; used by test_production_startup's processes"""
+    import database
+    database.DATABASE_PATH = path
+    return database.ensure_schema()
+
+def test_production_startup():
+    """Test the app factory, once-only schema setup and the server configuration"""
+    print("Testing production startup...")
+    
+    import multiprocessing
+    import runpy
+    from app import create_app
+    
+    # Workers forked together initialize a new database exactly once
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'models.db')
+        close_connection()  # forked workers must not inherit an open connection
+        with multiprocessing.get_context('fork').Pool(4) as pool:
+            initialized = pool.map(initialize_schema, [path] * 8)
+        assert initialized.count(True) == 1, "Exactly one worker should create the schema"
+        import database
+        saved_path = database.DATABASE_PATH
+        try:
+            assert initialize_schema(path) is False, "A current schema should not be initialized again"
+        finally:
+            close_connection()
+            database.DATABASE_PATH = saved_path
+    print("✓ Concurrent workers initialize the schema once")
+    
+    if os.path.exists('models.db'):
+        os.remove('models.db')
+    assert create_app() is app and os.path.exists('models.db'), "Factory should prepare the database"
+    
+    import wsgi
+    assert wsgi.app is app and not app.config['JOB_WORKER_ENABLED'], "Web workers should not run jobs"
+    app.config['JOB_WORKER_ENABLED'] = True
+    print("✓ Factory and WSGI entry point configure the app")
+    
+    os.environ['WEB_CONCURRENCY'], os.environ['WEB_THREADS'] = '3', '8'
+    try:
+        settings = runpy.run_path('gunicorn.conf.py')
+    finally:
+        del os.environ['WEB_CONCURRENCY'], os.environ['WEB_THREADS']
+    assert settings['workers'] == 3 and settings['threads'] == 8, "Worker counts should be tunable"
+    assert settings['preload_app'], "Schema setup should run once before forking"
+    print("✓ Server worker and thread counts come from the environment")
+    
+    # Cleanup
+    os.remove('models.db')
+    if os.path.exists('models.db.lock'):
+        os.remove('models.db.lock')
+    
+    print("✅ All production startup tests passed!\n")
+
+def test_lazy_startup():
+    """Test that importing the app is free of side effects and heavy geometry imports"""
+    print("Testing lazy startup...")
+    
+    from benchmark import HEAVY_MODULES, cold_start, import_time
+    
+    with tempfile.TemporaryDirectory() as directory:
+        seconds, loaded = import_time('app', directory)
+        assert seconds > 0 and 'flask' in loaded, "Import time should be read from -X importtime"
+        assert not loaded.intersection(HEAVY_MODULES), "numpy and trimesh should stay off the web path"
+        assert 'concurrent.futures.process' not in loaded, "Job process pools should be imported on demand"
+        assert os.listdir(directory) == [], "Importing the app should not create files"
+        print("✓ Importing the app touches no files and loads no geometry libraries")
+        
+        assert cold_start(directory) > 0
+        assert os.path.exists(os.path.join(directory, 'models.db')), "First request should create the database"
+        assert os.path.isdir(os.path.join(directory, 'uploads')), "First request should create the upload folder"
+        print("✓ Folder and schema are prepared on first use")
+    
+    print("✅ All lazy startup tests passed!\n")
+
+def test_model_cache():
+    """Test the LRU caches for model records and rendered viewer pages"""
+    print("Testing model cache...")
+    
+    import time
+    from cache import LRUCache
+    from database import MODEL_CACHE, set_derived_assets
+    from app import VIEWER_CACHE
+    
+    cache = LRUCache('test', maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None and cache.get('a') == 1, "Least recently used entry should be evicted"
+    assert (cache.hits, cache.misses) == (2, 1), "Hits and misses should be counted"
+    
+    expiring = LRUCache('test_ttl', maxsize=2, ttl=0.01)
+    expiring.set('a', 1)
+    time.sleep(0.02)
+    assert expiring.get('a') is None and len(expiring) == 0, "Expired entries should be dropped"
+    
+    def invalidated_meanwhile():
+        cache.invalidate('d')
+        return 4
+    assert cache.get_or_set('d', invalidated_meanwhile) == 4
+    assert cache.get('d') is None, "Values computed across an invalidation should not be cached"
+    print("✓ LRU eviction, expiry and invalidation")
+    
+    # Setup
+    if os.path.exists('models.db'):
+        os.remove('models.db')
+    init_db()
+    
+    app.config['TESTING'] = True
+    client = app.test_client()
+    
+    model_id = add_model('abc.glb', 'cached.glb', 'uploads/abc.glb', content_hash='abc')
+    assert get_model(model_id)['original_filename'] == 'cached.glb'
+    hits = MODEL_CACHE.hits
+    model = get_model(model_id)
+    assert MODEL_CACHE.hits == hits + 1, "Second lookup should be served from the cache"
+    model['original_filename'] = 'changed by caller'
+    assert get_model(model_id)['original_filename'] == 'cached.glb', "Callers should not share the cached dict"
+    
+    page = client.get(f'/view/{model_id}').get_data(as_text=True)
+    hits = VIEWER_CACHE.hits
+    assert client.get(f'/view/{model_id}').get_data(as_text=True) == page
+    assert VIEWER_CACHE.hits == hits + 1, "Repeated views should skip rendering"
+    print("✓ Model records and viewer pages are served from the cache")
+    
+    set_derived_assets('abc', compact_filename='abc.compact.glb')
+    assert get_model(model_id)['compact_filename'] == 'abc.compact.glb', "Updates should invalidate the model"
+    assert '/uploads/abc.compact.glb' in client.get(f'/view/{model_id}').get_data(as_text=True), \
+        "Updates should invalidate the viewer page"
+    
+    delete_model(model_id)
+    assert get_model(model_id) is None, "Deletes should invalidate the model"
+    assert client.get(f'/view/{model_id}').status_code == 404, "Deleted models should not be viewable"
+    assert client.get('/view/999').status_code == 404 and len(VIEWER_CACHE) == 0, "Misses should not be cached"
+    print("✓ Updates and deletes invalidate both caches")
+    
+    metrics = client.get('/metrics').get_data(as_text=True)
+    assert 'cache_requests_total{cache="viewer_html",result="hit"}' in metrics, "Cache counters should be exported"
+    print("✓ Hit and miss counters are exported")
+    
+    # Cleanup
+    os.remove('models.db')
+    
+    print("✅ All model cache tests passed!\n")
+
+def test_library_versioning():
+    """Test the library version stamp and conditional GETs of the model listing"""
+    print("Testing library versioning...")
+    
+    from datetime import datetime, timedelta, timezone
+    from database import get_library_version, set_derived_assets
+    from app import LIBRARY_CACHE
+    
+    # Setup
+    if os.path.exists('models.db'):
+        os.remove('models.db')
+    init_db()
+    
+    app.config['TESTING'] = True
+    client = app.test_client()
+    
+    stamp = get_library_version()
+    model_id = add_model('abc.glb', 'versioned.glb', 'uploads/abc.glb', content_hash='abc')
+    added = get_library_version()
+    assert added != stamp, "Adding a model should change the stamp"
+    set_derived_assets('abc', compact_filename='abc.compact.glb')
+    updated = get_library_version()
+    assert updated != added, "Derived asset updates should change the stamp"
+    assert get_library_version() == updated, "Reads should not change the stamp"
+    print("✓ Inserts and updates change the library version")
+    
+    response = client.get('/models')
+    etag = response.headers['ETag']
+    assert response.status_code == 200 and response.last_modified is None, "Listings are revalidated by ETag only"
+    assert 'no-cache' in response.headers['Cache-Control'], "Listings should always be revalidated"
+    
+    cached = client.get('/models', headers={'If-None-Match': etag})
+    assert cached.status_code == 304 and cached.get_data() == b'', "Unchanged listings should answer 304"
+    later = (datetime.now(timezone.utc) + timedelta(hours=1)).strftime('%a, %d %b %Y %H:%M:%S GMT')
+    assert client.get('/models', headers={'If-Modified-Since': later}).status_code == 200, \
+        "One-second dates cannot tell versions apart and should not answer 304"
+    
+    api = client.get('/api/models?limit=5')
+    assert client.get('/api/models?limit=5',
+                      headers={'If-None-Match': api.headers['ETag']}).status_code == 304
+    assert client.get('/api/models?limit=6',
+                      headers={'If-None-Match': api.headers['ETag']}).status_code == 200, \
+        "Other page sizes should have their own ETag"
+    print("✓ /models and /api/models answer 304 to current copies")
+    
+    hits = LIBRARY_CACHE.hits
+    page = client.get('/models').get_data(as_text=True)
+    assert LIBRARY_CACHE.hits == hits + 1 and 'versioned.glb' in page, "Repeated listings should skip rendering"
+    assert client.get('/models?after=bogus').status_code == 400
+    print("✓ Rendered listings are cached per version")
+    
+    add_model('def.glb', 'newer.glb', 'uploads/def.glb', content_hash='def')
+    changed = client.get('/models', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag, "Uploads should change the ETag"
+    assert 'newer.glb' in changed.get_data(as_text=True), "The new version should be rendered"
+    
+    etag = changed.headers['ETag']
+    delete_model(model_id)
+    deleted = client.get('/models', headers={'If-None-Match': etag})
+    assert deleted.status_code == 200 and 'versioned.glb' not in deleted.get_data(as_text=True), \
+        "Deletes should change the ETag"
+    print("✓ Uploads and deletes invalidate client and server copies")
+    
+    # Changes within the same second each get a listing of their own
+    etags = [client.get('/models').headers['ETag']]
+    for name in ('first.glb', 'second.glb'):
+        add_model(name, name, f'uploads/{name}')
+        response = client.get('/models', headers={'If-None-Match': etags[-1]})
+        assert response.status_code == 200 and name in response.get_data(as_text=True), \
+            "Every change should be served, however close together"
+        etags.append(response.headers['ETag'])
+    assert len(set(etags)) == 3
+    print("✓ Changes within one second are told apart")
+    
+    # Cleanup
+    os.remove('models.db')
+    
+    print("✅ All library versioning tests passed!\n")
+
+def test_resumable_upload():
+    """Test chunked, resumable uploads of large models"""
+    print("Testing resumable upload...")
+    
+    import base64
+    import hashlib
+    from database import get_upload_session
+    from maintenance import purge_sessions
+    from storage import open_session_file, session_path
+    
+    # Setup
+    if os.path.exists('models.db'):
+        os.remove('models.db')
+    init_db()
+    os.makedirs('uploads', exist_ok=True)
+    
+    app.config['TESTING'] = True
+    client = app.test_client()
+    
+    def send_chunk(url, offset, chunk, checksum=None):
+        digest = checksum or base64.b64encode(hashlib.sha256(chunk).digest()).decode()
+        return client.patch(url, data=chunk, content_type='application/offset+octet-stream',
+                            headers={'Upload-Offset': str(offset), 'Upload-Checksum': f'sha256 {digest}'})
+    
+    glb = make_test_glb(padding=b'resumable' * 1000)
+    response = client.post('/upload/sessions', json={'filename': 'scan.glb', 'length': len(glb)})
+    assert response.status_code == 201, "Starting an upload should create a session"
+    url = response.headers['Location']
+    upload_id = response.get_json()['upload_id']
+    assert response.headers['Upload-Offset'] == '0' and response.headers['Upload-Length'] == str(len(glb))
+    assert client.post('/upload/sessions', json={'filename': 'scan.obj', 'length': 10}).status_code == 400
+    assert client.post('/upload/sessions', json={'filename': 'scan.glb', 'length': 0}).status_code == 400
+    assert client.post('/upload/sessions', json={'filename': 'scan.glb',
+                                                 'length': app.config['MAX_RESUMABLE_SIZE'] + 1}).status_code == 413
+    print("✓ Sessions are created for valid names and sizes")
+    
+    chunks = [glb[i:i + 4096] for i in range(0, len(glb), 4096)]
+    response = send_chunk(url, 0, chunks[0])
+    assert response.status_code == 200 and response.get_json()['offset'] == len(chunks[0])
+    
+    assert send_chunk(url, 0, chunks[0]).status_code == 409, "Stale offsets should be rejected"
+    response = send_chunk(url, len(chunks[0]), chunks[1], checksum=base64.b64encode(b'x' * 32).decode())
+    assert response.status_code == 460, "Corrupted chunks should be rejected"
+    assert os.path.getsize(session_path('uploads', upload_id)) == len(chunks[0]), "Rejected chunks should be discarded"
+    assert client.patch(url, data=chunks[1], content_type='application/offset+octet-stream',
+                        headers={'Upload-Offset': str(len(chunks[0]))}).status_code == 400, \
+        "Chunks without checksum should be rejected"
+    assert send_chunk(url, len(chunks[0]), glb[len(chunks[0]):] + b'extra').status_code == 413, \
+        "Chunks beyond the declared length should be rejected"
+    with open_session_file(session_path('uploads', upload_id)):
+        assert send_chunk(url, len(chunks[0]), chunks[1]).status_code == 409, "Concurrent writes should be rejected"
+    print("✓ Stale, corrupted, oversized and concurrent chunks are rejected")
+    
+    # Resume from wherever the server says the upload stands
+    response = client.head(url)
+    assert response.status_code == 200 and response.get_data() == b''
+    offset = int(response.headers['Upload-Offset'])
+    assert offset == len(chunks[0]) and response.headers['Cache-Control'] == 'no-store'
+    assert client.post(f'{url}/complete').status_code == 409, "Incomplete uploads should not be finished"
+    statements = []
+    get_connection().set_trace_callback(statements.append)
+    for chunk in chunks[1:]:
+        response = send_chunk(url, offset, chunk)
+        assert response.status_code == 200, response.get_json()
+        offset = response.get_json()['offset']
+    get_connection().set_trace_callback(None)
+    assert client.get(url).get_json()['complete']
+    print("✓ Uploads resume at the stored offset")
+    
+    # Acknowledged offsets are committed with a full fsync, other writes keep NORMAL
+    update = next(i for i, sql in enumerate(statements) if 'UPDATE upload_sessions' in sql)
+    assert 'PRAGMA synchronous = FULL' in statements[:update], "Offsets should be committed durably"
+    assert 'PRAGMA synchronous = NORMAL' in statements[update:], "Synchronous mode should be restored"
+    assert get_connection().execute('PRAGMA synchronous').fetchone()[0] == 1, "Connection should be back to NORMAL"
+    print("✓ Upload offsets survive power loss")
+    
+    response = client.post(f'{url}/complete')
+    assert response.status_code == 200, response.get_json()
+    model = get_model(response.get_json()['model_id'])
+    assert model['original_filename'] == 'scan.glb' and model['file_size'] == len(glb)
+    assert model['content_hash'] == hashlib.sha256(glb).hexdigest(), "Finished uploads should be content-addressed"
+    with open(model['file_path'], 'rb') as f:
+        assert f.read() == glb
+    assert not os.path.exists(session_path('uploads', upload_id)), "The partial file should become the blob"
+    assert get_upload_session(upload_id) is None and client.get(url).status_code == 404
+    print("✓ Finished uploads are stored and registered as models")
+    
+    broken = b'glTF not a model'
+    url = client.post('/upload/sessions', json={'filename': 'broken.glb', 'length': len(broken)}).headers['Location']
+    send_chunk(url, 0, broken)
+    response = client.post(f'{url}/complete')
+    assert response.status_code == 400 and 'Ongeldig 3D-model' in response.get_json()['error']
+    assert client.get(url).status_code == 404, "Invalid uploads should be discarded"
+    
+    response = client.post('/upload/sessions', json={'filename': 'cancel.glb', 'length': len(glb)})
+    url, upload_id = response.headers['Location'], response.get_json()['upload_id']
+    send_chunk(url, 0, chunks[0])
+    assert client.delete(url).status_code == 204 and client.get(url).status_code == 404
+    assert not os.path.exists(session_path('uploads', upload_id)), "Cancelled uploads should be removed"
+    print("✓ Invalid and cancelled uploads are removed")
+    
+    response = client.post('/upload/sessions', json={'filename': 'stale.glb', 'length': len(glb)})
+    url, upload_id = response.headers['Location'], response.get_json()['upload_id']
+    live = client.post('/upload/sessions', json={'filename': 'live.glb', 'length': len(glb)}).get_json()['upload_id']
+    conn = get_connection()
+    with conn:
+        conn.execute("UPDATE upload_sessions SET expires_at = '2000-01-01T00:00:00' WHERE id = ?", (upload_id,))
+    assert client.get(url).status_code == 410, "Expired uploads should be gone"
+    assert purge_sessions('uploads', rate=0) == {'purged': 1, 'busy': 0}
+    assert get_upload_session(upload_id) is None and not os.path.exists(session_path('uploads', upload_id))
+    assert get_upload_session(live) is not None, "Active uploads should survive the purge"
+    print("✓ Expired uploads are purged")
+    
+    # Cleanup
+    os.remove(session_path('uploads', live))
+    os.rmdir(os.path.dirname(session_path('uploads', live)))
+    remove_stored_file(model['file_path'])
+    os.remove('models.db')
+    
+    print("✅ All resumable upload tests passed!\n")
+
 if __name__ == "__main__":
     print("=" * 60)
     print("3D Model Viewer Platform - Component Tests")
@@ -170,9 +1673,30 @@ if __name__ == "__main__":
     
     try:
         test_database_operations()
+        test_connection_pool()
         test_file_validation()
         test_flask_routes()
+        test_pagination()
         test_upload_flow()
+        test_content_addressed_storage()
+        test_model_delivery_caching()
+        test_precompressed_sidecars()
+        test_background_jobs()
+        test_model_metadata()
+        test_level_of_detail()
+        test_thumbnails()
+        test_generate_endpoint()
+        test_compact_models()
+        test_benchmark_suite()
+        test_metrics()
+        test_search()
+        test_bulk_upload()
+        test_storage_maintenance()
+        test_production_startup()
+        test_lazy_startup()
+        test_model_cache()
+        test_library_versioning()
+        test_resumable_upload()
         
         print("=" * 60)
         print("✅ All tests completed successfully!")
@@ -97,6 +97,211 @@ def test_model_features():
     print("\n✅ All architectural features validated!\n")
 
 
+def test_mesh_builder():
+    """Test that the mesh builder places instances and colors correctly."""
+    print("Testing mesh builder...")
+    import numpy as np
+    from mesh_builder import MeshBuilder
+    from generate_greek_temple import create_perfect_temple
+    
+    box = trimesh.creation.box([1, 1, 1])
+    builder = MeshBuilder()
+    builder.add(box, [[0, 0, 0], [5, 0, 0]], [[255, 0, 0, 255], [0, 255, 0, 255]])
+    builder.add(box, [0, 0, 5], [0, 0, 255, 255])
+    mesh = builder.build()
+    
+    assert len(mesh.vertices) == 3 * len(box.vertices), "Wrong vertex count"
+    assert len(mesh.faces) == 3 * len(box.faces), "Wrong face count"
+    assert np.allclose(mesh.vertices[len(box.vertices):2 * len(box.vertices)], box.vertices + [5, 0, 0])
+    assert mesh.faces.max() == len(mesh.vertices) - 1, "Face indices not offset per instance"
+    assert (mesh.visual.vertex_colors[-1] == [0, 0, 255, 255]).all(), "Instance color not applied"
+    print(f"✓ Instances placed with offset faces and colors")
+    
+    temple = create_perfect_temple()
+    assert len(temple.faces) == 100076, f"Unexpected face count: {len(temple.faces)}"
+    assert abs(temple.bounds[0][2]) < 1e-9, "Temple does not sit on the ground"
+    print(f"✓ Temple built: {len(temple.vertices)} vertices, {len(temple.faces)} faces")
+    
+    print("\n✅ Mesh builder works!\n")
+
+
+def test_instanced_export():
+    """Test that the instanced temple export stores repeated parts once."""
+    print("Testing instanced GLB export...")
+    import tempfile
+    from generate_greek_temple import create_perfect_temple, export_instanced_temple
+    from gltf_parser import INSTANCING_EXTENSION, parse_model, read_gltf_json
+    from lod import load_mesh
+    
+    flat = create_perfect_temple()
+    with tempfile.TemporaryDirectory() as directory:
+        flat_path = os.path.join(directory, "flat.glb")
+        instanced_path = os.path.join(directory, "instanced.glb")
+        flat.export(flat_path)
+        with open(instanced_path, "wb") as f:
+            f.write(export_instanced_temple())
+        
+        document = read_gltf_json(instanced_path)
+        assert INSTANCING_EXTENSION in document["extensionsUsed"], "Extension not declared"
+        instanced_nodes = [n for n in document["nodes"] if INSTANCING_EXTENSION in n.get("extensions", {})]
+        assert instanced_nodes, "No instanced nodes"
+        print(f"✓ {len(instanced_nodes)} instanced nodes, {len(document['meshes'])} meshes")
+        
+        flat_size = os.path.getsize(flat_path)
+        instanced_size = os.path.getsize(instanced_path)
+        assert instanced_size * 5 < flat_size, "Instanced export is not much smaller"
+        print(f"✓ File size: {flat_size // 1024} KB flat, {instanced_size // 1024} KB instanced")
+        
+        metadata = parse_model(instanced_path)
+        assert metadata["triangle_count"] == len(flat.faces), "Triangle count ignores instances"
+        assert metadata["vertex_count"] == len(flat.vertices), "Vertex count ignores instances"
+        print(f"✓ Metadata counts instances: {metadata['triangle_count']} triangles")
+        
+        vertices, faces, colors = load_mesh(instanced_path)
+        assert len(faces) == len(flat.faces), "Instances were not expanded on load"
+        assert abs(vertices.min(axis=0) - flat.bounds[0]).max() < 1e-4, "Placement differs from flat export"
+        assert len({tuple(c) for c in colors}) > 5, "Material colors lost on load"
+        print(f"✓ Expanded on load: {len(faces)} faces with colors")
+    
+    print("\n✅ Instanced export works!\n")
+
+
+def test_mesh_compaction():
+    """Test that welding and quantization shrink the temple without moving it."""
+    print("Testing welded, quantized GLB export...")
+    import tempfile
+    from generate_greek_temple import create_perfect_temple, export_instanced_temple
+    from gltf_parser import extract_metadata, unpack_glb
+    from lod import load_mesh
+    from mesh_optimize import QUANTIZATION_EXTENSION, compact_glb
+    
+    flat = create_perfect_temple()
+    for label, data in (("flat", flat.export(file_type="glb")), ("instanced", export_instanced_temple())):
+        compacted = compact_glb(data)
+        assert compacted is not None and len(compacted) < len(data), f"{label} export did not shrink"
+        document, _ = unpack_glb(compacted)
+        assert QUANTIZATION_EXTENSION in document["extensionsRequired"], "Quantization not declared"
+        assert extract_metadata(document)["triangle_count"] == len(flat.faces), "Triangles were lost"
+        
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "compact.glb")
+            with open(path, "wb") as f:
+                f.write(compacted)
+            vertices, faces, colors = load_mesh(path)
+        assert len(faces) == len(flat.faces), "Faces were lost on load"
+        assert abs(vertices.min(axis=0) - flat.bounds[0]).max() < 1e-3, "Quantized placement differs"
+        assert abs(vertices.max(axis=0) - flat.bounds[1]).max() < 1e-3, "Quantized placement differs"
+        assert len({tuple(c) for c in colors}) > 5, "Colors lost"
+        print(f"✓ {label}: {len(data) // 1024} KB -> {len(compacted) // 1024} KB")
+    
+    print("\n✅ Compaction works!\n")
+
+
+def test_vertex_cache():
+    """Test that triangle reordering keeps the mesh and reduces vertex cache misses."""
+    print("Testing vertex cache optimization...")
+    import numpy as np
+    from mesh_builder import primitive
+    from vertex_cache import acmr, optimize_mesh, optimize_overdraw, tipsify
+    
+    sphere = trimesh.creation.icosphere(subdivisions=4)
+    shuffled = sphere.faces[np.random.default_rng(0).permutation(len(sphere.faces))]
+    order, faces = optimize_mesh(sphere.vertices, shuffled)
+    
+    def canonical(triangles):
+        # Rotate each triangle to start at its smallest index, keeping the winding
+        start = triangles.argmin(axis=1)
+        rolled = np.stack([np.roll(t, -s) for t, s in zip(triangles, start)])
+        return rolled[np.lexsort(rolled.T[::-1])]
+    
+    assert np.array_equal(canonical(order[faces]), canonical(shuffled)), "Triangles or winding changed"
+    before, after = acmr(shuffled, len(sphere.vertices)), acmr(faces, len(order))
+    assert after < 0.75 < before, f"Cache misses not reduced: {before:.2f} -> {after:.2f}"
+    first_use = np.unique(faces.ravel(), return_index=True)[1]
+    assert np.all(np.diff(first_use) > 0), "Vertices not numbered by first use"
+    print(f"✓ Shuffled sphere ACMR {before:.2f} -> {after:.2f}")
+    
+    tipsified = shuffled[tipsify(shuffled, len(sphere.vertices))]
+    permutation = optimize_overdraw(tipsified, sphere.vertices)
+    assert np.array_equal(np.sort(permutation), np.arange(len(shuffled))), "Overdraw order is not a permutation"
+    print("✓ Overdraw clusters reorder whole triangles")
+    
+    # Tessellations that are already cache friendly keep their order
+    cylinder = trimesh.creation.cylinder(radius=1, height=2, sections=32)
+    cached = primitive("cylinder", radius=1, height=2, sections=32)
+    assert len(cached.faces) == len(cylinder.faces), "Primitive lost triangles"
+    assert acmr(cached.faces, len(cached.vertices)) <= acmr(cylinder.faces, len(cylinder.vertices)) * 1.05, \
+        "Primitive cache order got worse"
+    print("✓ Cached primitives are stored in optimized order")
+    
+    print("\n✅ Vertex cache optimization works!\n")
+
+
+def test_scene_spec():
+    """Test that the declarative temple scene compiles to the generated temple."""
+    print("Testing scene spec compiler...")
+    import numpy as np
+    import json
+    from generate_greek_temple import create_perfect_temple, temple_spec
+    from mesh_builder import primitive
+    from scene_spec import SceneSpecError, build_scene, compile_scene, load_scene_spec
+    
+    def triangles(mesh):
+        colors = np.asarray(mesh.visual.vertex_colors)[mesh.faces][:, 0, :]
+        rows = np.hstack([np.round(mesh.vertices[mesh.faces], 5).reshape(len(mesh.faces), -1), colors])
+        return rows[np.lexsort(rows.T[::-1])]
+    
+    spec = load_scene_spec("scenes/greek_temple.json")
+    assert spec == json.loads(json.dumps(temple_spec())), \
+        "scenes/greek_temple.json is out of date, regenerate it with generate_greek_temple.py --spec"
+    print(f"✓ Checked-in scene matches temple_spec(): {len(spec['parts'])} parts")
+    
+    scene = build_scene(spec)
+    temple = create_perfect_temple()
+    assert len(scene.faces) == len(temple.faces), "Face count differs from generated temple"
+    assert np.array_equal(triangles(scene), triangles(temple)), "Scene differs from generated temple"
+    print(f"✓ Scene matches generated temple: {len(scene.faces)} faces")
+    
+    hits = primitive.cache_info().hits
+    compile_scene(spec)
+    assert primitive.cache_info().hits >= hits + len(spec["parts"]), "Primitives were re-tessellated"
+    print(f"✓ Primitive tessellations reused: {primitive.cache_info()}")
+
+    # A new process finds the tessellation on disk and skips the vertex cache ordering
+    import tempfile
+    from unittest import mock
+    import mesh_builder
+    with tempfile.TemporaryDirectory() as cache_dir, mock.patch.object(mesh_builder, "PRIMITIVE_CACHE_DIR", cache_dir):
+        primitive.cache_clear()
+        sphere = primitive("icosphere", radius=0.3, subdivisions=2)
+        assert len(os.listdir(cache_dir)) == 1, "Tessellation was not written to disk"
+        primitive.cache_clear()
+        with mock.patch.object(mesh_builder, "optimize_mesh", side_effect=AssertionError("re-tessellated")):
+            cached = primitive("icosphere", radius=0.3, subdivisions=2)
+        assert cached is not sphere, "In-process cache was not cleared"
+        assert np.array_equal(cached.vertices, sphere.vertices) and np.array_equal(cached.faces, sphere.faces), \
+            "Disk cache changed the tessellation"
+        with open(os.path.join(cache_dir, os.listdir(cache_dir)[0]), "wb") as f:
+            f.write(b"truncated")
+        primitive.cache_clear()
+        assert np.array_equal(primitive("icosphere", radius=0.3, subdivisions=2).faces, sphere.faces), \
+            "Corrupt cache file was not re-tessellated"
+    primitive.cache_clear()
+    print(f"✓ Primitive tessellations reused across processes from disk")
+
+    for broken in ({"parts": [{"primitive": "teapot"}]},
+                   {"parts": [{"primitive": "box", "extents": [1, 1, 1], "color": "missing"}]},
+                   {"parts": [{"primitive": "box", "extents": [1, 1, 1], "repeat": [{"spiral": {}}]}]}):
+        try:
+            compile_scene(broken)
+            raise AssertionError(f"Invalid scene accepted: {broken}")
+        except SceneSpecError:
+            pass
+    print(f"✓ Invalid scenes rejected")
+    
+    print("\n✅ Scene spec compiler works!\n")
+
+
 if __name__ == "__main__":
     print("=" * 60)
     print("Greek Temple 3D Model Tests")
@@ -106,6 +311,11 @@ if __name__ == "__main__":
     try:
         test_greek_temple_file()
         test_model_features()
+        test_mesh_builder()
+        test_instanced_export()
+        test_mesh_compaction()
+        test_vertex_cache()
+        test_scene_spec()
         
         print("=" * 60)
         print("✅ All tests completed successfully!")
@@ -0,0 +1,216 @@
+"""
+Thumbnail module for 3D Model Viewer
+Renders small PNG previews of models on the CPU with a NumPy z-buffer rasterizer
+"""
+import os
+import struct
+import tempfile
+import zlib
+import numpy as np
+from storage import TEMP_PREFIX, derived_filename
+
+THUMBNAIL_SIZE = 256
+SUPERSAMPLE = 2                  # render at 2x and average down for antialiasing
+VIEW_YAW = np.radians(35)        # camera orbit around the vertical (Y) axis
+VIEW_PITCH = np.radians(25)      # camera elevation
+LIGHT_DIRECTION = (-0.4, 0.8, 0.6)
+AMBIENT = 0.35
+DEFAULT_COLOR = (180, 180, 190, 255)
+MAX_FRAGMENTS_PER_BATCH = 2_000_000
+
+def view_transform(vertices):
+    """
+    Rotate vertices into camera space and normalize them to [-1, 1]
+
+    Args:
+        vertices (ndarray): (n, 3) Y-up vertex positions
+
+    Returns:
+        ndarray: (n, 3) camera-space positions; x right, y up, z towards the viewer
+    """
+    cy, sy = np.cos(VIEW_YAW), np.sin(VIEW_YAW)
+    cp, sp = np.cos(VIEW_PITCH), np.sin(VIEW_PITCH)
+    yaw = np.array([[cy, 0, sy], [0, 1, 0], [-sy, 0, cy]])
+    pitch = np.array([[1, 0, 0], [0, cp, -sp], [0, sp, cp]])
+    centered = vertices - (vertices.min(axis=0) + vertices.max(axis=0)) / 2
+    rotated = centered @ (pitch @ yaw).T
+    extent = np.abs(rotated[:, :2]).max()
+    return rotated / max(extent, 1e-12)
+
+def shade_faces(camera, faces, colors):
+    """
+    Flat-shade faces from their mean vertex color and a directional light
+
+    Lighting is two-sided so meshes with inconsistent winding still look right.
+
+    Returns:
+        ndarray: (m, 3) float RGB face colors in 0..255
+    """
+    triangles = camera[faces]
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    normals /= np.maximum(np.linalg.norm(normals, axis=1), 1e-12)[:, None]
+    light = np.asarray(LIGHT_DIRECTION) / np.linalg.norm(LIGHT_DIRECTION)
+    intensity = AMBIENT + (1 - AMBIENT) * np.abs(normals @ light)
+    if colors is None:
+        base = np.broadcast_to(np.asarray(DEFAULT_COLOR[:3], dtype=float), (len(faces), 3))
+    else:
+        base = colors[faces][:, :, :3].astype(float).mean(axis=1)
+    return base * intensity[:, None]
+
+def rasterize(screen, faces, size):
+    """
+    Z-buffer rasterize triangles, fully vectorized
+
+    Triangles are grouped by power-of-two bounding box sizes; each group
+    tests all pixel centers inside its boxes at once. Each batch is resolved
+    into an image-sized depth buffer right away, so memory stays bounded by
+    the batch and the image, not by the mesh. The nearest fragment per
+    pixel wins; ties go to the face rasterized first.
+
+    Args:
+        screen (ndarray): (n, 3) vertices in pixel coordinates plus depth (larger is nearer)
+        faces (ndarray): (m, 3) triangle vertex indices
+        size (int): Image width and height in pixels
+
+    Returns:
+        ndarray: (size, size) index of the visible face per pixel, -1 for background
+    """
+    tri = screen[faces]
+    x, y, z = tri[:, :, 0], tri[:, :, 1], tri[:, :, 2]
+    x0 = np.clip(np.floor(x.min(axis=1) - 0.5), 0, size - 1).astype(np.int64)
+    x1 = np.clip(np.ceil(x.max(axis=1) - 0.5), 0, size - 1).astype(np.int64)
+    y0 = np.clip(np.floor(y.min(axis=1) - 0.5), 0, size - 1).astype(np.int64)
+    y1 = np.clip(np.ceil(y.max(axis=1) - 0.5), 0, size - 1).astype(np.int64)
+    area = (x[:, 1] - x[:, 0]) * (y[:, 2] - y[:, 0]) - (x[:, 2] - x[:, 0]) * (y[:, 1] - y[:, 0])
+    visible = np.abs(area) > 1e-12
+
+    width = 1 << np.ceil(np.log2(x1 - x0 + 1)).astype(np.int64)
+    height = 1 << np.ceil(np.log2(y1 - y0 + 1)).astype(np.int64)
+
+    image = np.full(size * size, -1, dtype=np.int64)
+    nearest = np.full(size * size, -np.inf)
+    for bucket_w, bucket_h in set(zip(width[visible].tolist(), height[visible].tolist())):
+        members = np.nonzero(visible & (width == bucket_w) & (height == bucket_h))[0]
+        batch = max(1, MAX_FRAGMENTS_PER_BATCH // (bucket_w * bucket_h))
+        for start in range(0, len(members), batch):
+            idx = members[start:start + batch]
+            px = x0[idx, None, None] + np.arange(bucket_w)[None, None, :]
+            py = y0[idx, None, None] + np.arange(bucket_h)[None, :, None]
+            cx, cy = px + 0.5, py + 0.5
+
+            # Edge functions give barycentric weights for every pixel center
+            tx, ty = x[idx][:, :, None, None], y[idx][:, :, None, None]
+            w0 = (tx[:, 1] - cx) * (ty[:, 2] - cy) - (tx[:, 2] - cx) * (ty[:, 1] - cy)
+            w1 = (tx[:, 2] - cx) * (ty[:, 0] - cy) - (tx[:, 0] - cx) * (ty[:, 2] - cy)
+            w2 = (tx[:, 0] - cx) * (ty[:, 1] - cy) - (tx[:, 1] - cx) * (ty[:, 0] - cy)
+            sign = np.sign(area[idx])[:, None, None]
+            inside = ((w0 * sign >= 0) & (w1 * sign >= 0) & (w2 * sign >= 0)
+                      & (px <= x1[idx, None, None]) & (py <= y1[idx, None, None]))
+
+            tz = z[idx][:, :, None, None]
+            depth = (w0 * tz[:, 0] + w1 * tz[:, 1] + w2 * tz[:, 2]) / area[idx][:, None, None]
+            hit = np.nonzero(inside)
+            pixels, depths, owners = (py * size + px)[hit], depth[hit], idx[hit[0]]
+
+            # Nearest fragment of the batch per pixel, kept where it beats the buffer
+            order = np.lexsort((-depths, pixels))
+            first = order[np.unique(pixels[order], return_index=True)[1]]
+            pixels, depths, owners = pixels[first], depths[first], owners[first]
+            nearer = depths > nearest[pixels]
+            nearest[pixels[nearer]] = depths[nearer]
+            image[pixels[nearer]] = owners[nearer]
+
+    return image.reshape(size, size)
+
+def render_thumbnail(vertices, faces, colors=None, size=THUMBNAIL_SIZE):
+    """
+    Render a flat-shaded thumbnail of a mesh
+
+    Args:
+        vertices (ndarray): (n, 3) Y-up vertex positions
+        faces (ndarray): (m, 3) triangle vertex indices
+        colors (ndarray): Optional (n, 4) uint8 vertex colors
+        size (int): Output width and height in pixels
+
+    Returns:
+        ndarray: (size, size, 4) uint8 RGBA image with a transparent background
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64)
+    full = size * SUPERSAMPLE
+
+    camera = view_transform(vertices)
+    screen = np.empty_like(camera)
+    margin = 0.92
+    screen[:, 0] = (camera[:, 0] * margin + 1) * full / 2
+    screen[:, 1] = (1 - camera[:, 1] * margin) * full / 2
+    screen[:, 2] = camera[:, 2]
+
+    owners = rasterize(screen, faces, full)
+    face_colors = shade_faces(camera, faces, colors)
+
+    rgba = np.zeros((full, full, 4))
+    covered = owners >= 0
+    rgba[covered, :3] = face_colors[owners[covered]]
+    rgba[covered, 3] = 255
+
+    # Average supersampled blocks; premultiply so edges blend towards transparency
+    blocks = rgba.reshape(size, SUPERSAMPLE, size, SUPERSAMPLE, 4)
+    alpha = blocks[..., 3].mean(axis=(1, 3))
+    color = (blocks[..., :3] * blocks[..., 3:] / 255).mean(axis=(1, 3))
+    color /= np.maximum(alpha / 255, 1e-12)[..., None]
+    return np.dstack([color, alpha]).round().clip(0, 255).astype(np.uint8)
+
+def encode_png(image):
+    """
+    Encode an RGBA image as PNG using only zlib
+
+    Args:
+        image (ndarray): (height, width, 4) uint8 RGBA pixels
+
+    Returns:
+        bytes: PNG file contents
+    """
+    height, width = image.shape[:2]
+    raw = np.hstack([np.zeros((height, 1), dtype=np.uint8), image.reshape(height, -1)]).tobytes()
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw, 9))
+            + chunk(b'IEND', b''))
+
+def thumbnail_path(path):
+    """Path of the cached thumbnail stored next to a model file"""
+    return derived_filename(path, '.thumb.png')
+
+def generate_thumbnail(path):
+    """
+    Render and cache the thumbnail of a stored model
+
+    Args:
+        path (str): Path to the stored model file
+
+    Returns:
+        str: Thumbnail filename, or None if the model has no triangles
+    """
+    from lod import load_mesh
+
+    vertices, faces, colors = load_mesh(path)
+    if not len(faces):
+        return None
+    data = encode_png(render_thumbnail(vertices, faces, colors))
+    # Thumbnails are served as immutable: clients must never see a partial PNG
+    target = thumbnail_path(path)
+    fd, tmp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=os.path.dirname(target))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, target)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return os.path.basename(target)
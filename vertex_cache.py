@@ -0,0 +1,216 @@
+"""
+Vertex cache module for 3D Model Viewer
+Reorders triangles and vertices for GPU post-transform cache, overdraw and fetch locality
+"""
+import numpy as np
+
+VERTEX_CACHE_SIZE = 16     # post-transform cache entries assumed for client GPUs
+OVERDRAW_THRESHOLD = 1.05  # clusters may cost up to 5% more cache misses than tipsify alone
+
+def cache_misses(faces, vertex_count, cache_size=VERTEX_CACHE_SIZE):
+    """
+    Simulate a FIFO post-transform vertex cache
+
+    Args:
+        faces (ndarray): (m, 3) triangle vertex indices
+        vertex_count (int): Number of vertices
+        cache_size (int): Cache entries
+
+    Returns:
+        ndarray: (m,) number of cache misses per triangle
+    """
+    stamps = [-cache_size - 1] * vertex_count
+    time = 0
+    misses = []
+    for a, b, c in faces.tolist():
+        missed = 0
+        for v in (a, b, c):
+            if time - stamps[v] > cache_size:
+                stamps[v] = time
+                time += 1
+                missed += 1
+        misses.append(missed)
+    return np.asarray(misses, dtype=np.int64)
+
+def acmr(faces, vertex_count, cache_size=VERTEX_CACHE_SIZE):
+    """Average cache miss ratio: transformed vertices per triangle (0.5 is ideal, 3 is worst)"""
+    if not len(faces):
+        return 0.0
+    return float(cache_misses(faces, vertex_count, cache_size).sum()) / len(faces)
+
+def tipsify(faces, vertex_count, cache_size=VERTEX_CACHE_SIZE):
+    """
+    Reorder triangles for the vertex cache with Tipsify (Sander et al. 2007)
+
+    Triangles are emitted as fans around a current vertex; the next fan
+    vertex is the one still in the cache with the most remaining triangles
+    that will not have been evicted before they are drawn.
+
+    Args:
+        faces (ndarray): (m, 3) triangle vertex indices
+        vertex_count (int): Number of vertices
+        cache_size (int): Cache entries
+
+    Returns:
+        ndarray: (m,) triangle order
+    """
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    corners = faces.ravel()
+    live = np.bincount(corners, minlength=vertex_count)
+    starts = np.concatenate([[0], np.cumsum(live)]).tolist()
+    adjacency = (np.argsort(corners, kind='stable') // 3).tolist()
+    live = live.tolist()
+    triangles = faces.tolist()
+
+    stamps = [0] * vertex_count
+    emitted = [False] * len(triangles)
+    order = []
+    dead_end = []
+    time = cache_size + 1
+    cursor = 0
+    fan = 0 if vertex_count else -1
+
+    while fan >= 0:
+        candidates = []
+        for t in adjacency[starts[fan]:starts[fan + 1]]:
+            if emitted[t]:
+                continue
+            for v in triangles[t]:
+                dead_end.append(v)
+                candidates.append(v)
+                live[v] -= 1
+                if time - stamps[v] > cache_size:
+                    stamps[v] = time
+                    time += 1
+            emitted[t] = True
+            order.append(t)
+
+        # Best cached candidate whose remaining fan still fits in the cache
+        fan, best = -1, -1
+        for v in candidates:
+            if live[v] > 0:
+                priority = 0
+                if time - stamps[v] + 2 * live[v] <= cache_size:
+                    priority = time - stamps[v]
+                if priority > best:
+                    fan, best = v, priority
+        if fan >= 0:
+            continue
+
+        # Dead end: recently used vertices first, then the next unfinished one
+        while dead_end:
+            v = dead_end.pop()
+            if live[v] > 0:
+                fan = v
+                break
+        else:
+            while cursor < vertex_count and live[cursor] == 0:
+                cursor += 1
+            fan = cursor if cursor < vertex_count else -1
+    return np.asarray(order, dtype=np.int64)
+
+def optimize_overdraw(faces, vertices, cache_size=VERTEX_CACHE_SIZE, threshold=OVERDRAW_THRESHOLD):
+    """
+    Reorder cache-optimized triangles in clusters so outward-facing ones draw first
+
+    Follows Sander et al.'s fast overdraw reduction: the triangle list is
+    split where the cache is flushed anyway, and further wherever the
+    running miss ratio stays within threshold of the cluster's own, then
+    clusters are sorted by how far they face away from the mesh center.
+    Early depth rejection then skips more of the hidden fragments.
+
+    Args:
+        faces (ndarray): (m, 3) triangles in tipsify order
+        vertices (ndarray): (n, 3) vertex positions
+        cache_size (int): Cache entries
+        threshold (float): Allowed miss ratio growth per cluster
+
+    Returns:
+        ndarray: (m,) triangle order
+    """
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    if len(faces) < 2:
+        return np.arange(len(faces))
+    misses = cache_misses(faces, len(vertices), cache_size)
+
+    # Hard boundaries where every corner missed: the cache was effectively flushed
+    hard = np.flatnonzero(misses == 3).tolist()
+    if not hard or hard[0] != 0:
+        hard.insert(0, 0)
+    boundaries = []
+    triangles = faces.tolist()
+    for start, end in zip(hard, hard[1:] + [len(faces)]):
+        target = misses[start:end].sum() / (end - start) * threshold
+        boundaries.append(start)
+        stamps, time, missed, first = {}, 0, 0, start
+        for i in range(start, end - 1):
+            for v in triangles[i]:
+                if time - stamps.get(v, -cache_size - 1) > cache_size:
+                    stamps[v] = time
+                    time += 1
+                    missed += 1
+            # Soft boundary once the cluster is as cache-friendly as the whole, restarting the cache
+            if missed / (i + 1 - first) <= target:
+                boundaries.append(i + 1)
+                stamps, time, missed, first = {}, 0, 0, i + 1
+    boundaries = np.asarray(boundaries)
+
+    # Area-weighted cluster centroids and normals
+    triangles = np.asarray(vertices, dtype=np.float64)[faces]
+    cross = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    areas = np.linalg.norm(cross, axis=1)
+    centroids = triangles.mean(axis=1)
+    cluster = np.repeat(np.arange(len(boundaries)), np.diff(np.append(boundaries, len(faces))))
+    weights = np.bincount(cluster, weights=areas)
+    center = (centroids * areas[:, None]).sum(axis=0) / max(areas.sum(), 1e-12)
+    cluster_centroids = np.stack([np.bincount(cluster, weights=centroids[:, i] * areas) for i in range(3)], axis=1)
+    cluster_centroids /= np.maximum(weights, 1e-12)[:, None]
+    cluster_normals = np.stack([np.bincount(cluster, weights=cross[:, i]) for i in range(3)], axis=1)
+    cluster_normals /= np.maximum(np.linalg.norm(cluster_normals, axis=1), 1e-12)[:, None]
+
+    outward = np.einsum('ij,ij->i', cluster_centroids - center, cluster_normals)
+    ranking = np.argsort(-outward, kind='stable')
+    return np.argsort(np.argsort(ranking)[cluster], kind='stable')
+
+def optimize_vertex_fetch(faces, vertex_count):
+    """
+    Renumber vertices in the order the triangles first use them
+
+    Args:
+        faces (ndarray): (m, 3) triangle vertex indices
+        vertex_count (int): Number of vertices
+
+    Returns:
+        tuple: (order, faces) where order[i] is the old index of new vertex i;
+            unreferenced vertices are dropped
+    """
+    corners = np.asarray(faces, dtype=np.int64).ravel()
+    used, first = np.unique(corners, return_index=True)
+    order = used[np.argsort(first)]
+    remap = np.full(vertex_count, -1, dtype=np.int64)
+    remap[order] = np.arange(len(order))
+    return order, remap[corners].reshape(-1, 3)
+
+def optimize_mesh(vertices, faces, cache_size=VERTEX_CACHE_SIZE):
+    """
+    Reorder a mesh for rendering: tipsify, overdraw clusters, then vertex fetch
+
+    Tessellators often emit triangles in an order that is already cache
+    friendly (strips around a cylinder, for example); tipsify's order is
+    only used when it has fewer cache misses.
+
+    Args:
+        vertices (ndarray): (n, 3) vertex positions
+        faces (ndarray): (m, 3) triangle vertex indices
+        cache_size (int): Cache entries
+
+    Returns:
+        tuple: (order, faces) where order[i] is the old index of new vertex i
+    """
+    vertices = np.asarray(vertices)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    tipsified = faces[tipsify(faces, len(vertices), cache_size)]
+    if acmr(tipsified, len(vertices), cache_size) < acmr(faces, len(vertices), cache_size):
+        faces = tipsified
+    faces = faces[optimize_overdraw(faces, vertices, cache_size)]
+    return optimize_vertex_fetch(faces, len(vertices))
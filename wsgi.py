@@ -0,0 +1,9 @@
+"""
+WSGI entry point for production servers
+Run with: gunicorn -c gunicorn.conf.py wsgi:app
+"""
+from app import create_app
+
+# Background jobs run in their own process (python jobs.py) instead of one
+# process pool per server worker
+app = create_app({'JOB_WORKER_ENABLED': False})